@@ -1,7 +1,11 @@
 import argparse
 import json
+import os
+import sys
 from collections import namedtuple
 
+from op_profile import diff_ops
+
 
 Result = namedtuple("resultado", ["name", "base_time", "diff_time"])
 
@@ -30,6 +34,10 @@ parser = argparse.ArgumentParser("compara dois jsons do pytest")
 parser.add_argument("base", help="arquivo json base")
 parser.add_argument("diff", help="arquivo json diff")
 parser.add_argument("--format", default="md", type=str, help="formato do output (csv, md, json, table)")
+parser.add_argument("--base-profile", help="perfis por op do base (op_profile.py)")
+parser.add_argument("--diff-profile", help="perfis por op do diff (op_profile.py)")
+parser.add_argument("--top", default=5, type=int, help="ops a listar por teste")
+parser.add_argument("--min-change", default=5.0, type=float, help="% de variação a partir da qual o teste é detalhado por op")
 
 args = parser.parse_args()
 
@@ -81,4 +89,71 @@ if args.format in ["table", "md", "csv"]:
 elif args.format == "json":
     print(json.dumps(results))
 else:
-    raise ValueError("formato de output desconhecido: " + args.format)
\ No newline at end of file
+    raise ValueError("formato de output desconhecido: " + args.format)
+
+profiles_missing = [
+    path
+
+    for path in (args.base_profile, args.diff_profile)
+
+    if path and not os.path.exists(path)
+]
+
+# sem os perfis (por exemplo, se o op_profile.py falhou), fica só
+# a comparação de tempos
+if profiles_missing:
+    print(f"perfis por op não encontrados ({', '.join(profiles_missing)}); detalhamento por op pulado", file=sys.stderr)
+
+if args.base_profile and args.diff_profile and not profiles_missing and args.format in ["table", "md", "csv"]:
+    with open(args.base_profile) as base:
+        base_profiles = get_times(json.load(base))
+
+    with open(args.diff_profile) as diff:
+        diff_profiles = get_times(json.load(diff))
+
+    op_header_fmt = {
+        "table": "{:48s} {:>14s} {:>14s} {:>12s} {:>11s} {:>11s} {:>12s}",
+        "md": "| {:48s} | {:>14s} | {:>14s} | {:>12s} | {:>11s} | {:>11s} | {:>12s} |",
+        "csv": "{:s}, {:s}, {:s}, {:s}, {:s}, {:s}, {:s}"
+    }[args.format]
+
+    op_data_fmt = {
+        "table": "{:48s} {:14.1f} {:14.1f} {:+12.1f} {:11.1f} {:11.1f} {:+12.1f}",
+        "md": "| {:48s} | {:14.1f} | {:14.1f} | {:+12.1f} | {:11.1f} | {:11.1f} | {:+12.1f} |",
+        "csv": "{:s}, {:.1f}, {:.1f}, {:+.1f}, {:.1f}, {:.1f}, {:+.1f}"
+    }[args.format]
+
+    for r in results:
+        change = (r.diff_time / r.base_time - 1.0) * 100.0
+
+        # testes sem perfil nos dois lados ou com variação pequena
+        if r.name not in base_profiles or r.name not in diff_profiles or not abs(change) >= args.min_change:
+            continue
+
+        rows = diff_ops(base_profiles[r.name], diff_profiles[r.name])
+
+        total_delta = sum(d["self_cpu_us"] - b["self_cpu_us"] for _, b, d in rows)
+        listed_delta = sum(d["self_cpu_us"] - b["self_cpu_us"] for _, b, d in rows[:args.top])
+
+        print()
+        print(f"{r.name}: {change:+.1f}%, tempo próprio dos ops {total_delta:+.1f} us por iteração, {listed_delta:+.1f} us nos {min(args.top, len(rows))} ops abaixo")
+        print()
+
+        print(op_header_fmt.format("op", "self cpu base", "self cpu diff", "delta (us)", "calls base", "calls diff", "mem delta (KB)"))
+
+        if args.format == "md":
+            print(op_header_fmt.format(":---", "---:", "---:", "---:", "---:", "---:", "---:"))
+
+        for op, b, d in rows[:args.top]:
+            print(
+                op_data_fmt.format(
+                    op,
+                    b["self_cpu_us"],
+                    d["self_cpu_us"],
+                    d["self_cpu_us"] - b["self_cpu_us"],
+                    b["calls"],
+                    d["calls"],
+
+                    (d["self_cpu_memory_bytes"] - b["self_cpu_memory_bytes"]) / 1024
+                )
+            )
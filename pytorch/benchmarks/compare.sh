@@ -1,6 +1,27 @@
-#!/bin/hash
+#!/bin/bash
 
 python -m fastrnns.bench --fuser=old --group=rnns --print-json oss > old.json
 python -m fastrnns.bench --fuser=te --group=rnns  --print-json oss > te.json
 
-python compare-fastrnn-results.py old.json te.json --format md
\ No newline at end of file
+# com PROFILE=1, os testes cujo tempo mudou são perfilados por op
+# com cada fuser, e a comparação detalha esses testes por op
+if [ -n "$PROFILE" ]; then
+    OLD_PROFILE=old-profile.json
+    TE_PROFILE=te-profile.json
+
+    # perfis de uma execução anterior não podem ser confundidos
+    # com os desta
+    rm -f $OLD_PROFILE $TE_PROFILE
+
+    python op_profile.py old.json te.json --fuser=old --output $OLD_PROFILE
+    python op_profile.py old.json te.json --fuser=te --output $TE_PROFILE
+fi
+
+# o detalhamento por op só roda se os dois perfis foram gravados
+if [ -n "$PROFILE" ] && [ -f "$OLD_PROFILE" ] && [ -f "$TE_PROFILE" ]; then
+    PROFILE_ARGS="--base-profile $OLD_PROFILE --diff-profile $TE_PROFILE"
+elif [ -n "$PROFILE" ]; then
+    echo "PROFILE=1, mas os perfis por op não foram gravados; comparando só os tempos" >&2
+fi
+
+python compare-fastrnn-results.py old.json te.json --format md $PROFILE_ARGS
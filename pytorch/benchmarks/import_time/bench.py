@@ -0,0 +1,273 @@
+"""
+mede o tempo de import do torch e de submódulos contra budgets.
+
+cada alvo (`import torch`, `import torch.func`, ...) roda várias
+vezes em processos novos com `python -X importtime`, depois de
+uma execução de aquecimento que preenche o cache de bytecode. só
+os imports feitos pela instrução contam: os do startup do
+interpretador (site, encodings) ficam de fora.
+
+para cada alvo, o relatório tem o tempo total do import e o tempo
+próprio (self) somado por árvore de módulos (`torch._functorch`,
+`sympy`, ...; a profundidade é `depth` em budgets.json), com a
+mediana entre as execuções. os budgets em budgets.json são por
+alvo e por árvore, em ms; um valor passa do budget quando excede
+`threshold` (fração) e também `min_delta_ms`, para não falhar por
+ruído em árvores pequenas. um alvo de budgets.json sem budget
+também falha; `--update` grava os valores da máquina de
+referência.
+
+uso, de dentro de benchmarks/::
+
+    python -m import_time.bench                 # checa os budgets
+    python -m import_time.bench --update        # regrava os budgets com as medidas atuais
+    python -m import_time.bench --target torch.func --top 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+BUDGETS = Path(__file__).absolute().parent / "budgets.json"
+
+_MARKER = "@@import_time_start@@"
+
+
+@dataclass
+class ImportRun:
+    # ms do import inteiro, soma dos imports de primeiro nível
+    total_ms: float = 0.0
+
+    # módulo -> (self ms, cumulativo ms)
+    modules: dict[str, tuple[float, float]] = field(default_factory=dict)
+
+    def trees(self, depth: int) -> dict[str, float]:
+        result: dict[str, float] = defaultdict(float)
+
+        for name, (self_ms, _) in self.modules.items():
+            result[tree_of(name, depth)] += self_ms
+
+        return result
+
+
+def tree_of(module: str, depth: int) -> str:
+    return ".".join(module.split(".")[:depth])
+
+
+def parse_importtime(stderr: str) -> ImportRun:
+    run = ImportRun()
+
+    lines = stderr.splitlines()
+
+    if _MARKER in lines:
+        lines = lines[lines.index(_MARKER) + 1:]
+
+    for line in lines:
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|", 2)
+
+        # dois espaços de indentação por nível de aninhamento
+        nested = len(name) - len(name.lstrip(" ")) > 1
+
+        module = name.strip()
+
+        run.modules[module] = (int(self_us) / 1e3, int(cumulative_us) / 1e3)
+
+        if not nested:
+            run.total_ms += int(cumulative_us) / 1e3
+
+    return run
+
+
+def import_once(python: str, target: str) -> ImportRun:
+    code = f"import sys; print({_MARKER!r}, file=sys.stderr, flush=True); import {target}"
+
+    # diretório neutro, para não importar outra árvore por acidente
+    with tempfile.TemporaryDirectory() as cwd:
+        proc = subprocess.run(
+            [python, "-X", "importtime", "-c", code],
+
+            cwd=cwd,
+            capture_output=True,
+            text=True
+        )
+
+    if proc.returncode != 0:
+        raise RuntimeError(f"falha ao importar {target}:\n{proc.stderr[-2000:]}")
+
+    return parse_importtime(proc.stderr)
+
+
+def measure(python: str, target: str, runs: int, depth: int) -> dict[str, object]:
+    import_once(python, target)
+
+    samples = [import_once(python, target) for _ in range(runs)]
+
+    trees: dict[str, list[float]] = defaultdict(list)
+    modules: dict[str, list[tuple[float, float]]] = defaultdict(list)
+
+    for sample in samples:
+        for name, value in sample.trees(depth).items():
+            trees[name].append(value)
+
+        for name, value in sample.modules.items():
+            modules[name].append(value)
+
+    return {
+        "total_ms": statistics.median(sample.total_ms for sample in samples),
+
+        "trees": {name: statistics.median(values) for name, values in trees.items()},
+
+        "modules": {
+            name: [statistics.median(v[0] for v in values), statistics.median(v[1] for v in values)]
+
+            for name, values in modules.items()
+        }
+    }
+
+
+def over_budget(measured: float, budget: float | None, threshold: float, min_delta_ms: float) -> bool:
+    if budget is None:
+        return False
+
+    return measured > budget * (1 + threshold) and measured - budget > min_delta_ms
+
+
+def report(target: str, result: dict[str, object], budgets: dict[str, object], top: int) -> list[str]:
+    """imprime o relatório de um alvo e retorna as violações de budget"""
+
+    threshold = budgets["threshold"]
+    min_delta_ms = budgets["min_delta_ms"]
+
+    failures = []
+
+    total = result["total_ms"]
+    budget = budgets["targets"].get(target)
+
+    status = "sem budget" if budget is None else f"budget {budget:.1f} ms"
+
+    # um alvo listado em budgets.json sem valor não pode passar
+    # calado: a checagem nunca falharia
+    if budget is None and target in budgets["targets"]:
+        failures.append(f"import {target}: sem budget em {BUDGETS.name} (rode com --update)")
+
+    if over_budget(total, budget, threshold, min_delta_ms):
+        failures.append(f"import {target}: {total:.1f} ms, {status}")
+
+        status += "  <- acima do budget"
+
+    print(f"\nimport {target}: {total:.1f} ms ({status})")
+
+    print(f"  {'árvore':40s} {'self (ms)':>10s} {'budget':>10s}")
+
+    trees = sorted(result["trees"].items(), key=lambda kv: -kv[1])
+
+    # todas as árvores orçadas são checadas; `top` limita só a
+    # listagem, e as que passaram do budget sempre aparecem
+    over = set()
+
+    for name, value in trees:
+        tree_budget = budgets["trees"].get(name)
+
+        if over_budget(value, tree_budget, threshold, min_delta_ms):
+            failures.append(f"{name} (em import {target}): {value:.1f} ms, budget {tree_budget:.1f} ms")
+
+            over.add(name)
+
+    for n, (name, value) in enumerate(trees):
+        if n >= top and name not in over:
+            continue
+
+        tree_budget = budgets["trees"].get(name)
+
+        flag = "  <- acima do budget" if name in over else ""
+
+        budget_str = "-" if tree_budget is None else f"{tree_budget:.1f}"
+
+        print(f"  {name:40s} {value:10.1f} {budget_str:>10s}{flag}")
+
+    print(f"  {'módulo':40s} {'self (ms)':>10s} {'cum. (ms)':>10s}")
+
+    for name, (self_ms, cumulative_ms) in sorted(result["modules"].items(), key=lambda kv: -kv[1][0])[:top]:
+        print(f"  {name:40s} {self_ms:10.1f} {cumulative_ms:10.1f}")
+
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="checa o tempo de import do torch contra budgets")
+    parser.add_argument("--python", default=sys.executable, help="interpretador a medir")
+    parser.add_argument("--budgets", type=Path, default=BUDGETS)
+    parser.add_argument("--target", action="append", help="módulo a medir (padrão: os alvos de budgets.json)")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=10, help="árvores e módulos mais lentos a listar")
+    parser.add_argument("--json", type=Path, help="grava as medidas neste arquivo")
+    parser.add_argument("--update", action="store_true", help="regrava os budgets com as medidas atuais")
+
+    args = parser.parse_args()
+
+    budgets = json.loads(args.budgets.read_text())
+
+    targets = args.target or list(budgets["targets"])
+
+    results = {target: measure(args.python, target, args.runs, budgets["depth"]) for target in targets}
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+    if args.update:
+        for target, result in results.items():
+            budgets["targets"][target] = math.ceil(result["total_ms"])
+
+        # as árvores orçadas são as que passam de min_delta_ms em
+        # algum alvo; o budget é o maior valor entre os alvos desta
+        # execução, e não o maior já registrado, para que budgets
+        # possam baixar depois de uma otimização
+        trees: dict[str, int] = {}
+
+        for result in results.values():
+            for name, value in result["trees"].items():
+                if value >= budgets["min_delta_ms"]:
+                    trees[name] = max(trees.get(name, 0), math.ceil(value))
+
+        # árvores só medidas por alvos fora desta execução continuam
+        if args.target:
+            trees = {**budgets["trees"], **trees}
+
+        budgets["trees"] = dict(sorted(trees.items()))
+
+        args.budgets.write_text(json.dumps(budgets, indent=2) + "\n")
+
+        print(f"budgets atualizados em {args.budgets}")
+
+        return
+
+    failures = []
+
+    for target, result in results.items():
+        failures += report(target, result, budgets, args.top)
+
+    if failures:
+        print(f"\n{len(failures)} budgets de import excedidos:", file=sys.stderr)
+
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
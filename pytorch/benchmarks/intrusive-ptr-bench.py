@@ -0,0 +1,181 @@
+"""
+roda c10/benchmark/intrusive_ptr_benchmark.cpp e compara com um baseline.
+
+o binário é executado com saída json do google benchmark e
+repetições; de cada benchmark fica a mediana das repetições. os
+cenários existem para intrusive_ptr e shared_ptr, e o relatório
+mostra a razão entre os dois.
+
+uso::
+
+    # grava um baseline
+    python intrusive-ptr-bench.py --save baseline.json
+
+    # compara outro build com ele; sai com erro se algum cenário
+    # ficar mais lento que o limite
+    python intrusive-ptr-bench.py --binary other/build/bin/c10_intrusive_ptr_benchmark --baseline baseline.json
+"""
+
+import argparse
+import json
+import math
+import subprocess
+import sys
+
+from pathlib import Path
+
+
+DEFAULT_BINARY = Path(__file__).absolute().parent.parent / "build" / "bin" / "c10_intrusive_ptr_benchmark"
+
+_TO_NS = {"ns": 1.0, "us": 1e3, "ms": 1e6, "s": 1e9}
+
+
+def run_benchmark(binary, repetitions, filter_, min_time):
+    cmd = [
+        str(binary.absolute()),
+
+        "--benchmark_format=json",
+        f"--benchmark_repetitions={repetitions}",
+        "--benchmark_report_aggregates_only=true"
+    ]
+
+    if filter_:
+        cmd.append(f"--benchmark_filter={filter_}")
+
+    if min_time:
+        cmd.append(f"--benchmark_min_time={min_time}")
+
+    print(" ".join(cmd), file=sys.stderr)
+
+    return json.loads(subprocess.check_output(cmd))
+
+
+def parse_results(data):
+    """nome -> {real_ns, cpu_ns, stddev_ns, items_per_second}, a partir da saída json"""
+
+    results = {}
+
+    for bench in data["benchmarks"]:
+        # sem repetições não há agregados: cada entrada é uma iteração
+        aggregate = bench.get("aggregate_name")
+
+        if aggregate not in (None, "median", "stddev"):
+            continue
+
+        name = bench.get("run_name", bench["name"])
+        scale = _TO_NS[bench.get("time_unit", "ns")]
+
+        entry = results.setdefault(name, {"stddev_ns": 0.0})
+
+        if aggregate == "stddev":
+            entry["stddev_ns"] = bench["real_time"] * scale
+        else:
+            entry["real_ns"] = bench["real_time"] * scale
+            entry["cpu_ns"] = bench["cpu_time"] * scale
+
+            if "items_per_second" in bench:
+                entry["items_per_second"] = bench["items_per_second"]
+
+    return {name: entry for name, entry in results.items() if "real_ns" in entry}
+
+
+def shared_counterpart(name):
+    return name.replace("<IntrusiveFoo>", "<SharedBar>") if "<IntrusiveFoo>" in name else None
+
+
+def compare(base, diff, threshold):
+    """
+    linhas (nome, base, diff, variação, regressão) para os
+    benchmarks rodados; os que só estão no baseline foram filtrados
+    """
+
+    rows = []
+
+    for name in sorted(diff):
+        base_ns = base.get(name, {}).get("real_ns", math.nan)
+        diff_ns = diff.get(name, {}).get("real_ns", math.nan)
+
+        change = diff_ns / base_ns - 1.0
+
+        # uma regressão precisa passar do limite e do ruído medido
+        noise = (base.get(name, {}).get("stddev_ns", 0.0) + diff.get(name, {}).get("stddev_ns", 0.0)) / base_ns
+
+        rows.append((name, base_ns, diff_ns, change, change > max(threshold, 2 * noise)))
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="roda e compara o benchmark de intrusive_ptr do c10")
+    parser.add_argument("--binary", type=Path, default=DEFAULT_BINARY, help="binário c10_intrusive_ptr_benchmark")
+    parser.add_argument("--input", type=Path, help="usa esta saída json do benchmark em vez de rodar o binário")
+    parser.add_argument("--filter", default="", help="regex repassado a --benchmark_filter")
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--min-time", default="", help="repassado a --benchmark_min_time")
+    parser.add_argument("--save", type=Path, help="grava os resultados como baseline")
+    parser.add_argument("--baseline", type=Path, help="baseline gravado com --save para comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="fração de lentidão tolerada (padrão: 0.10)")
+    parser.add_argument("--format", default="table", help="formato do output (table, md, csv)")
+
+    args = parser.parse_args()
+
+    if args.input:
+        data = json.loads(args.input.read_text())
+    else:
+        data = run_benchmark(args.binary, args.repetitions, args.filter, args.min_time)
+
+    results = parse_results(data)
+
+    if args.save:
+        args.save.write_text(json.dumps({"context": data.get("context", {}), "results": results}, indent=2))
+
+        print(f"{len(results)} resultados gravados em {args.save}", file=sys.stderr)
+
+    header_fmt = {
+        "table": "{:64s} {:>12s} {:>12s} {:>10s}",
+        "md": "| {:64s} | {:>12s} | {:>12s} | {:>10s} |",
+        "csv": "{:s}, {:s}, {:s}, {:s}"
+    }[args.format]
+
+    data_fmt = {
+        "table": "{:64s} {:12.2f} {:12.2f} {:9.1f}%{}",
+        "md": "| {:64s} | {:12.2f} | {:12.2f} | {:9.1f}% |{}",
+        "csv": "{:s}, {:.2f}, {:.2f}, {:.2f}%{}"
+    }[args.format]
+
+    def print_header(*columns):
+        print(header_fmt.format(*columns))
+
+        if args.format == "md":
+            print(header_fmt.format(":---", "---:", "---:", "---:"))
+
+    if not args.baseline:
+        print_header("name", "intrusive (ns)", "shared (ns)", "% shared")
+
+        for name, entry in sorted(results.items()):
+            shared = results.get(shared_counterpart(name))
+
+            if shared is not None:
+                print(data_fmt.format(name, entry["real_ns"], shared["real_ns"], entry["real_ns"] / shared["real_ns"] * 100.0, ""))
+
+        return
+
+    base = json.loads(args.baseline.read_text())["results"]
+
+    rows = compare(base, results, args.threshold)
+
+    print_header("name", "base (ns)", "diff (ns)", "% change")
+
+    for name, base_ns, diff_ns, change, regressed in rows:
+        print(data_fmt.format(name, base_ns, diff_ns, change * 100.0, "  <- regressão" if regressed else ""))
+
+    regressions = [row for row in rows if row[4]]
+
+    if regressions:
+        print(f"{len(regressions)} benchmarks mais lentos que o limite de {args.threshold:.0%}", file=sys.stderr)
+
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+perfil por operador dos testes do benchmark fastrnns.
+
+captura, com o profiler do torch, o tempo de cpu próprio, o
+número de chamadas e a memória alocada de cada operador durante
+as iterações de um teste, normalizados por iteração. os perfis
+ficam num json com o mesmo aninhamento do `--print-json` do
+fastrnns.bench (`{suite: {teste: {op: estatísticas}}}`), para que
+compare-fastrnn-results.py case as linhas dos dois.
+
+os perfis são capturados depois das medidas de tempo, e apenas
+dos testes cujo tempo mudou entre os dois jsons: cada um é
+recriado pelos runners do fastrnns, com o fuser pedido e os
+tamanhos padrão do fastrnns.bench. testes de `-backward`
+perfilam a iteração de treino inteira (forward e backward).
+compare.sh roda isso com `PROFILE=1`::
+
+    python op_profile.py old.json te.json --fuser=old --output old-profile.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+
+from collections.abc import Callable
+from typing import Any
+
+
+STATS = ("self_cpu_us", "calls", "self_cpu_memory_bytes", "self_device_us")
+
+# tamanhos padrão do fastrnns.bench
+CREATOR_ARGS = {
+    "seqLength": 100,
+    "numLayers": 1,
+    "inputSize": 512,
+    "hiddenSize": 512,
+    "miniBatch": 64,
+    "seed": None
+}
+
+
+def capture(fn: Callable[[], Any], iters: int = 10, warmup: int = 2) -> dict[str, dict[str, float]]:
+    """op -> estatísticas por iteração de `fn`"""
+
+    import torch
+
+    from torch.profiler import profile, ProfilerActivity
+
+    for _ in range(warmup):
+        fn()
+
+    activities = [ProfilerActivity.CPU]
+
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+
+    with profile(activities=activities, profile_memory=True) as prof:
+        for _ in range(iters):
+            fn()
+
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+
+    ops = {}
+
+    for evt in prof.key_averages():
+        # self_cuda_time_total em versões antigas do profiler
+        device_us = getattr(evt, "self_device_time_total", getattr(evt, "self_cuda_time_total", 0))
+
+        ops[evt.key] = {
+            "self_cpu_us": evt.self_cpu_time_total / iters,
+            "calls": evt.count / iters,
+            "self_cpu_memory_bytes": evt.self_cpu_memory_usage / iters,
+            "self_device_us": device_us / iters
+        }
+
+    return ops
+
+
+def changed_tests(
+    base: dict[str, dict[str, float]],
+    diff: dict[str, dict[str, float]],
+    min_change: float
+) -> list[tuple[str, str]]:
+    """(suite, teste) dos testes medidos nos dois jsons cujo tempo variou pelo menos `min_change` %"""
+
+    changed = []
+
+    for suite in sorted(set(base) & set(diff)):
+        for test in sorted(set(base[suite]) & set(diff[suite])):
+            before, after = base[suite][test], diff[suite][test]
+
+            if before > 0 and abs(after / before - 1.0) * 100.0 >= min_change:
+                changed.append((suite, test))
+
+    return changed
+
+
+def profile_tests(
+    tests: list[tuple[str, str]],
+    fuser: str,
+    device: str = "cuda",
+    iters: int = 10
+) -> dict[str, dict[str, Any]]:
+    """perfis dos `tests`, recriados pelos runners do fastrnns com `fuser`"""
+
+    from fastrnns.fuser import set_fuser
+    from fastrnns.runner import get_nn_runners
+
+    set_fuser(fuser, None)
+
+    suites: dict[str, list[str]] = {}
+
+    for suite, test in tests:
+        suites.setdefault(test, []).append(suite)
+
+    profiles: dict[str, dict[str, Any]] = {}
+
+    for name, creator, context in get_nn_runners(*sorted(suites)):
+        with context():
+            modeldef = creator(**CREATOR_ARGS, device=device)
+
+            def forward() -> Any:
+                return modeldef.forward(*modeldef.inputs)
+
+            def train_step() -> None:
+                output = forward()
+
+                if modeldef.backward_setup is not None:
+                    output = modeldef.backward_setup(output)
+
+                modeldef.backward(*output)
+
+            for suite in suites[name]:
+                if suite.endswith("-backward"):
+                    if modeldef.backward is None:
+                        continue
+
+                    fn: Callable[[], Any] = train_step
+                else:
+                    fn = forward
+
+                profiles.setdefault(suite, {})[name] = capture(fn, iters)
+
+    return profiles
+
+
+def diff_ops(
+    base: dict[str, dict[str, float]],
+    diff: dict[str, dict[str, float]]
+) -> list[tuple[str, dict[str, float], dict[str, float]]]:
+    """
+    (op, base, diff) para os ops dos dois perfis, do que mais
+    contribui para a variação do tempo próprio ao que menos. ops
+    que só aparecem de um lado têm estatísticas zeradas no outro
+    """
+
+    zero = dict.fromkeys(STATS, 0.0)
+
+    rows = [(op, {**zero, **base.get(op, {})}, {**zero, **diff.get(op, {})}) for op in set(base) | set(diff)]
+
+    rows.sort(key=lambda row: (-abs(row[2]["self_cpu_us"] - row[1]["self_cpu_us"]), row[0]))
+
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser("perfis por op dos testes do fastrnns cujo tempo mudou")
+    parser.add_argument("base", help="json de tempos base (--print-json do fastrnns.bench)")
+    parser.add_argument("diff", help="json de tempos diff")
+    parser.add_argument("--fuser", required=True, help="fuser com que os testes são perfilados (old, te, ...)")
+    parser.add_argument("--output", required=True, help="arquivo json dos perfis")
+    parser.add_argument("--min-change", default=5.0, type=float, help="% de variação a partir da qual o teste é perfilado")
+    parser.add_argument("--device", default="cuda")
+    parser.add_argument("--iters", default=10, type=int, help="iterações perfiladas por teste")
+
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+
+    with open(args.diff) as f:
+        diff = json.load(f)
+
+    profiles = profile_tests(changed_tests(base, diff, args.min_change), args.fuser, args.device, args.iters)
+
+    with open(args.output, "w") as f:
+        json.dump(profiles, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
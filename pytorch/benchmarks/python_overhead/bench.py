@@ -0,0 +1,167 @@
+"""
+mede o overhead python dos caminhos quentes do front-end do torch.
+
+cada caso (ver cases.py) roda com timeit: o número de execuções
+por medida é escolhido para que cada medida leve pelo menos
+`--min-time`, e cada caso é medido `--repeats` vezes. o resultado
+guarda a mediana e os quartis do tempo por execução; a mediana e o
+intervalo interquartil são estáveis contra medidas perdidas para o
+agendador.
+
+uso, de dentro de benchmarks/::
+
+    python -m python_overhead.bench --json base.json
+    python -m python_overhead.bench --json diff.json  # em outro build
+    python -m python_overhead.bench --compare base.json diff.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import re
+import statistics
+import sys
+import timeit
+
+from typing import Any
+
+from .cases import CASES, Case
+
+
+def measure(case: Case, repeats: int, min_time: float) -> dict[str, Any]:
+    timer = timeit.Timer(case.stmt, globals=case.setup())
+
+    # aquecimento, que também escolhe o número de execuções
+    number = 1
+
+    while True:
+        elapsed = timer.timeit(number)
+
+        if elapsed >= min_time:
+            break
+
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+
+    samples = sorted(t / number * 1e9 for t in timer.repeat(repeats, number))
+
+    q1, median, q3 = statistics.quantiles(samples, n=4) if len(samples) > 1 else samples * 3
+
+    return {
+        "median_ns": median,
+        "min_ns": samples[0],
+        "q1_ns": q1,
+        "q3_ns": q3,
+        "number": number,
+        "repeats": repeats
+    }
+
+
+def environment() -> dict[str, Any]:
+    import torch
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "torch": torch.__version__,
+        "git_version": getattr(torch.version, "git_version", None)
+    }
+
+
+def run(pattern: str, repeats: int, min_time: float) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    skipped: dict[str, str] = {}
+
+    for case in CASES:
+        if not re.search(pattern, case.name):
+            continue
+
+        reason = case.skip()
+
+        if reason is not None:
+            skipped[case.name] = reason
+
+            continue
+
+        results[case.name] = measure(case, repeats, min_time)
+
+        print(f"{case.name:32s} {results[case.name]['median_ns']:10.1f} ns", file=sys.stderr)
+
+    return {"environment": environment(), "results": results, "skipped": skipped}
+
+
+def compare(base: dict[str, Any], diff: dict[str, Any], threshold: float) -> list[tuple[str, float, float, float, bool]]:
+    """
+    linhas (caso, base, diff, variação, regressão). uma regressão
+    precisa passar do limite e os intervalos interquartis não podem
+    se sobrepor
+    """
+
+    rows = []
+
+    for name in sorted(set(base["results"]) & set(diff["results"])):
+        b = base["results"][name]
+        d = diff["results"][name]
+
+        change = d["median_ns"] / b["median_ns"] - 1.0
+
+        rows.append((name, b["median_ns"], d["median_ns"], change, change > threshold and d["q1_ns"] > b["q3_ns"]))
+
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="benchmarks do overhead python do front-end do torch")
+    parser.add_argument("--filter", default="", help="regex dos casos a rodar")
+    parser.add_argument("--repeats", type=int, default=15)
+    parser.add_argument("--min-time", type=float, default=0.05, help="segundos mínimos por medida")
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    parser.add_argument("--list", action="store_true", help="lista os casos e sai")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "DIFF"), help="compara dois arquivos gravados com --json")
+    parser.add_argument("--threshold", type=float, default=0.05, help="fração de lentidão tolerada em --compare (padrão: 0.05)")
+
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(case.name for case in CASES))
+
+        return
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+
+        with open(args.compare[1]) as f:
+            diff = json.load(f)
+
+        rows = compare(base, diff, args.threshold)
+
+        print(f"{'caso':32s} {'base (ns)':>12s} {'diff (ns)':>12s} {'% change':>10s}")
+
+        for name, base_ns, diff_ns, change, regressed in rows:
+            print(f"{name:32s} {base_ns:12.1f} {diff_ns:12.1f} {change * 100.0:9.1f}%{'  <- regressão' if regressed else ''}")
+
+        regressions = [row for row in rows if row[4]]
+
+        if regressions:
+            print(f"{len(regressions)} casos mais lentos que o limite de {args.threshold:.0%}", file=sys.stderr)
+
+            sys.exit(1)
+
+        return
+
+    report = run(args.filter, args.repeats, args.min_time)
+
+    for name, reason in report["skipped"].items():
+        print(f"{name:32s} pulado: {reason}", file=sys.stderr)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
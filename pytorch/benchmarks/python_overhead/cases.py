@@ -0,0 +1,127 @@
+"""
+casos de benchmark do overhead python do front-end.
+
+cada caso é uma instrução curta medida com timeit, com o
+ambiente (`globals`) montado por uma função de setup. os casos só
+usam a cpu; os que dependem de um acelerador são pulados sem ele.
+
+os casos com prefixo `ref.` são referências do mesmo trabalho sem
+a camada do torch (por exemplo o módulo `_VariableFunctions` sem o
+encaminhamento do `torch._VF`), para separar o custo da camada do
+custo da operação.
+"""
+
+from __future__ import annotations
+
+import numbers
+
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class Case:
+    name: str
+    stmt: str
+    setup: Callable[[], dict[str, Any]] = field(default=dict)
+
+    # motivo para pular o caso neste ambiente, ou none
+    skip: Callable[[], str | None] = field(default=lambda: None)
+
+
+def _vf_setup() -> dict[str, Any]:
+    import torch
+
+    from torch import _VF
+
+    return {"torch": torch, "_VF": _VF, "VF": torch._C._VariableFunctions, "x": torch.ones(4)}
+
+
+def _device_index_setup() -> dict[str, Any]:
+    import torch
+
+    from torch.accelerator._utils import _get_device_index
+
+    acc = torch.accelerator.current_accelerator()
+
+    return {
+        "torch": torch,
+        "_get_device_index": _get_device_index,
+        "device": torch.device(acc.type, 0) if acc is not None else None,
+        "device_str": f"{acc.type}:0" if acc is not None else None
+    }
+
+
+def _no_accelerator() -> str | None:
+    import torch
+
+    return None if torch.accelerator.current_accelerator() is not None else "sem acelerador"
+
+
+def _func_setup() -> dict[str, Any]:
+    import torch
+    import torch.func
+
+    def f(x):
+        return (x * x).sum()
+
+    def g(x):
+        return x * 2
+
+    return {"torch": torch, "func": torch.func, "f": f, "g": g, "x": torch.ones(4), "xs": torch.ones(8, 4)}
+
+
+def _number_setup() -> dict[str, Any]:
+    import torch
+
+    from torch.types import _Number
+
+    return {
+        "_Number": _Number,
+        "numbers": numbers,
+        "i": 3,
+        "fl": 1.5,
+        "b": True,
+        "t": torch.ones(()),
+        "literal": (int, float, bool)
+    }
+
+
+CASES = [
+    # encaminhamento de atributos do torch._VF
+    Case("vf.getattr", "_VF.lstm", _vf_setup),
+    Case("vf.getattr_missing", "getattr(_VF, 'does_not_exist', None)", _vf_setup),
+    Case("vf.call", "_VF.frobenius_norm(x, [0], False)", _vf_setup),
+    Case("ref.vf.getattr", "VF.lstm", _vf_setup),
+    Case("ref.vf.call", "VF.frobenius_norm(x, [0], False)", _vf_setup),
+
+    # resolução do índice de dispositivo
+    Case("device_index.int", "_get_device_index(0)", _device_index_setup),
+    Case("device_index.device", "_get_device_index(device)", _device_index_setup, _no_accelerator),
+    Case("device_index.str", "_get_device_index(device_str)", _device_index_setup, _no_accelerator),
+    Case("device_index.optional", "_get_device_index(None, True)", _device_index_setup, _no_accelerator),
+
+    # construção das transformações do torch.func, sem executá-las
+    Case("func.grad", "func.grad(f)", _func_setup),
+    Case("func.grad_argnums", "func.grad(f, argnums=(0,), has_aux=False)", _func_setup),
+    Case("func.grad_and_value", "func.grad_and_value(f)", _func_setup),
+    Case("func.vmap", "func.vmap(g)", _func_setup),
+    Case("func.vmap_in_dims", "func.vmap(g, in_dims=(0,), out_dims=0)", _func_setup),
+    Case("func.jacrev", "func.jacrev(f)", _func_setup),
+    Case("func.jacfwd", "func.jacfwd(f)", _func_setup),
+
+    # construção e execução, em tensores pequenos onde o overhead domina
+    Case("func.grad_call", "func.grad(f)(x)", _func_setup),
+    Case("func.vmap_call", "func.vmap(g)(xs)", _func_setup),
+    Case("ref.func.call", "f(x)", _func_setup),
+
+    # checks no estilo isinstance(x, torch.types._Number)
+    Case("number.int", "isinstance(i, _Number)", _number_setup),
+    Case("number.float", "isinstance(fl, _Number)", _number_setup),
+    Case("number.bool", "isinstance(b, _Number)", _number_setup),
+    Case("number.tensor_miss", "isinstance(t, _Number)", _number_setup),
+    Case("ref.number.literal", "isinstance(fl, literal)", _number_setup),
+    Case("ref.number.abc", "isinstance(fl, numbers.Number)", _number_setup),
+    Case("ref.number.abc_miss", "isinstance(t, numbers.Number)", _number_setup)
+]
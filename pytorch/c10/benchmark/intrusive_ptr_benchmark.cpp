@@ -2,11 +2,17 @@
 #include <c10/util/irange.h>
 
 #include <benchmark/benchmark.h>
+#include <algorithm>
 #include <memory>
+#include <thread>
+#include <unordered_map>
+#include <utility>
+#include <vector>
 
 using c10::intrusive_ptr;
 using c10::intrusive_ptr_target;
 using c10::make_intrusive;
+using c10::weak_intrusive_ptr;
 
 namespace {
     // foo utiliza ptr intrusivo
@@ -105,6 +111,274 @@ namespace {
     }
 
     BENCHMARK(BM_SharedPtrExclusiveOwnership);
+
+    // ---[ cenários com várias threads e cenários por tipo de ponteiro
+    //
+    // os benchmarks abaixo são templates sobre o tipo do ponteiro, para
+    // que intrusive_ptr e shared_ptr rodem exatamente o mesmo código
+
+    using IntrusiveFoo = intrusive_ptr<Foo>;
+    using SharedBar = std::shared_ptr<Bar>;
+
+    template <typename Ptr>
+    struct PtrTraits;
+
+    template <>
+    struct PtrTraits<IntrusiveFoo> {
+        using Weak = weak_intrusive_ptr<Foo>;
+
+        static IntrusiveFoo make(int param) {
+            return make_intrusive<Foo>(param);
+        }
+    };
+
+    template <>
+    struct PtrTraits<SharedBar> {
+        using Weak = std::weak_ptr<Bar>;
+
+        static SharedBar make(int param) {
+            return std::make_shared<Bar>(param);
+        }
+    };
+
+    int maxThreads() {
+        return std::max(2, static_cast<int>(std::thread::hardware_concurrency()));
+    }
+
+    // todas as threads copiam o mesmo ponteiro: o contador de
+    // referências fica numa única linha de cache disputada entre os
+    // núcleos, como quando várias threads compartilham um tensor
+    template <typename Ptr>
+    static void BM_ContendedCopy(benchmark::State& state) {
+        static const Ptr shared = PtrTraits<Ptr>::make(0);
+
+        while (state.KeepRunning()) {
+            Ptr copy = shared;
+
+            benchmark::DoNotOptimize(copy);
+        }
+
+        state.SetItemsProcessed(state.iterations());
+    }
+
+    BENCHMARK_TEMPLATE(BM_ContendedCopy, IntrusiveFoo)->ThreadRange(1, maxThreads())->UseRealTime();
+    BENCHMARK_TEMPLATE(BM_ContendedCopy, SharedBar)->ThreadRange(1, maxThreads())->UseRealTime();
+
+    // a mesma operação com um ponteiro por thread: a diferença para
+    // BM_ContendedCopy é o custo da disputa, não o das operações atômicas
+    template <typename Ptr>
+    static void BM_UncontendedCopy(benchmark::State& state) {
+        const Ptr local = PtrTraits<Ptr>::make(0);
+
+        while (state.KeepRunning()) {
+            Ptr copy = local;
+
+            benchmark::DoNotOptimize(copy);
+        }
+
+        state.SetItemsProcessed(state.iterations());
+    }
+
+    BENCHMARK_TEMPLATE(BM_UncontendedCopy, IntrusiveFoo)->ThreadRange(1, maxThreads())->UseRealTime();
+    BENCHMARK_TEMPLATE(BM_UncontendedCopy, SharedBar)->ThreadRange(1, maxThreads())->UseRealTime();
+
+    // mover não toca no contador de referências
+    template <typename Ptr>
+    static void BM_Move(benchmark::State& state) {
+        Ptr a = PtrTraits<Ptr>::make(0);
+
+        while (state.KeepRunning()) {
+            Ptr b = std::move(a);
+
+            benchmark::DoNotOptimize(b);
+
+            a = std::move(b);
+        }
+    }
+
+    BENCHMARK_TEMPLATE(BM_Move, IntrusiveFoo);
+    BENCHMARK_TEMPLATE(BM_Move, SharedBar);
+
+    // copiar e atribuir por cópia, para comparar com BM_Move
+    template <typename Ptr>
+    static void BM_CopyAssign(benchmark::State& state) {
+        const Ptr a = PtrTraits<Ptr>::make(0);
+
+        Ptr b;
+
+        while (state.KeepRunning()) {
+            b = a;
+
+            benchmark::DoNotOptimize(b);
+
+            b.reset();
+        }
+    }
+
+    BENCHMARK_TEMPLATE(BM_CopyAssign, IntrusiveFoo);
+    BENCHMARK_TEMPLATE(BM_CopyAssign, SharedBar);
+
+    // promover um ponteiro fraco a forte: um loop de compare-exchange
+    // no contador de referências
+    template <typename Ptr>
+    static void BM_WeakLock(benchmark::State& state) {
+        static const Ptr strong = PtrTraits<Ptr>::make(0);
+        static const typename PtrTraits<Ptr>::Weak weak(strong);
+
+        while (state.KeepRunning()) {
+            Ptr locked = weak.lock();
+
+            benchmark::DoNotOptimize(locked);
+        }
+
+        state.SetItemsProcessed(state.iterations());
+    }
+
+    BENCHMARK_TEMPLATE(BM_WeakLock, IntrusiveFoo)->ThreadRange(1, maxThreads())->UseRealTime();
+    BENCHMARK_TEMPLATE(BM_WeakLock, SharedBar)->ThreadRange(1, maxThreads())->UseRealTime();
+
+    // lock de um ponteiro fraco cujo objeto já foi destruído
+    template <typename Ptr>
+    static void BM_WeakLockExpired(benchmark::State& state) {
+        Ptr strong = PtrTraits<Ptr>::make(0);
+
+        const typename PtrTraits<Ptr>::Weak weak(strong);
+
+        strong.reset();
+
+        while (state.KeepRunning()) {
+            Ptr locked = weak.lock();
+
+            benchmark::DoNotOptimize(locked);
+        }
+    }
+
+    BENCHMARK_TEMPLATE(BM_WeakLockExpired, IntrusiveFoo);
+    BENCHMARK_TEMPLATE(BM_WeakLockExpired, SharedBar);
+
+    // criar e copiar ponteiros fracos também altera o contador fraco
+    template <typename Ptr>
+    static void BM_WeakCopy(benchmark::State& state) {
+        const Ptr strong = PtrTraits<Ptr>::make(0);
+
+        const typename PtrTraits<Ptr>::Weak weak(strong);
+
+        while (state.KeepRunning()) {
+            typename PtrTraits<Ptr>::Weak copy = weak;
+
+            benchmark::DoNotOptimize(copy);
+        }
+    }
+
+    BENCHMARK_TEMPLATE(BM_WeakCopy, IntrusiveFoo);
+    BENCHMARK_TEMPLATE(BM_WeakCopy, SharedBar);
+
+    // vazão de alocação: cria e destrói lotes de objetos, com todas as
+    // threads disputando o alocador
+    template <typename Ptr>
+    static void BM_MakeBatch(benchmark::State& state) {
+        const size_t kLength = state.range(0);
+
+        std::vector<Ptr> batch;
+
+        batch.reserve(kLength);
+
+        while (state.KeepRunning()) {
+            for (const auto i : c10::irange(kLength)) {
+                batch.push_back(PtrTraits<Ptr>::make(static_cast<int>(i)));
+            }
+
+            batch.clear();
+        }
+
+        state.SetItemsProcessed(state.iterations() * kLength);
+    }
+
+    // NOLINTNEXTLINE(cppcoreguidelines-avoid-non-const-global-variables,cppcoreguidelines-avoid-magic-numbers)
+    BENCHMARK_TEMPLATE(BM_MakeBatch, IntrusiveFoo)->Arg(1024)->ThreadRange(1, maxThreads())->UseRealTime();
+    // NOLINTNEXTLINE(cppcoreguidelines-avoid-non-const-global-variables,cppcoreguidelines-avoid-magic-numbers)
+    BENCHMARK_TEMPLATE(BM_MakeBatch, SharedBar)->Arg(1024)->ThreadRange(1, maxThreads())->UseRealTime();
+
+    // copiar um vetor de ponteiros distintos, como uma lista de tensores
+    template <typename Ptr>
+    static void BM_VectorCopy(benchmark::State& state) {
+        const size_t kLength = state.range(0);
+
+        std::vector<Ptr> source;
+
+        source.reserve(kLength);
+
+        for (const auto i : c10::irange(kLength)) {
+            source.push_back(PtrTraits<Ptr>::make(static_cast<int>(i)));
+        }
+
+        while (state.KeepRunning()) {
+            std::vector<Ptr> copy = source;
+
+            benchmark::DoNotOptimize(copy.data());
+        }
+
+        state.SetItemsProcessed(state.iterations() * kLength);
+    }
+
+    // NOLINTNEXTLINE(cppcoreguidelines-avoid-non-const-global-variables,cppcoreguidelines-avoid-magic-numbers)
+    BENCHMARK_TEMPLATE(BM_VectorCopy, IntrusiveFoo)->RangeMultiplier(4)->Range(16, 4096);
+    // NOLINTNEXTLINE(cppcoreguidelines-avoid-non-const-global-variables,cppcoreguidelines-avoid-magic-numbers)
+    BENCHMARK_TEMPLATE(BM_VectorCopy, SharedBar)->RangeMultiplier(4)->Range(16, 4096);
+
+    // crescer um vetor sem reserve: cada realocação move os ponteiros
+    template <typename Ptr>
+    static void BM_VectorGrow(benchmark::State& state) {
+        const size_t kLength = state.range(0);
+
+        const Ptr var = PtrTraits<Ptr>::make(0);
+
+        while (state.KeepRunning()) {
+            std::vector<Ptr> vec;
+
+            for (const auto i : c10::irange(kLength)) {
+                (void)i;
+
+                vec.push_back(var);
+            }
+
+            benchmark::DoNotOptimize(vec.data());
+        }
+
+        state.SetItemsProcessed(state.iterations() * kLength);
+    }
+
+    // NOLINTNEXTLINE(cppcoreguidelines-avoid-non-const-global-variables,cppcoreguidelines-avoid-magic-numbers)
+    BENCHMARK_TEMPLATE(BM_VectorGrow, IntrusiveFoo)->RangeMultiplier(4)->Range(16, 4096);
+    // NOLINTNEXTLINE(cppcoreguidelines-avoid-non-const-global-variables,cppcoreguidelines-avoid-magic-numbers)
+    BENCHMARK_TEMPLATE(BM_VectorGrow, SharedBar)->RangeMultiplier(4)->Range(16, 4096);
+
+    // buscas que devolvem cópias, como um cache de objetos indexado
+    template <typename Ptr>
+    static void BM_MapLookupCopy(benchmark::State& state) {
+        const int kLength = static_cast<int>(state.range(0));
+
+        std::unordered_map<int, Ptr> map;
+
+        for (const auto i : c10::irange(kLength)) {
+            map.emplace(i, PtrTraits<Ptr>::make(i));
+        }
+
+        int key = 0;
+
+        while (state.KeepRunning()) {
+            Ptr found = map.find(key)->second;
+
+            benchmark::DoNotOptimize(found);
+
+            key = key + 1 == kLength ? 0 : key + 1;
+        }
+    }
+
+    // NOLINTNEXTLINE(cppcoreguidelines-avoid-non-const-global-variables,cppcoreguidelines-avoid-magic-numbers)
+    BENCHMARK_TEMPLATE(BM_MapLookupCopy, IntrusiveFoo)->Arg(1024);
+    // NOLINTNEXTLINE(cppcoreguidelines-avoid-non-const-global-variables,cppcoreguidelines-avoid-magic-numbers)
+    BENCHMARK_TEMPLATE(BM_MapLookupCopy, SharedBar)->Arg(1024);
 } // namespace
 
 BENCHMARK_MAIN();
\ No newline at end of file
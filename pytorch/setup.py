@@ -11,7 +11,10 @@
 # - build com info de debug apenas para arquivos específicos
 #
 # max_jobs
-# - número máximo de jobs de compilação que devemos usar para compilar o código
+# - número máximo de jobs de compilação que devemos usar para compilar o código.
+#   quando indefinido, o número de jobs é o número de núcleos e
+#   cada compilação espera por memória livre (ver
+#   pytorch_job_governor)
 #
 # use_cuda=0
 # - desabilita a build do cuda
@@ -95,6 +98,58 @@
 #
 # use_nnpack=0
 # - desativa a build do nnpack
+#
+# use_unity_build=1
+# - compila as fontes do caffe2 em lotes unity (ver
+#   torch/cmake/Unity.cmake), analisando os headers do aten e do
+#   c10 uma vez por lote
+#
+# cmake_unity_build_batch_size
+# - número de fontes por lote unity (padrão: 16)
+#
+# pytorch_artifact_cache
+# - diretório de um cache local de artefatos do libtorch (tudo o
+#   que o build nativo instala, mais os .pyi gerados),
+#   compartilhado entre checkouts e indexado pelas variáveis do
+#   cmake, pelos compiladores e pela árvore de fontes
+#
+# pytorch_build_memory_budget
+# - orçamento de memória do build nativo (por exemplo, 48G); por
+#   padrão, 90% da memória disponível no início do build
+#
+# pytorch_cmake_probe_cache
+# - diretório onde os resultados das sondagens de abi do blas
+#   são guardados entre configures (padrão:
+#   ~/.cache/torch/cmake_probes); OFF desativa
+#
+# pytorch_configure_fingerprint=0
+# - roda o configure do cmake sempre, em vez de pulá-lo quando
+#   nenhuma entrada dele mudou desde o último configure (ver
+#   tools/setup_helpers/configure_fingerprint.py)
+#
+# pytorch_job_governor=0
+# - desativa o controle de jobs guiado por memória usado quando
+#   max_jobs não está definido (ver
+#   tools/setup_helpers/job_governor.py)
+#
+# pytorch_skip_unchanged_native=0
+# - sempre executa o build nativo, em vez de pulá-lo quando só
+#   arquivos python ou de empacotamento mudaram desde o último
+#   build nativo (ver tools/setup_helpers/native_manifest.py)
+#
+# pytorch_ninja_report=1
+# - depois do build nativo, analisa o .ninja_log e reporta o
+#   caminho crítico, o paralelismo, as unidades de tradução mais
+#   lentas e os headers mais custosos (ver
+#   tools/analyze_ninja_log.py)
+#
+# pytorch_shallow_submodules=0
+# - ao inicializar os submódulos, faz clones completos e em série
+#   em vez de clones rasos, sem blobs e em paralelo
+#
+# pytorch_submodule_mirror
+# - diretório com um repositório por submódulo (<nome>.git ou
+#   <nome>) usado como referência ao inicializar os submódulos
 
 from __future__ import annotations
 
@@ -144,11 +199,13 @@ import time
 import zipfile
 
 from collections import defaultdict
+from collections.abc import Collection
 from pathlib import Path
 from typing import Any, ClassVar, IO
 
 import setuptools.command.bdist_wheel
 import setuptools.command.build_ext
+import setuptools.command.build_py
 import setuptools.command.sdist
 import setuptools.errors
 from setuptools import Command, Extension, find_packages, setup
@@ -180,7 +237,15 @@ os.environ["PYTHONPATH"] = os.pathsep.join(
 
 from tools.build_pytorch_libs import build_pytorch
 from tools.generate_torch_version import get_torch_version
-from tools.setup_helpers.cmake import CMake, CMakeValue
+from tools.setup_helpers.cmake import CMake
+from tools.setup_helpers.cmake_cache import CMakeValue, install_cmake_cache, read_cmake_cache
+from tools.setup_helpers.artifact_cache import install_artifact_cache
+from tools.setup_helpers.build_timeline import timeline
+from tools.setup_helpers.configure_fingerprint import install_configure_fingerprint
+from tools.setup_helpers.env_flags import str2bool
+from tools.setup_helpers.job_governor import configure_build_jobs
+from tools.setup_helpers.native_manifest import NativeManifest
+from tools.setup_helpers.package_manifest import build_package_manifest
 
 from tools.setup_helpers.env import (
     BUILD_DIR,
@@ -191,53 +256,6 @@ from tools.setup_helpers.env import (
 )
 
 
-def str2bool(value: str | None) -> bool:
-    """converte as variáveis de ambiente em valores booleanos."""
-
-    if not value:
-        return False
-    
-    if not isinstance(value, str):
-        raise ValueError(
-            f"esperava-se um valor de string para a conversão booleana, mas obteu-se {type(value)}"
-        )
-    
-    value = value.strip().lower()
-
-    if value in (
-        "1",
-        "true",
-        "t",
-        "yes",
-        "y",
-        "on",
-        "enable",
-        "enabled",
-        "found"
-    ):
-        return True
-    
-    if value in (
-        "0",
-        "false",
-        "f",
-        "no",
-        "n",
-        "off",
-        "disable",
-        "disabled",
-        "notfound",
-        "none",
-        "null",
-        "nil",
-        "undefined",
-        "n/a"
-    ):
-        return False
-    
-    raise ValueError(f"valor de string inválido para conversão booleana: {value}")
-
-
 def _get_package_path(package_name: str) -> Path:
     from importlib.util import find_spec
 
@@ -423,6 +441,26 @@ report(f"roda de construção {TORCH_PACKAGE_NAME}-{TORCH_VERSION}")
 
 cmake = CMake()
 
+# as leituras do CMakeCache.txt pelo objeto cmake passam pelo
+# mesmo parser memoizado de `get_cmake_cache_vars`
+install_cmake_cache(cmake)
+
+# a configuração e a compilação nativa acontecem dentro de
+# `build_pytorch`; envolver os métodos do objeto cmake as torna
+# visíveis na linha do tempo do build
+cmake.generate = timeline.wrap(cmake.generate, "cmake configure") # type: ignore[method-assign]
+cmake.build = timeline.wrap(cmake.build, "native build") # type: ignore[method-assign]
+
+# com `PYTORCH_ARTIFACT_CACHE` definida, um build com as mesmas
+# fontes e opções já compilado em outro checkout é restaurado em
+# vez de compilado
+install_artifact_cache(cmake, CWD, CWD / BUILD_DIR, report)
+
+# o configure só roda quando alguma entrada dele (variáveis USE_*,
+# compiladores, flags, CMakeLists) mudou desde o último configure;
+# do zero apenas se o ambiente ou os argumentos mudaram
+install_configure_fingerprint(cmake, CWD, CWD / BUILD_DIR, report)
+
 
 def get_submodule_folders() -> list[Path]:
     git_modules_file = CWD / ".gitmodules"
@@ -452,13 +490,72 @@ def get_submodule_folders() -> list[Path]:
         ]
     
 
+def _init_submodules_shallow(folders: list[Path]) -> None:
+    """
+    inicializa os submódulos em paralelo, com clones rasos e sem
+    blobs.
+
+    se `PYTORCH_SUBMODULE_MIRROR` apontar para um diretório com um
+    repositório por submódulo (`<nome>.git` ou `<nome>`, por
+    exemplo clones bare locais), ele é usado como referência e os
+    objetos já presentes nele não são baixados de novo
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    # sem paths, `git submodule init --` registraria todos os
+    # submódulos, e o pool não aceita zero workers
+    if not folders:
+        return
+
+    mirror = os.getenv("PYTORCH_SUBMODULE_MIRROR")
+
+    # `init` escreve no .git/config do repositório principal,
+    # então roda uma única vez antes das atualizações paralelas
+    subprocess.check_call(
+        ["git", "submodule", "init", "--", *(f.relative_to(CWD).as_posix() for f in folders)],
+        cwd=CWD
+    )
+
+    def update(folder: Path) -> None:
+        cmd = [
+            "git",
+            "submodule",
+            "update",
+            # os submódulos já foram registrados acima; `--init` é
+            # exigido pelo git para aceitar `--filter`
+            "--init",
+            "--depth",
+            "1",
+            "--filter=blob:none",
+            "--recursive"
+        ]
+
+        if mirror:
+            for candidate in (Path(mirror) / f"{folder.name}.git", Path(mirror) / folder.name):
+                if candidate.is_dir():
+                    cmd += ["--reference", str(candidate), "--dissociate"]
+
+                    break
+
+        cmd += ["--", folder.relative_to(CWD).as_posix()]
+
+        result = subprocess.run(cmd, cwd=CWD, capture_output=True, text=True)
+
+        if result.returncode != 0:
+            raise RuntimeError(f"falha ao inicializar {folder}:\n{result.stderr}")
+
+    with ThreadPoolExecutor(max_workers=min(8, len(folders))) as pool:
+        list(pool.map(update, folders))
+
+
+@timeline.phase("check_submodules")
 def check_submodules() -> None:
-    def check_for_files(folder: Path, files: list[str]) -> None:
+    def missing_files(folder: Path, files: list[str]) -> str | None:
         if not any((folder / f).exists() for f in files):
-            report("não foi possível encontrar nenhum de {} em {}".format(", ".join(files), folder))
-            report("você rodou 'git submodule update --init --recursive'?")
+            return "não foi possível encontrar nenhum de {} em {}".format(", ".join(files), folder)
 
-            sys.exit(1)
+        return None
 
     def not_exists_or_empty(folder: Path) -> bool:
         return not folder.exists() or (
@@ -473,26 +570,41 @@ def check_submodules() -> None:
     # se nenhuma das pastas de submódulos existir, tentar
     # inicializá-las
     if all(not_exists_or_empty(folder) for folder in folders):
-        try:
-            report(" --- tentando inicializar os submódulos")
+        start = time.time()
 
-            start = time.time()
-            
-            subprocess.check_call(
-                ["git", "submodule", "update", "--init", "--recursive"], cwd=CWD
-            )
+        shallow = str2bool(os.getenv("PYTORCH_SHALLOW_SUBMODULES", "1"))
+
+        if shallow:
+            try:
+                report(" --- tentando inicializar os submódulos (raso e em paralelo)")
+
+                _init_submodules_shallow(folders)
+            except Exception as e:
+                report(f" --- inicialização rasa falhou, tentando a completa: {e}")
+
+                shallow = False
 
-            end = time.time()
+        if not shallow:
+            try:
+                report(" --- tentando inicializar os submódulos")
 
-            report(f" --- inicialização de submódulo levou {end - start:.2f} seg")
-        except Exception:
-            report(" --- inicialização de submódulo falhou")
-            report("rode:\n\tgit submodule update --init --recursive")
+                subprocess.check_call(
+                    ["git", "submodule", "update", "--init", "--recursive"], cwd=CWD
+                )
+            except Exception:
+                report(" --- inicialização de submódulo falhou")
+                report("rode:\n\tgit submodule update --init --recursive")
+
+                sys.exit(1)
+
+        end = time.time()
+
+        report(f" --- inicialização de submódulo levou {end - start:.2f} seg")
 
-            sys.exit(1)
+    from concurrent.futures import ThreadPoolExecutor
 
-    for folder in folders:
-        check_for_files(
+    checks = [
+        (
             folder,
 
             [
@@ -505,12 +617,129 @@ def check_submodules() -> None:
             ]
         )
 
-    check_for_files(
-        THIRD_PARTY_DIR / "fbgemm" / "external" / "asmjit",
+        for folder in folders
+    ]
+
+    checks.append(
+        (
+            THIRD_PARTY_DIR / "fbgemm" / "external" / "asmjit",
 
-        ["CMakeLists.txt"]
+            ["CMakeLists.txt"]
+        )
     )
 
+    # valida todas as pastas em paralelo e reporta todas as que
+    # faltarem de uma vez
+    with ThreadPoolExecutor(max_workers=min(16, len(checks))) as pool:
+        errors = [e for e in pool.map(lambda check: missing_files(*check), checks) if e]
+
+    if errors:
+        for error in errors:
+            report(error)
+
+        report("você rodou 'git submodule update --init --recursive'?")
+
+        sys.exit(1)
+
+
+def _file_is_current(src: Path, dst: Path) -> bool:
+    """
+    indica se `dst` já é uma cópia de `src`.
+
+    compara primeiro tamanho e mtime; se apenas o mtime diferir,
+    compara o conteúdo e, se for igual, sincroniza o mtime para
+    que a próxima verificação seja barata.
+    """
+
+    try:
+        dst_stat = dst.stat()
+    except FileNotFoundError:
+        return False
+
+    src_stat = src.stat()
+
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+
+    if src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+        return True
+
+    if not filecmp.cmp(src, dst, shallow=False):
+        return False
+
+    shutil.copystat(src, dst)
+
+    return True
+
+
+def _sync_file(src: Path, dst: Path) -> bool:
+    """copia `src` para `dst` se necessário. retorna se copiou"""
+
+    if _file_is_current(src, dst):
+        return False
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+
+    # copy2 preserva o mtime, o que permite pular o arquivo na
+    # próxima execução
+    shutil.copy2(src, dst)
+
+    return True
+
+
+def _sync_tree(src_dir: Path, dst_dir: Path) -> tuple[int, int, int]:
+    """
+    espelha `src_dir` em `dst_dir` de forma incremental.
+
+    apenas arquivos novos ou alterados são copiados, em paralelo
+    para árvores grandes, e arquivos que não existem mais na
+    origem são removidos. retorna (copiados, pulados, removidos).
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    removed = 0
+
+    # remove antes de copiar o que não existe mais na origem, ou
+    # existe com outro tipo (arquivo que virou diretório e vice-versa)
+    for root, dirs, files in os.walk(dst_dir):
+        rel_root = Path(root).relative_to(dst_dir)
+
+        for name in files:
+            if not (src_dir / rel_root / name).is_file():
+                (Path(root) / name).unlink()
+
+                removed += 1
+
+        for name in list(dirs):
+            path = Path(root) / name
+
+            if not (src_dir / rel_root / name).is_dir():
+                removed += sum(len(stale) for _, _, stale in os.walk(path))
+
+                if path.is_symlink():
+                    path.unlink()
+                else:
+                    shutil.rmtree(path)
+
+                dirs.remove(name)
+
+    pairs: list[tuple[Path, Path]] = []
+
+    for root, _, files in os.walk(src_dir):
+        rel_root = Path(root).relative_to(src_dir)
+
+        for name in files:
+            pairs.append((src_dir / rel_root / name, dst_dir / rel_root / name))
+
+    if len(pairs) > 64:
+        with ThreadPoolExecutor(max_workers=min(16, os.cpu_count() or 1)) as pool:
+            copied = sum(pool.map(lambda pair: _sync_file(*pair), pairs))
+    else:
+        copied = sum(_sync_file(src, dst) for src, dst in pairs)
+
+    return copied, len(pairs) - copied, removed
+
 
 # o windows oferece um suporte muito ruim para links
 # simbólicos. em vez de usar links simbólicos, copiar os
@@ -538,31 +767,46 @@ def mirror_files_into_torchgen() -> None:
         )
     ]
 
+    copied = skipped = removed = 0
+
     for new_path, orig_path in paths:
         # cria os diretórios envolvidos em new_path caso
         # ainda não existam
         if not new_path.exists():
             new_path.parent.mkdir(parents=True, exist_ok=True)
 
-        # copia os arquivos da localização original para a nova
-        # localização
+        # copia apenas o que mudou da localização original para
+        # a nova localização
         if orig_path.is_file():
-            shutil.copyfile(orig_path, new_path)
+            if new_path.is_dir() and not new_path.is_symlink():
+                shutil.rmtree(new_path)
+
+            if _sync_file(orig_path, new_path):
+                copied += 1
+            else:
+                skipped += 1
 
             continue
 
         if orig_path.is_dir():
-            if new_path.exists():
-                # copytree falha se a árvore já existir, então
-                # remover ela
-                shutil.rmtree(new_path)
+            if new_path.is_file():
+                new_path.unlink()
 
-            shutil.copytree(orig_path, new_path)
+            tree_copied, tree_skipped, tree_removed = _sync_tree(orig_path, new_path)
+
+            copied += tree_copied
+            skipped += tree_skipped
+            removed += tree_removed
 
             continue
 
         raise RuntimeError("verifique os paths dos arquivos em `mirror_files_into_torchgen()`")
-    
+
+    report(
+        f"-- espelhamento do torchgen: {copied} copiados, {skipped} pulados, "
+        f"{removed} removidos"
+    )
+
 
 def mirror_inductor_external_kernels() -> None:
     """
@@ -626,10 +870,146 @@ def extract_variant_from_version(version: str) -> str:
     return variant_match.group(1) if variant_match else "cpu"
 
 
+def _nightly_hash_cache_file() -> Path:
+    """arquivo do cache persistente de versão nightly -> commit de origem"""
+
+    override = os.getenv("PYTORCH_NIGHTLY_HASH_CACHE")
+
+    if override:
+        return Path(override)
+
+    cache_home = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+
+    return Path(cache_home) / "pytorch" / "nightly-git-hashes.json"
+
+
+def _load_nightly_hash_cache() -> dict[str, str]:
+    try:
+        with _nightly_hash_cache_file().open(encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return data if isinstance(data, dict) else {}
+
+
+def _store_nightly_hash(version: str, commit: str) -> None:
+    cache_file = _nightly_hash_cache_file()
+
+    data = _load_nightly_hash_cache()
+    data[version] = commit
+
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+
+        # escreve em um arquivo temporário e renomeia, para que
+        # builds concorrentes nunca leiam um cache pela metade
+        with tempfile.NamedTemporaryFile(
+            "w",
+            dir=cache_file.parent,
+            suffix=".tmp",
+            delete=False,
+            encoding="utf-8"
+        ) as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+        os.replace(f.name, cache_file)
+    except OSError as e:
+        report(f"-- não foi possível salvar o cache de hashes nightly: {e}")
+
+
+def read_wheel_git_version(wheel_file: Path) -> str:
+    """
+    lê `git_version` de `torch/version.py` direto do diretório
+    central do zip do wheel, sem extrair nada para o disco
+    """
+
+    from ast import literal_eval
+
+    with zipfile.ZipFile(wheel_file, "r") as zip_ref:
+        members = [
+            name
+
+            for name in zip_ref.namelist()
+
+            if name == "torch/version.py" or name.endswith("/torch/version.py")
+        ]
+
+        if not members:
+            raise RuntimeError(f"não foi possível encontrar version.py no wheel {wheel_file.name}")
+
+        # apenas este membro é lido e descomprimido
+        content = zip_ref.read(min(members, key=len)).decode("utf-8")
+
+    for line in content.splitlines():
+        if line.strip().startswith("git_version"):
+            try:
+                # analisa a atribuição git_version, ex: git_version = "abc123def456"
+                return literal_eval(line.partition("=")[2].strip())
+            except (ValueError, SyntaxError):
+                continue
+
+    raise RuntimeError(
+        f"não foi possível analisar git_version do version.py do wheel {wheel_file.name}"
+    )
+
+
+def resolve_nightly_source_commit(nightly_commit: str, repo: Path = CWD) -> str:
+    """
+    mapeia um commit da branch nightly para o commit de origem
+    citado na sua mensagem. a branch só é buscada se o commit
+    ainda não existir localmente
+    """
+
+    import re
+
+    has_commit = subprocess.run(
+        ["git", "cat-file", "-e", f"{nightly_commit}^{{commit}}"],
+        
+        cwd=str(repo),
+        capture_output=True
+    ).returncode == 0
+
+    if not has_commit:
+        report("-- buscando a nightly branch para extrair o commit de origem...")
+
+        # busca apenas a nightly branch
+        subprocess.check_call(["git", "fetch", "origin", "nightly"], cwd=str(repo))
+
+    # obtém a mensagem do commit nightly
+    commit_message = subprocess.check_output(
+        ["git", "show", "--no-patch", "--format=%s", nightly_commit],
+        
+        cwd=str(repo),
+        text=True
+    ).strip()
+
+    # analisa a mensagem do commit para extrair o hash real
+    #
+    # formato: "2025-08-06 nightly release (74a754aae98aabc2aca67e5edb41cc684fae9a82)"
+    hash_match = re.search(r"\(([0-9a-fA-F]{40})\)", commit_message)
+
+    if not hash_match:
+        raise RuntimeError(
+            f"não foi possível analisar o commit hash da mensagem do commit nightly: {commit_message}"
+        )
+
+    return hash_match.group(1)
+
+
 # atenção: isso é um ai slop
 def get_nightly_git_hash(version: str) -> str:
     """baixa o wheel nightly e extrai o git hash do seu arquivo version.py"""
 
+    # mapeamentos já resolvidos não precisam de download nem de
+    # acesso à rede
+    cached = _load_nightly_hash_cache().get(version)
+
+    if cached:
+        report(f"-- commit de origem em cache para {version}: {cached[:12]}...")
+
+        return cached
+
     # extrai a variante da versão para construir o url correto
     variant = extract_variant_from_version(version)
     nightly_index_url = f"https://download.pytorch.org/whl/nightly/{variant}/"
@@ -668,90 +1048,70 @@ def get_nightly_git_hash(version: str) -> str:
         if not wheel_files:
             raise RuntimeError(f"nenhum torch wheel encontrado depois de baixar {version}")
         
-        wheel_file = wheel_files[0]
+        # lê o git_version (commit branch do nightly) direto do wheel
+        nightly_commit = read_wheel_git_version(wheel_files[0])
 
-        # extrai o wheel e procura por version.py
-        with tempfile.TemporaryDirectory(
-            prefix="pytorch-wheel-extract-"
-        ) as extract_dir:
-            extract_path = Path(extract_dir)
+    # agora, extrai o commit de origem real da mensagem do
+    # commit nightly
+    real_commit = resolve_nightly_source_commit(nightly_commit)
 
-            with zipfile.ZipFile(wheel_file, "r") as zip_ref:
-                zip_ref.extractall(extract_path)
+    report(f"-- commit de origem extraído: {real_commit[:12]}...")
 
-            # encontra o diretório torch e version.py
-            torch_dirs = list(extract_path.glob("torch"))
+    _store_nightly_hash(version, real_commit)
 
-            if not torch_dirs:
-                torch_dirs = list(extract_path.glob("*/torch"))
+    return real_commit
 
-            if not torch_dirs:
-                raise RuntimeError(f"não foi possível encontrar o diretório do torch no wheel {version}")
-            
-            version_file = torch_dirs[0] / "version.py"
 
-            if not version_file.exists():
-                raise RuntimeError(f"não foi possível encontrar version.py no wheel {version}")
-            
-            # lê e analisa version.py para extrair git_version (commit branch do nightly)
-            from ast import literal_eval
-
-            nightly_commit = None
-
-            with version_file.open(encoding="utf-8") as f:
-                for line in f:
-                    if line.strip().startswith("git_version"):
-                        try:
-                            # analisa a atribuição git_version, ex: git_version = "abc123def456"
-                            nightly_commit = literal_eval(
-                                line.partition("=")[2].strip()
-                            )
-
-                            break
-                        except (ValueError, SyntaxError):
-                            continue
-
-            if not nightly_commit:
-                raise RuntimeError(
-                    f"não foi possível analisar git_version do version.py do wheel {version}"
-                )
-            
-            # agora, busca a nightly branch e extrai o commit de origem real da mensagem
-            report("-- buscando a nightly branch para extrair o commit de origem...")
+# atenção: isso é um ai slop
+def get_latest_nightly_version(variant: str = "cpu") -> str:
+    """..."""
 
-            # busca apenas a nightly branch
-            subprocess.check_call(["git", "fetch", "origin", "nightly"], cwd=str(CWD))
 
-            # obtém a mensagem do commit nightly
-            commit_message = subprocess.check_output(
-                ["git", "show", "--no-patch", "--format=%s", nightly_commit],
-                
-                cwd=str(CWD),
-                text=True
-            ).strip()
+def get_cmake_cache_vars() -> defaultdict[str, CMakeValue]:
+    # o arquivo é analisado uma única vez por processo enquanto
+    # não mudar; variáveis ausentes (ou o cache inteiro, ao
+    # rodar "python setup.py clean" em um diretório limpo) valem
+    # false
+    return defaultdict(
+        lambda: False,
+        read_cmake_cache(CWD / BUILD_DIR / "CMakeCache.txt")
+    )
 
-            # analisa a mensagem do commit para extrair o hash real
-            #
-            # formato: "2025-08-06 nightly release (74a754aae98aabc2aca67e5edb41cc684fae9a82)"
-            import re
 
-            hash_match = re.search(r"\(([0-9a-fA-F]{40})\)", commit_message)
+def with_package_manifest(
+    build_py: type[setuptools.command.build_py.build_py],
+    package: str,
+    package_dir: Path,
+    cache_file: Path,
+    hidden_patterns: Collection[str] = ()
+) -> type[setuptools.command.build_py.build_py]:
+    """
+    `build_py` que expande os padrões de `package_data` de
+    `package` em uma única passada sobre `package_dir`. só os
+    padrões em `hidden_patterns` incluem arquivos ocultos.
+
+    a expansão acontece quando o setuptools pede os arquivos de
+    dados (no build_py, no egg_info ou no sdist), e não ao montar
+    os argumentos do setup, para que arquivos gerados pelos
+    comandos que rodaram antes entrem no manifesto
+    """
 
-            if hash_match:
-                real_commit = hash_match.group(1)
+    class build_py_with_manifest(build_py):  # type: ignore[misc, valid-type]
+        def _get_data_files(self):  # type: ignore[no-untyped-def]
+            patterns = self.package_data.get(package)
 
-                report(f"-- commit de origem extraído: {real_commit[:12]}...")
+            if patterns:
+                with timeline.phase("package_data manifest"):
+                    self.package_data[package] = build_package_manifest(
+                        package_dir,
+                        patterns,
+                        cache_file=cache_file,
+                        hidden_patterns=hidden_patterns
+                    )
 
-                return real_commit
-            else:
-                raise RuntimeError(
-                    f"não foi possível analisar o commit hash da mensagem do commit nightly: {commit_message}"
-                )
-            
+            return super()._get_data_files()
 
-# atenção: isso é um ai slop
-def get_latest_nightly_version(variant: str = "cpu") -> str:
-    """..."""
+    return build_py_with_manifest
 
 
 def print_box(msg: str) -> None:
@@ -802,21 +1162,61 @@ def main() -> None:
 
         sys.exit(1)
 
-    mirror_files_into_torchgen()
+    with timeline.phase("mirror_files_into_torchgen"):
+        mirror_files_into_torchgen()
+
+    # em instalações editáveis, se só arquivos python ou de
+    # empacotamento mudaram desde o último build nativo, torch/lib
+    # é reaproveitado como está
+    native_manifest = NativeManifest(CWD, CWD / BUILD_DIR, TORCH_LIB_DIR)
+
+    run_build_deps = RUN_BUILD_DEPS
+
+    if (
+        run_build_deps
+        and not (RERUN_CMAKE or CMAKE_ONLY)
+        and str2bool(os.getenv("PYTORCH_SKIP_UNCHANGED_NATIVE", "1"))
+    ):
+        with timeline.phase("native change detection"):
+            if native_manifest.is_current():
+                report("-- nenhuma entrada do build nativo mudou desde o último build; build_deps pulado")
+
+                run_build_deps = False
+
+    if run_build_deps:
+        configure_build_jobs(CWD / BUILD_DIR, report)
+
+        native_manifest.invalidate()
+
+        with timeline.phase("build_deps"):
+            build_deps()
+
+        native_manifest.record()
+
+        if str2bool(os.getenv("PYTORCH_NINJA_REPORT")):
+            from tools.analyze_ninja_log import report_build
 
-    if RUN_BUILD_DEPS:
-        build_deps()
-        mirror_inductor_external_kernels()
-    (
-        ext_modules,
-        cmdclass,
-        packages,
-        entry_points,
-        extra_install_requires
-    ) = configure_extension_build()
+            with timeline.phase("ninja report"):
+                report_build(CWD / BUILD_DIR, report)
+
+        with timeline.phase("mirror_inductor_external_kernels"):
+            mirror_inductor_external_kernels()
+
+    with timeline.phase("configure_extension_build"):
+        (
+            ext_modules,
+            cmdclass,
+            packages,
+            entry_points,
+            extra_install_requires
+        ) = configure_extension_build()
 
     install_requires += extra_install_requires
 
+    # padrões de `torch_package_data` cujos curingas também casam
+    # com arquivos e diretórios ocultos
+    torch_hidden_package_data: list[str] = []
+
     torch_package_data = [
         "py.typed",
         "bin/*",
@@ -878,31 +1278,44 @@ def main() -> None:
             "lib/*.lib"
         ]
 
-        # xxx: por quê não usar wildcards []
-        aotriton_image_path = TORCH_DIR / "lib" / "aotriton.images"
-
-        aks2_files = [
-            file.relative_to(TORCH_DIR).as_posix()
-
-            for file in aotriton_image_path.rglob("*")
+        # as imagens do aotriton entram no mesmo manifesto de
+        # passada única que os demais padrões abaixo. elas eram
+        # copiadas com `rglob("*")`, que inclui arquivos ocultos,
+        # então só este padrão opta por eles
+        torch_package_data += [
+            "lib/aotriton.images/**/*"
+        ]
 
-            if file.is_file()
+        torch_hidden_package_data += [
+            "lib/aotriton.images/**/*"
         ]
 
-        torch_package_data += aks2_files
+    cmake_cache_vars = get_cmake_cache_vars()
 
-    if get_cmake_cache_vars()["USE_TENSORPIPE"]:
+    if cmake_cache_vars["USE_TENSORPIPE"]:
         torch_package_data += [
             "include/tensorpipe/*.h",
             "include/tensorpipe/**/*.h"
         ]
 
-    if get_cmake_cache_vars()["USE_KINETO"]:
+    if cmake_cache_vars["USE_KINETO"]:
         torch_package_data += [
             "include/kineto/*.h",
             "include/kineto/**/*.h"
         ]
 
+    # expande todos os padrões acima em uma única passada sobre
+    # `torch/`, em vez de deixar o setuptools percorrer a árvore
+    # de `torch/include` uma vez por padrão recursivo. a expansão
+    # fica para o build_py, depois do build
+    cmdclass["build_py"] = with_package_manifest(
+        cmdclass.get("build_py", setuptools.command.build_py.build_py),
+        "torch",
+        TORCH_DIR,
+        CWD / BUILD_DIR / "torch_package_manifest.json",
+        torch_hidden_package_data
+    )
+
     torchgen_package_data = [
         "packaged/*",
         "packaged/**/*"
@@ -935,26 +1348,34 @@ def main() -> None:
         # nenhuma extensão no modo build_libtorch_whl
         ext_modules = []
 
-    setup(
-        name=TORCH_PACKAGE_NAME,
-        version=TORCH_VERSION,
-        ext_modules=ext_modules,
-        cmdclass=cmdclass,
-        packages=packages,
-        entry_points=entry_points,
-        install_requires=install_requires,
-        package_data=package_data,
-        exclude_package_data=exclude_package_data,
+    with timeline.phase("setup (empacotamento)"):
+        setup(
+            name=TORCH_PACKAGE_NAME,
+            version=TORCH_VERSION,
+            ext_modules=ext_modules,
+            cmdclass=cmdclass,
+            packages=packages,
+            entry_points=entry_points,
+            install_requires=install_requires,
+            package_data=package_data,
+            exclude_package_data=exclude_package_data,
         
-        # desativa a inclusão automática de arquivos de dados
-        # porque se quer controlar explicitamente com
-        # `package_data` acima
-        include_package_data=False
-    )
+            # desativa a inclusão automática de arquivos de dados
+            # porque se quer controlar explicitamente com
+            # `package_data` acima
+            include_package_data=False
+        )
 
     if EMIT_BUILD_WARNING:
         print_box(build_update_message)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        with timeline.phase("setup.py"):
+            main()
+    finally:
+        # clean, egg_info, sdist e --help não constroem nada, e
+        # gravar a linha do tempo recriaria build/ logo após um clean
+        if RUN_BUILD_DEPS and not any(arg in ("-h", "--help", "--help-commands") for arg in sys.argv[1:]):
+            timeline.finish(CWD / BUILD_DIR, report)
\ No newline at end of file
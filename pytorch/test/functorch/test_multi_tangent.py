@@ -0,0 +1,133 @@
+# Owner(s): ["module: functorch"]
+
+import torch
+
+from torch.func import jvp, multi_jvp, multi_vjp, vjp
+from torch.testing._internal.common_utils import run_tests, TestCase
+
+
+K = 5
+
+
+def _f(x, y):
+    return x.sin() * y, (x * y).sum()
+
+
+def _f_aux(x, y):
+    return _f(x, y), {"cos": x.cos()}
+
+
+class TestMultiTangent(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        torch.manual_seed(0)
+
+        self.x = torch.randn(4)
+        self.y = torch.randn(4)
+
+    def test_multi_jvp_matches_jvp(self):
+        tx = torch.randn(K, 4)
+        ty = torch.randn(K, 4)
+
+        expected = [jvp(_f, (self.x, self.y), (tx[i], ty[i])) for i in range(K)]
+
+        for chunk_size in (None, 2):
+            output, tangents = multi_jvp(_f, (self.x, self.y), (tx, ty), chunk_size=chunk_size)
+
+            self.assertEqual(output, expected[0][0])
+
+            for i in range(K):
+                self.assertEqual([t[i] for t in tangents], list(expected[i][1]))
+
+    def test_multi_jvp_has_aux(self):
+        tx = torch.randn(K, 4)
+        ty = torch.randn(K, 4)
+
+        expected = [jvp(_f_aux, (self.x, self.y), (tx[i], ty[i]), has_aux=True) for i in range(K)]
+
+        for chunk_size in (None, 2):
+            output, tangents, aux = multi_jvp(_f_aux, (self.x, self.y), (tx, ty), chunk_size=chunk_size, has_aux=True)
+
+            self.assertEqual(output, expected[0][0])
+            self.assertEqual(aux, expected[0][2])
+
+            for i in range(K):
+                self.assertEqual([t[i] for t in tangents], list(expected[i][1]))
+
+    def test_chunked_multi_jvp_non_tensor_aux(self):
+        # com chunk_size o aux fica fora do forward-ad
+        def f(x, y):
+            return _f(x, y), (x.cos(), 3)
+
+        tx = torch.randn(K, 4)
+        ty = torch.randn(K, 4)
+
+        _, tangents, aux = multi_jvp(f, (self.x, self.y), (tx, ty), chunk_size=2, has_aux=True)
+
+        self.assertEqual(aux, (self.x.cos(), 3))
+        self.assertEqual(tangents[0][0], jvp(_f, (self.x, self.y), (tx[0], ty[0]))[1][0])
+
+    def test_multi_vjp_matches_vjp(self):
+        cx = torch.randn(K, 4)
+        cy = torch.randn(K)
+
+        output, multi_vjp_fn = multi_vjp(_f, self.x, self.y)
+
+        _, vjp_fn = vjp(_f, self.x, self.y)
+
+        expected = [vjp_fn((cx[i], cy[i])) for i in range(K)]
+
+        self.assertEqual(output, _f(self.x, self.y))
+
+        for chunk_size in (None, 2):
+            cotangents = multi_vjp_fn((cx, cy), chunk_size=chunk_size)
+
+            for i in range(K):
+                self.assertEqual([c[i] for c in cotangents], list(expected[i]))
+
+    def test_multi_vjp_has_aux(self):
+        cx = torch.randn(K, 4)
+        cy = torch.randn(K)
+
+        output, multi_vjp_fn, aux = multi_vjp(_f_aux, self.x, self.y, has_aux=True)
+
+        _, vjp_fn, expected_aux = vjp(_f_aux, self.x, self.y, has_aux=True)
+
+        self.assertEqual(aux, expected_aux)
+
+        for chunk_size in (None, 2):
+            cotangents = multi_vjp_fn((cx, cy), chunk_size=chunk_size)
+
+            for i in range(K):
+                self.assertEqual([c[i] for c in cotangents], list(vjp_fn((cx[i], cy[i]))))
+
+    def test_primal_runs_once(self):
+        calls = []
+
+        def f(x, y):
+            calls.append(None)
+
+            return _f_aux(x, y)
+
+        tx = torch.randn(K, 4)
+        ty = torch.randn(K, 4)
+
+        for chunk_size in (None, 2):
+            calls.clear()
+
+            multi_jvp(f, (self.x, self.y), (tx, ty), chunk_size=chunk_size, has_aux=True)
+
+            self.assertEqual(len(calls), 1)
+
+        calls.clear()
+
+        _, multi_vjp_fn, _ = multi_vjp(f, self.x, self.y, has_aux=True)
+
+        multi_vjp_fn((torch.randn(K, 4), torch.randn(K)), chunk_size=2)
+
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,187 @@
+# Owner(s): ["module: functorch"]
+
+import torch
+
+from torch.func import functional_call, grad, remat, remat_sequential, vmap
+from torch.testing._internal.common_utils import run_tests, TestCase
+
+
+def _stages():
+    torch.manual_seed(0)
+
+    return [
+        torch.nn.Linear(4, 8),
+        torch.nn.Tanh(),
+        torch.nn.Linear(8, 8),
+        torch.nn.Tanh(),
+        torch.nn.Linear(8, 2)
+    ]
+
+
+class TestRemat(TestCase):
+    def test_module_parameters_get_gradients(self):
+        model = torch.nn.Sequential(*_stages())
+
+        x = torch.randn(3, 4)
+
+        model(x).sum().backward()
+
+        expected = [p.grad.clone() for p in model.parameters()]
+
+        model.zero_grad()
+
+        remat(model)(x).sum().backward()
+
+        for p, g in zip(model.parameters(), expected):
+            self.assertEqual(p.grad, g)
+
+    def test_sequential_parameters_get_gradients(self):
+        for kwargs in ({"segments": 2}, {"memory_budget": 64}):
+            stages = _stages()
+
+            model = torch.nn.Sequential(*stages)
+
+            x = torch.randn(3, 4, requires_grad=True)
+
+            model(x).sum().backward()
+
+            expected = [p.grad.clone() for p in model.parameters()]
+            expected_x = x.grad.clone()
+
+            model.zero_grad()
+            x.grad = None
+
+            remat_sequential(stages, **kwargs)(x).sum().backward()
+
+            for p, g in zip(model.parameters(), expected):
+                self.assertEqual(p.grad, g)
+
+            self.assertEqual(x.grad, expected_x)
+
+    def test_sequential_under_grad_of_functional_call(self):
+        stages = _stages()
+
+        model = torch.nn.Sequential(*stages)
+
+        class Remat(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+
+                self.model = model
+                self.run = remat_sequential(list(model), segments=2)
+
+            def forward(self, x):
+                return self.run(x)
+
+        wrapped = Remat()
+
+        params = dict(model.named_parameters())
+
+        x = torch.randn(3, 4)
+
+        expected = grad(lambda p: functional_call(model, p, (x,)).sum())(params)
+
+        params = {f"model.{name}": p for name, p in params.items()}
+
+        actual = grad(lambda p: functional_call(wrapped, p, (x,)).sum())(params)
+
+        for name, g in expected.items():
+            self.assertEqual(actual[f"model.{name}"], g)
+
+    def test_per_sample_grads_under_vmap(self):
+        model = torch.nn.Sequential(*_stages())
+
+        class Remat(torch.nn.Module):
+            def __init__(self, run):
+                super().__init__()
+
+                self.model = model
+                self.run = run
+
+            def forward(self, x):
+                return self.run(x)
+
+        params = dict(model.named_parameters())
+
+        x = torch.randn(6, 4)
+        y = torch.randn(6, 2)
+
+        def loss(module, prefix):
+            def fn(params, x, y):
+                params = {f"{prefix}{name}": p for name, p in params.items()}
+
+                output = functional_call(module, params, (x.unsqueeze(0),))
+
+                return ((output - y) ** 2).sum()
+
+            return fn
+
+        expected = vmap(grad(loss(model, "")), in_dims=(None, 0, 0))(params, x, y)
+
+        for run in (remat(model), remat_sequential(list(model), segments=2)):
+            actual = vmap(grad(loss(Remat(run), "model.")), in_dims=(None, 0, 0))(params, x, y)
+
+            for name, g in expected.items():
+                self.assertEqual(actual[name], g)
+
+    def test_backward_keeps_buffers(self):
+        torch.manual_seed(0)
+
+        stages = [torch.nn.Linear(4, 8), torch.nn.BatchNorm1d(8), torch.nn.Linear(8, 2)]
+
+        model = torch.nn.Sequential(*stages)
+
+        x = torch.randn(16, 4)
+
+        model(x).sum().backward()
+
+        expected_mean = stages[1].running_mean.clone()
+        expected_batches = stages[1].num_batches_tracked.clone()
+
+        stages[1].reset_running_stats()
+
+        for run in (remat(model), remat_sequential(stages, segments=2)):
+            stages[1].reset_running_stats()
+
+            run(x).sum().backward()
+
+            self.assertEqual(stages[1].running_mean, expected_mean)
+            self.assertEqual(stages[1].num_batches_tracked, expected_batches)
+
+    def test_captured_parameter_raises(self):
+        weight = torch.randn(4, 4, requires_grad=True)
+
+        fn = remat(lambda x: (x @ weight).tanh())
+
+        with self.assertRaisesRegex(RuntimeError, "seria perdido"):
+            fn(torch.randn(3, 4, requires_grad=True))
+
+        with torch.no_grad():
+            fn(torch.randn(3, 4))
+
+    def test_memory_budget_probe_keeps_rng_and_buffers(self):
+        torch.manual_seed(0)
+
+        stages = [torch.nn.Linear(4, 8), torch.nn.BatchNorm1d(8), torch.nn.Dropout(0.5), torch.nn.Linear(8, 2)]
+
+        model = torch.nn.Sequential(*stages)
+
+        x = torch.randn(16, 4)
+
+        torch.manual_seed(1)
+
+        expected = model(x)
+        expected_mean = stages[1].running_mean.clone()
+
+        stages[1].reset_running_stats()
+
+        torch.manual_seed(1)
+
+        actual = remat_sequential(stages, memory_budget=64)(x)
+
+        self.assertEqual(actual, expected)
+        self.assertEqual(stages[1].running_mean, expected_mean)
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,93 @@
+# Owner(s): ["module: multiprocessing"]
+
+import gc
+import sys
+import unittest
+
+import torch
+import torch.multiprocessing as mp
+
+from torch.multiprocessing._shared_pool import SharedStoragePool
+from torch.testing._internal.common_utils import IS_WINDOWS, run_tests, TestCase
+
+
+_NBYTES = 1 << 16
+
+
+def _hold_and_check(queue, ready, check, result):
+    tensor = queue.get()
+
+    ready.set()
+    check.wait()
+
+    result.put(bool((tensor == 7).all()))
+
+
+@unittest.skipIf(IS_WINDOWS or sys.platform == "darwin", "depende do fork e do compartilhamento por fd")
+class TestSharedStoragePool(TestCase):
+    def _tensor(self, pool, value):
+        return torch.empty(0, dtype=torch.uint8).set_(pool.new_untyped(_NBYTES)).fill_(value)
+
+    def test_local_release_recycles(self):
+        pool = SharedStoragePool()
+
+        tensor = self._tensor(pool, 7)
+
+        del tensor
+        gc.collect()
+
+        self._tensor(pool, 9)
+
+        self.assertEqual(pool.stats().hits, 1)
+
+    def test_received_tensor_is_not_overwritten(self):
+        ctx = mp.get_context("fork")
+
+        queue = ctx.SimpleQueue()
+        result = ctx.SimpleQueue()
+        ready = ctx.Event()
+        check = ctx.Event()
+
+        pool = SharedStoragePool()
+
+        process = ctx.Process(target=_hold_and_check, args=(queue, ready, check, result), daemon=True)
+        process.start()
+
+        # se uma asserção falhar, o filho não fica esperando
+        self.addCleanup(process.join, 60)
+        self.addCleanup(check.set)
+
+        tensor = self._tensor(pool, 7)
+
+        queue.put(tensor)
+
+        self.assertTrue(ready.wait(timeout=60))
+
+        # a cópia local some, mas o filho ainda lê o segmento
+        del tensor
+        gc.collect()
+
+        other = self._tensor(pool, 9)
+
+        self.assertEqual(pool.stats().hits, 0)
+
+        check.set()
+
+        self.assertTrue(result.get())
+
+        process.join(timeout=60)
+
+        self.assertEqual(process.exitcode, 0)
+
+        # com o filho encerrado, o segmento volta ao pool
+        del other
+        gc.collect()
+
+        self._tensor(pool, 9)
+        self._tensor(pool, 9)
+
+        self.assertEqual(pool.stats().hits, 2)
+
+
+if __name__ == "__main__":
+    run_tests()
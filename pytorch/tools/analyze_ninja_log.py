@@ -0,0 +1,461 @@
+"""
+analisa o `.ninja_log` de um build nativo.
+
+calcula o caminho crítico, o paralelismo alcançado ao longo do
+tempo, as unidades de tradução mais lentas e os headers que mais
+contribuem para o tempo de compilação, e emite um relatório em
+texto e em json. útil para decidir quais arquivos dividir ou
+pré-compilar.
+
+o `.ninja_log` só guarda os tempos de cada edge. o grafo de
+dependências (para o caminho crítico exato) e os headers de cada
+unidade de tradução vêm de `ninja -t graph` e `ninja -t deps`;
+sem o binário do ninja, o caminho crítico é estimado apenas pelos
+tempos e a análise de headers é omitida.
+
+uso::
+
+    python tools/analyze_ninja_log.py build --top 30 --json build/ninja_report.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+
+# extensões de unidades de tradução, usadas para separar
+# compilações de links e passos de codegen
+TU_SUFFIXES = (".o", ".obj")
+
+# os ids dos nós são ponteiros, com ou sem o prefixo 0x conforme
+# a plataforma e a versão do ninja
+_GRAPH_NODE = re.compile(r'^"([^"]+)" \[label="(.*?)"(, shape=ellipse)?')
+_GRAPH_EDGE = re.compile(r'^"([^"]+)" -> "([^"]+)"')
+
+
+@dataclass
+class Edge:
+    # um comando; edges com vários outputs têm uma linha no log
+    # por output, mas são uma única execução
+    outputs: list[str]
+    start: float
+    end: float
+
+    @property
+    def output(self) -> str:
+        return self.outputs[0]
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def parse_ninja_log(path: Path) -> list[Edge]:
+    """
+    lê as edges da última execução do ninja registrada no log.
+
+    o log acumula execuções; uma nova execução começa quando o
+    tempo de término volta para trás. outputs repetidos ficam com
+    a última entrada. as linhas de um mesmo comando (mesmo início,
+    término e hash) viram uma única edge com todos os outputs.
+    """
+
+    with path.open(encoding="utf-8", errors="replace") as f:
+        header = f.readline()
+
+        if not header.startswith("# ninja log v"):
+            raise RuntimeError(f"{path} não parece ser um .ninja_log")
+
+        entries: dict[str, tuple[int, int, str]] = {}
+        last_end = 0
+
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+
+            if len(fields) < 4:
+                continue
+
+            start, end = int(fields[0]), int(fields[1])
+
+            if end < last_end:
+                entries.clear()
+
+            last_end = end
+
+            # logs antigos não têm o hash do comando
+            entries[fields[3]] = (start, end, fields[4] if len(fields) > 4 else fields[3])
+
+    commands: dict[tuple[int, int, str], list[str]] = defaultdict(list)
+
+    for output, key in entries.items():
+        commands[key].append(output)
+
+    edges = [Edge(sorted(outputs), start / 1000, end / 1000) for (start, end, _), outputs in commands.items()]
+
+    return sorted(edges, key=lambda e: e.start)
+
+
+def parse_ninja_graph(text: str) -> dict[str, set[str]]:
+    """converte a saída de `ninja -t graph` em output -> inputs diretos"""
+
+    labels: dict[str, str] = {}
+    edge_nodes: set[str] = set()
+    arrows: list[tuple[str, str]] = []
+
+    for line in text.splitlines():
+        matched = _GRAPH_EDGE.match(line)
+
+        if matched:
+            arrows.append((matched.group(1), matched.group(2)))
+
+            continue
+
+        matched = _GRAPH_NODE.match(line)
+
+        if matched:
+            labels[matched.group(1)] = matched.group(2)
+
+            if matched.group(3):
+                edge_nodes.add(matched.group(1))
+
+    # edges com vários inputs ou outputs aparecem como um nó
+    # intermediário (elipse) entre os arquivos
+    edge_inputs: dict[str, set[str]] = defaultdict(set)
+    edge_outputs: dict[str, set[str]] = defaultdict(set)
+
+    deps: dict[str, set[str]] = defaultdict(set)
+
+    for src, dst in arrows:
+        if dst in edge_nodes:
+            edge_inputs[dst].add(labels.get(src, src))
+        elif src in edge_nodes:
+            edge_outputs[src].add(labels.get(dst, dst))
+        else:
+            deps[labels.get(dst, dst)].add(labels.get(src, src))
+
+    for node, outputs in edge_outputs.items():
+        for output in outputs:
+            deps[output] |= edge_inputs[node]
+
+    return deps
+
+
+def parse_ninja_deps(text: str) -> dict[str, list[str]]:
+    """converte a saída de `ninja -t deps` em output -> headers"""
+
+    result: dict[str, list[str]] = {}
+    current: list[str] | None = None
+
+    for line in text.splitlines():
+        if not line.strip():
+            current = None
+        elif not line[0].isspace() and ": #deps" in line:
+            current = result.setdefault(line.split(": #deps", 1)[0], [])
+        elif current is not None:
+            current.append(line.strip())
+
+    return result
+
+
+def _run_ninja_tool(build_dir: Path, tool: str) -> str | None:
+    ninja = shutil.which("ninja")
+
+    if ninja is None:
+        return None
+
+    result = subprocess.run(
+        [ninja, "-C", str(build_dir), "-t", tool],
+
+        capture_output=True,
+        text=True
+    )
+
+    return result.stdout if result.returncode == 0 else None
+
+
+def critical_path(edges: list[Edge], deps: dict[str, set[str]] | None) -> list[Edge]:
+    """
+    retorna a cadeia de edges mais longa.
+
+    com o grafo de dependências, é o caminho mais longo ponderado
+    pela duração de cada edge. sem ele, parte da última edge a
+    terminar e volta sempre para a edge que terminou por último
+    antes do início da atual (a que provavelmente a bloqueava)
+    """
+
+    by_output = {output: edge for edge in edges for output in edge.outputs}
+
+    if not edges:
+        return []
+
+    if deps is not None:
+        finish: dict[str, float] = {}
+        parent: dict[str, str | None] = {}
+
+        # busca em profundidade iterativa; o grafo do pytorch é
+        # profundo demais para recursão
+        for root in by_output:
+            stack = [(root, False)]
+
+            while stack:
+                node, expanded = stack.pop()
+
+                if node in finish:
+                    continue
+
+                inputs = [i for i in deps.get(node, ()) if i != node]
+
+                if not expanded:
+                    stack.append((node, True))
+                    stack.extend((i, False) for i in inputs if i not in finish)
+
+                    continue
+
+                best, best_finish = None, 0.0
+
+                for i in inputs:
+                    if finish.get(i, 0.0) > best_finish:
+                        best, best_finish = i, finish[i]
+
+                edge = by_output.get(node)
+
+                finish[node] = best_finish + (edge.duration if edge else 0.0)
+                parent[node] = best
+
+        tail: str | None = max(by_output, key=lambda o: finish.get(o, 0.0))
+        path = []
+
+        while tail is not None:
+            if tail in by_output and (not path or path[-1] is not by_output[tail]):
+                path.append(by_output[tail])
+
+            tail = parent.get(tail)
+
+        return path[::-1]
+
+    by_end = sorted(edges, key=lambda e: e.end)
+    current = by_end[-1]
+    path = [current]
+
+    while True:
+        previous = [e for e in by_end if e.end <= current.start]
+
+        if not previous:
+            break
+
+        current = previous[-1]
+
+        path.append(current)
+
+    return path[::-1]
+
+
+def parallelism(edges: list[Edge], buckets: int = 50) -> tuple[float, list[float]]:
+    """paralelismo médio e a média de edges em execução por intervalo de tempo"""
+
+    if not edges:
+        return 0.0, []
+
+    begin = min(e.start for e in edges)
+    wall = max(e.end for e in edges) - begin
+
+    if wall <= 0:
+        return float(len(edges)), []
+
+    width = wall / buckets
+    busy = [0.0] * buckets
+
+    for edge in edges:
+        first = int((edge.start - begin) / width)
+        last = min(int((edge.end - begin) / width), buckets - 1)
+
+        for i in range(first, last + 1):
+            lo = max(edge.start - begin, i * width)
+            hi = min(edge.end - begin, (i + 1) * width)
+
+            busy[i] += max(hi - lo, 0.0)
+
+    return sum(e.duration for e in edges) / wall, [b / width for b in busy]
+
+
+def header_costs(
+    edges: list[Edge],
+    deps: dict[str, list[str]]
+) -> list[dict[str, Any]]:
+    """
+    atribui a cada header o tempo de todas as unidades de tradução
+    que o incluem. é uma estimativa do quanto um header pesa no
+    build, não o tempo gasto analisando ele
+    """
+
+    total: dict[str, float] = defaultdict(float)
+    count: dict[str, int] = defaultdict(int)
+
+    for edge in edges:
+        headers = {header for output in edge.outputs for header in deps.get(output, ())}
+
+        for header in headers:
+            total[header] += edge.duration
+            count[header] += 1
+
+    return [
+        {
+            "header": header,
+            "tus": count[header],
+            "total_tu_seconds": round(total[header], 3)
+        }
+
+        for header in sorted(total, key=total.__getitem__, reverse=True)
+    ]
+
+
+def analyze(
+    build_dir: Path,
+    top: int = 20,
+    use_ninja: bool = True,
+    graph_text: str | None = None,
+    deps_text: str | None = None
+) -> dict[str, Any]:
+    edges = parse_ninja_log(build_dir / ".ninja_log")
+
+    if use_ninja:
+        graph_text = graph_text or _run_ninja_tool(build_dir, "graph")
+        deps_text = deps_text or _run_ninja_tool(build_dir, "deps")
+
+    # um grafo vazio (saída que não foi reconhecida) não torna o
+    # caminho crítico exato
+    graph = (parse_ninja_graph(graph_text) if graph_text else None) or None
+    deps = parse_ninja_deps(deps_text) if deps_text else None
+
+    path = critical_path(edges, graph)
+    average, timeline = parallelism(edges)
+
+    tus = sorted(
+        (e for e in edges if any(o.endswith(TU_SUFFIXES) for o in e.outputs)),
+
+        key=lambda e: e.duration,
+        reverse=True
+    )
+
+    wall = max((e.end for e in edges), default=0.0) - min((e.start for e in edges), default=0.0)
+
+    return {
+        "build_dir": str(build_dir),
+        "edges": len(edges),
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(sum(e.duration for e in edges), 3),
+        "average_parallelism": round(average, 2),
+        "parallelism_timeline": [round(p, 2) for p in timeline],
+        "critical_path_exact": graph is not None,
+        "critical_path_seconds": round(sum(e.duration for e in path), 3),
+        "critical_path": [asdict(e) | {"output": e.output, "duration": round(e.duration, 3)} for e in path],
+        "slowest_tus": [
+            {"output": e.output, "seconds": round(e.duration, 3)}
+
+            for e in tus[:top]
+        ],
+        "headers": header_costs(tus, deps)[:top] if deps is not None else None
+    }
+
+
+def format_report(data: dict[str, Any]) -> str:
+    lines = [
+        f"build: {data['build_dir']}",
+        f"edges: {data['edges']}",
+        f"tempo de parede: {data['wall_seconds']:.1f} s",
+        f"tempo somado das edges: {data['cpu_seconds']:.1f} s",
+        f"paralelismo médio: {data['average_parallelism']:.1f}",
+        "",
+        "paralelismo ao longo do build:",
+        " ".join(f"{p:.0f}" for p in data["parallelism_timeline"]),
+        "",
+        "caminho crítico ({}, {:.1f} s):".format(
+            "exato" if data["critical_path_exact"] else "aproximado, estimado pelos tempos",
+            data["critical_path_seconds"]
+        )
+    ]
+
+    lines += [f"  {e['duration']:9.2f} s  {e['output']}" for e in data["critical_path"]]
+    lines += ["", "unidades de tradução mais lentas:"]
+    lines += [f"  {t['seconds']:9.2f} s  {t['output']}" for t in data["slowest_tus"]]
+
+    if data["headers"] is not None:
+        lines += ["", "headers mais custosos (tempo somado das tus que os incluem):"]
+        lines += [
+            f"  {h['total_tu_seconds']:9.1f} s  {h['tus']:6d} tus  {h['header']}"
+
+            for h in data["headers"]
+        ]
+
+    return "\n".join(lines)
+
+
+def report_build(
+    build_dir: Path,
+    report: Callable[..., None] = print,
+    top: int = 20
+) -> None:
+    """
+    analisa o build recém-terminado, escreve
+    `<build_dir>/ninja_report.json` e reporta o resumo em texto
+    """
+
+    if not (build_dir / ".ninja_log").exists():
+        return
+
+    data = analyze(build_dir, top=top)
+
+    (build_dir / "ninja_report.json").write_text(json.dumps(data, indent=2), encoding="utf-8")
+
+    report(format_report(data))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="analisa o .ninja_log de um build nativo")
+
+    parser.add_argument("build_dir", nargs="?", default="build", help="diretório do build com o .ninja_log")
+    parser.add_argument("--top", type=int, default=20, help="quantidade de tus e headers listados")
+    parser.add_argument("--json", help="escreve o relatório em json neste arquivo")
+    parser.add_argument("--no-ninja", action="store_true", help="não roda `ninja -t graph` nem `ninja -t deps`")
+    parser.add_argument("--graph-file", help="saída salva de `ninja -t graph`")
+    parser.add_argument("--deps-file", help="saída salva de `ninja -t deps`")
+
+    options = parser.parse_args()
+
+    build_dir = Path(options.build_dir)
+
+    if not (build_dir / ".ninja_log").exists():
+        print(f"{build_dir / '.ninja_log'} não existe; o build usou o ninja?", file=sys.stderr)
+
+        sys.exit(1)
+
+    data = analyze(
+        build_dir,
+        top=options.top,
+        use_ninja=not options.no_ninja,
+        graph_text=Path(options.graph_file).read_text() if options.graph_file else None,
+        deps_text=Path(options.deps_file).read_text() if options.deps_file else None
+    )
+
+    print(format_report(data))
+
+    if options.json:
+        os.makedirs(os.path.dirname(os.path.abspath(options.json)), exist_ok=True)
+
+        with open(options.json, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
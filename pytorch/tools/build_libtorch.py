@@ -1,4 +1,5 @@
 import argparse
+import os
 import sys
 from pathlib import Path
 
@@ -12,7 +13,14 @@ REPO_ROOT = Path(__file__).absolute().parent.parent
 sys.path.append(str(REPO_ROOT))
 
 from tools.build_pytorch_libs import build_pytorch
+from tools.setup_helpers.artifact_cache import install_artifact_cache
+from tools.setup_helpers.build_timeline import timeline
 from tools.setup_helpers.cmake import CMake
+from tools.setup_helpers.cmake_cache import install_cmake_cache
+from tools.setup_helpers.configure_fingerprint import install_configure_fingerprint
+from tools.setup_helpers.env import BUILD_DIR
+from tools.setup_helpers.env_flags import str2bool
+from tools.setup_helpers.job_governor import configure_build_jobs
 
 
 if __name__ == "__main__":
@@ -24,11 +32,32 @@ if __name__ == "__main__":
 
     options = parser.parse_args()
 
-    build_pytorch(
-        version=None
-        cmake_python_library=None,
-        build_python=False,
-        rerun_cmake=options.rerun_cmake,
-        cmake_only=options.cmake_only,
-        cmake=CMake()
-    )
\ No newline at end of file
+    cmake = CMake()
+
+    install_cmake_cache(cmake)
+
+    cmake.generate = timeline.wrap(cmake.generate, "cmake configure") # type: ignore[method-assign]
+    cmake.build = timeline.wrap(cmake.build, "native build") # type: ignore[method-assign]
+
+    install_artifact_cache(cmake, REPO_ROOT, REPO_ROOT / BUILD_DIR)
+    install_configure_fingerprint(cmake, REPO_ROOT, REPO_ROOT / BUILD_DIR)
+    configure_build_jobs(REPO_ROOT / BUILD_DIR)
+
+    try:
+        with timeline.phase("build_libtorch"):
+            build_pytorch(
+                version=None,
+                cmake_python_library=None,
+                build_python=False,
+                rerun_cmake=options.rerun_cmake,
+                cmake_only=options.cmake_only,
+                cmake=cmake
+            )
+
+        if str2bool(os.getenv("PYTORCH_NINJA_REPORT")):
+            from tools.analyze_ninja_log import report_build
+
+            with timeline.phase("ninja report"):
+                report_build(REPO_ROOT / BUILD_DIR)
+    finally:
+        timeline.finish(REPO_ROOT / BUILD_DIR)
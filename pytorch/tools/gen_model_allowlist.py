@@ -0,0 +1,375 @@
+"""
+gera a allowlist de um build seletivo a partir dos modelos que
+serão executados.
+
+1. coleta os operadores usados pelos modelos: estaticamente
+   (`torch.jit.export_opnames` para torchscript, nós do grafo
+   para programas de `torch.export`) e, com entradas de exemplo,
+   também os operadores que chegam de fato ao backend durante
+   uma execução (decomposições de kernels compostos incluídas)
+2. fecha o conjunto pelas dependências entre operadores, se um
+   yaml de dependências (`--op-deps`, no formato do analisador
+   de código do pytorch) for passado
+3. mapeia cada operador para os kernels declarados em
+   `native_functions.yaml` e cada kernel para o arquivo em
+   `aten/src/ATen/native` que o define
+4. escreve a allowlist (todos os fontes fora de
+   `aten/src/ATen/native`, a infraestrutura de `native` que
+   nenhum operador referencia pelo nome, como o dispatch por
+   stub, resize, cópia e fábricas de tensores, mais os kernels
+   selecionados) e a lista de operadores para o codegen
+
+uso::
+
+    python tools/gen_model_allowlist.py model.pt --example-inputs inputs.pt \\
+        --allowlist build/allowlist.txt --ops-yaml build/selected_ops.yaml
+
+    CAFFE2_ALLOWLIST=build/allowlist.txt SELECTED_OP_LIST=build/selected_ops.yaml python setup.py develop
+
+o arquivo gerado é consumido por `caffe2_do_allowlist` em
+torch/cmake/Allowlist.cmake. a allowlist não lista as fontes que
+o codegen gera no diretório de build (registro dos kernels e
+glue do dispatcher); elas são mantidas pela opção
+`CAFFE2_ALLOWLIST_GENERATED_SOURCES`, ligada por padrão, e
+restringidas pelo SELECTED_OP_LIST.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+
+from collections import defaultdict
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+
+REPO_ROOT = Path(__file__).absolute().parent.parent
+
+NATIVE_DIR = Path("aten/src/ATen/native")
+
+# diretórios cujos fontes entram em Caffe2_CPU_SRCS / Caffe2_GPU_SRCS
+SOURCE_ROOTS = ("aten/src", "c10", "torch/csrc", "caffe2")
+
+SOURCE_SUFFIXES = (".cpp", ".cc", ".c", ".cu", ".hip", ".mm")
+
+# fontes de `native` (padrões relativos a NATIVE_DIR) que sempre
+# entram na allowlist: infraestrutura usada por todo kernel ou pelo
+# próprio runtime, sem ser o kernel de um operador selecionado.
+# arquivos de native/cpu e native/cuda com o mesmo nome base
+# acompanham, como nos kernels selecionados
+INFRASTRUCTURE_SOURCES = (
+    "DispatchStub.cpp",
+    "Resize.*",
+    "Copy.*",
+    "Fill.*",
+    "Scalar.*",
+    "TensorFactories.*",
+    "TensorConversions.*",
+    "TensorShape.*",
+    "TensorProperties.*",
+    "TypeProperties.*",
+    "TensorIteratorReduce.*",
+    "NamedTensor.*",
+    "utils/*"
+)
+
+# identificadores seguidos de `(...) {` que não são definições
+_NOT_FUNCTIONS = frozenset(("if", "for", "while", "switch", "catch", "return", "sizeof", "decltype"))
+
+_IMPL_FUNC = re.compile(r"\bTORCH_IMPL_FUNC\(\s*(\w+)\s*\)")
+_DEFINITION = re.compile(r"\b(\w+)\s*\((?:[^;{}()]|\([^()]*\))*\)\s*(?:const\s*)?(?:noexcept\s*)?\{")
+
+
+def _load_yaml(path: Path) -> Any:
+    import yaml
+
+    # o loader em c é muito mais rápido no native_functions.yaml
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+    with path.open(encoding="utf-8") as f:
+        return yaml.load(f, Loader=loader)
+
+
+def _opname(name: str) -> str:
+    return name if "::" in name else f"aten::{name}"
+
+
+def _op_base(name: str) -> str:
+    """`aten::add.Tensor` -> `aten::add`"""
+
+    return name.split(".", 1)[0]
+
+
+def static_ops(model_path: Path) -> set[str]:
+    """operadores referenciados pelo modelo, sem executá-lo"""
+
+    import torch
+
+    if model_path.suffix == ".pt2":
+        program = torch.export.load(str(model_path))
+
+        return {
+            _opname(node.target.name())
+
+            for node in program.graph.nodes
+
+            if node.op == "call_function" and isinstance(node.target, torch._ops.OpOverload)
+        }
+
+    module = torch.jit.load(str(model_path), map_location="cpu")
+
+    return {_opname(name) for name in torch.jit.export_opnames(module)}
+
+
+def traced_ops(model_path: Path, inputs_path: Path) -> set[str]:
+    """operadores que chegam ao backend ao executar o modelo com as entradas de exemplo"""
+
+    import torch
+
+    from torch.utils._python_dispatch import TorchDispatchMode
+
+    seen: set[str] = set()
+
+    class _Recorder(TorchDispatchMode):
+        def __torch_dispatch__(self, func, types, args=(), kwargs=None): # type: ignore[no-untyped-def]
+            seen.add(_opname(func.name()))
+
+            return func(*args, **(kwargs or {}))
+
+    if model_path.suffix == ".pt2":
+        model = torch.export.load(str(model_path)).module()
+    else:
+        model = torch.jit.load(str(model_path), map_location="cpu")
+
+    inputs = torch.load(str(inputs_path), map_location="cpu")
+
+    if not isinstance(inputs, (tuple, list)):
+        inputs = (inputs,)
+
+    with torch.no_grad(), _Recorder():
+        model(*inputs)
+
+    return seen
+
+
+def close_over_deps(ops: set[str], deps_path: Path) -> set[str]:
+    """
+    fecha `ops` pelas dependências do yaml gerado pelo analisador
+    de código (`- name: aten::foo` / `depends: [{name: ...}]`)
+    """
+
+    graph: dict[str, set[str]] = defaultdict(set)
+
+    for entry in _load_yaml(deps_path) or []:
+        graph[_op_base(entry["name"])].update(_op_base(dep["name"]) for dep in entry.get("depends", []))
+
+    result = set(ops)
+    stack = [_op_base(op) for op in ops]
+    visited: set[str] = set()
+
+    while stack:
+        op = stack.pop()
+
+        if op in visited:
+            continue
+
+        visited.add(op)
+
+        for dep in graph.get(op, ()):
+            result.add(dep)
+            stack.append(dep)
+
+    return result
+
+
+def kernels_by_op(native_functions: list[dict[str, Any]]) -> dict[str, set[str]]:
+    """
+    kernels de cada operador (por nome base), seguindo
+    `structured_delegate` até a variante out que implementa o
+    kernel estruturado
+    """
+
+    by_name: dict[str, dict[str, Any]] = {}
+
+    for entry in native_functions:
+        by_name[entry["func"].split("(", 1)[0]] = entry
+
+    def kernels(name: str, depth: int = 0) -> set[str]:
+        entry = by_name.get(name)
+
+        if entry is None or depth > 4:
+            return set()
+
+        result: set[str] = set()
+
+        dispatch = entry.get("dispatch")
+
+        if dispatch:
+            result.update(str(kernel).split("::")[-1] for kernel in dispatch.values())
+        elif "structured_delegate" not in entry:
+            # sem dispatch explícito, o kernel é
+            # CompositeImplicitAutograd com o nome do operador
+            result.add(name.split(".", 1)[0])
+
+        if "structured_delegate" in entry:
+            result |= kernels(entry["structured_delegate"], depth + 1)
+
+        return result
+
+    result: dict[str, set[str]] = defaultdict(set)
+
+    for name in by_name:
+        result["aten::" + name.split(".", 1)[0]] |= kernels(name)
+
+    return result
+
+
+def index_native_sources(native_dir: Path) -> dict[str, set[Path]]:
+    """arquivos de `native_dir` que definem cada função ou kernel estruturado"""
+
+    index: dict[str, set[Path]] = defaultdict(set)
+
+    for path in native_dir.rglob("*"):
+        if path.suffix not in SOURCE_SUFFIXES:
+            continue
+
+        text = path.read_text(encoding="utf-8", errors="replace")
+
+        for name in _IMPL_FUNC.findall(text):
+            index[name].add(path)
+
+        for name in _DEFINITION.findall(text):
+            if name not in _NOT_FUNCTIONS:
+                index[name].add(path)
+
+    return index
+
+
+def all_sources(source_root: Path) -> Iterable[Path]:
+    for root in SOURCE_ROOTS:
+        for dirpath, _, names in os.walk(source_root / root):
+            for name in names:
+                if name.endswith(SOURCE_SUFFIXES):
+                    yield Path(dirpath) / name
+
+
+def select_sources(
+    ops: set[str],
+    source_root: Path
+) -> tuple[list[Path], set[str]]:
+    """
+    retorna (fontes da allowlist, kernels sem arquivo encontrado e
+    operadores aten desconhecidos).
+
+    fontes fora de `aten/src/ATen/native` são sempre mantidos; de
+    `native`, os de INFRASTRUCTURE_SOURCES e os que definem algum
+    kernel dos operadores. arquivos `native/cpu` e `native/cuda`
+    de kernels de dispatch por stub acompanham o arquivo que
+    registra o stub
+    """
+
+    native_functions = _load_yaml(source_root / NATIVE_DIR / "native_functions.yaml")
+
+    op_kernels = kernels_by_op(native_functions)
+    index = index_native_sources(source_root / NATIVE_DIR)
+
+    native = (source_root / NATIVE_DIR).absolute()
+
+    selected: set[Path] = {
+        path.absolute()
+
+        for pattern in INFRASTRUCTURE_SOURCES
+
+        for path in native.glob(pattern)
+
+        if path.suffix in SOURCE_SUFFIXES
+    }
+
+    missing: set[str] = set()
+
+    for op in ops:
+        if op.startswith("aten::") and _op_base(op) not in op_kernels:
+            missing.add(op)
+
+        for kernel in op_kernels.get(_op_base(op), ()):
+            files = index.get(kernel)
+
+            if files:
+                selected |= {path.absolute() for path in files}
+            else:
+                missing.add(kernel)
+
+    # kernels vetorizados (native/cpu/FooKernel.cpp) são alcançados
+    # por REGISTER_DISPATCH, não pelo nome: mantém os que
+    # compartilham o nome base de um arquivo selecionado
+    stems = {path.stem.removesuffix("Kernel") for path in selected}
+
+    result = []
+
+    for path in all_sources(source_root):
+        path = path.absolute()
+
+        if not path.is_relative_to(native):
+            result.append(path)
+        elif path in selected or path.stem.removesuffix("Kernel") in stems:
+            result.append(path)
+
+    return sorted(result), missing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="gera a allowlist de um build seletivo a partir de modelos")
+    parser.add_argument("models", nargs="+", type=Path, help="modelos torchscript (.pt) ou torch.export (.pt2)")
+    parser.add_argument("--example-inputs", type=Path, action="append", default=[], help="entradas de exemplo (torch.save de uma tupla), uma por modelo, na mesma ordem")
+    parser.add_argument("--op-deps", type=Path, help="yaml de dependências entre operadores")
+    parser.add_argument("--extra-ops", nargs="*", default=[], help="operadores adicionais (ex.: aten::copy_)")
+    parser.add_argument("--source-root", type=Path, default=REPO_ROOT)
+    parser.add_argument("--allowlist", type=Path, required=True, help="arquivo de saída para CAFFE2_ALLOWLIST")
+    parser.add_argument("--ops-yaml", type=Path, help="arquivo de saída para SELECTED_OP_LIST")
+
+    args = parser.parse_args()
+
+    if args.example_inputs and len(args.example_inputs) != len(args.models):
+        parser.error("--example-inputs deve ser passado uma vez por modelo")
+
+    ops = {_opname(op) for op in args.extra_ops}
+
+    for i, model in enumerate(args.models):
+        ops |= static_ops(model)
+
+        if args.example_inputs:
+            ops |= traced_ops(model, args.example_inputs[i])
+
+    if args.op_deps:
+        ops = close_over_deps(ops, args.op_deps)
+    elif not args.example_inputs:
+        print(
+            "aviso: sem --example-inputs nem --op-deps, operadores chamados por "
+            "kernels compostos podem ficar de fora",
+
+            file=sys.stderr
+        )
+
+    sources, missing = select_sources(ops, args.source_root)
+
+    args.allowlist.parent.mkdir(parents=True, exist_ok=True)
+    args.allowlist.write_text("".join(f"{path}\n" for path in sources), encoding="utf-8")
+
+    if args.ops_yaml:
+        args.ops_yaml.parent.mkdir(parents=True, exist_ok=True)
+        args.ops_yaml.write_text("".join(f"- {op}\n" for op in sorted(ops)), encoding="utf-8")
+
+    native = sum(1 for path in sources if (args.source_root / NATIVE_DIR).absolute() in path.parents)
+
+    print(f"{len(ops)} operadores, {len(sources)} fontes na allowlist ({native} de aten/src/ATen/native)")
+
+    if missing:
+        print(f"kernels ou operadores sem definição encontrada: {', '.join(sorted(missing))}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
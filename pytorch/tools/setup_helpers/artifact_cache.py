@@ -0,0 +1,544 @@
+"""
+cache local, endereçado por conteúdo, dos artefatos do libtorch.
+
+quando outro checkout na mesma máquina já compilou as mesmas
+fontes com as mesmas opções do cmake, tudo o que o build nativo
+instalou (os arquivos de `install_manifest.txt`: `torch/lib`,
+`torch/include`, `torch/share/cmake`, `torch/bin`,
+`functorch/_C`, ...) e os `.pyi` gerados são restaurados do cache,
+e a compilação e o link são pulados por completo. é um
+complemento ao sccache no nível do build inteiro. antes de
+restaurar, os arquivos da instalação anterior são removidos, para
+que nada de outro build fique para trás.
+
+a chave é o hash de:
+
+- variáveis do CMakeCache.txt (sem as INTERNAL/STATIC e com os
+  paths do checkout normalizados)
+- identidade dos compiladores (path e saída de `--version`)
+- árvore de fontes (árvore do HEAD, conteúdo dos arquivos
+  modificados e não rastreados, e commits dos submódulos). os
+  hashes desses arquivos ficam em cache no diretório de build,
+  indexados por mtime e tamanho
+
+os arquivos são guardados uma única vez por conteúdo em
+`<cache>/objects`, e cada chave aponta para um manifesto em
+`<cache>/entries`. o cache é habilitado apontando
+`PYTORCH_ARTIFACT_CACHE` para um diretório.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+
+from collections.abc import Callable, Iterable
+from pathlib import Path
+from typing import Any
+
+from .cmake_cache import CMakeCache, read_cmake_cache
+
+
+_KEY_VERSION = "2"
+
+# diretórios com saídas do build nativo, relativos ao checkout.
+# usados para excluir essas saídas da chave e, sem um
+# install_manifest.txt, como a lista do que publicar
+ARTIFACT_DIRS = (
+    "torch/lib",
+    "torch/include",
+    "torch/share",
+    "torch/bin"
+)
+
+# saídas geradas no checkout que não passam pelo `install` do cmake
+GENERATED_DIRS = ("torch", "functorch")
+GENERATED_SUFFIXES = (".pyi",)
+
+_COMPILER_VARS = (
+    "CMAKE_C_COMPILER",
+    "CMAKE_CXX_COMPILER",
+    "CMAKE_CUDA_COMPILER",
+    "CMAKE_HIP_COMPILER"
+)
+
+
+def _git(source_dir: Path, *args: str) -> bytes:
+    return subprocess.check_output(["git", *args], cwd=source_dir, stderr=subprocess.DEVNULL)
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+class _DigestCache:
+    """sha256 de arquivos do checkout, indexado por (mtime, tamanho)"""
+
+    def __init__(self, path: Path | None) -> None:
+        self.path = path
+        self.entries: dict[str, list[Any]] = {}
+        self.dirty = False
+
+        if path is None:
+            return
+
+        try:
+            self.entries = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+
+    def digest(self, rel: str, path: Path) -> str:
+        st = path.stat()
+
+        entry = self.entries.get(rel)
+
+        if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+
+        digest = _file_sha256(path)
+
+        self.entries[rel] = [st.st_mtime_ns, st.st_size, digest]
+        self.dirty = True
+
+        return digest
+
+    def save(self, keep: Iterable[str]) -> None:
+        keep = set(keep)
+
+        if self.path is None or not (self.dirty or set(self.entries) - keep):
+            return
+
+        entries = {rel: entry for rel, entry in self.entries.items() if rel in keep}
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(entries), encoding="utf-8")
+        except OSError:
+            pass
+
+
+def source_tree_hash(
+    source_dir: Path,
+    exclude: Iterable[str] = (),
+    digest_cache: Path | None = None,
+    outputs: Iterable[str] = ()
+) -> str | None:
+    """
+    hash da árvore de fontes, ou `None` fora de um checkout git.
+    arquivos não rastreados sob `exclude` (saídas do build) e os
+    arquivos em `outputs` são ignorados.
+
+    em vez do diff binário da árvore inteira, só o conteúdo dos
+    arquivos que diferem do HEAD (e dos não rastreados) é lido, e
+    só quando o mtime ou o tamanho deles mudou desde a última vez
+    """
+
+    h = hashlib.sha256()
+
+    try:
+        h.update(_git(source_dir, "rev-parse", "HEAD^{tree}"))
+        h.update(_git(source_dir, "submodule", "status", "--recursive"))
+
+        changed = _git(source_dir, "diff", "HEAD", "--name-only", "--no-renames", "-z")
+
+        untracked = _git(
+            source_dir,
+            "ls-files",
+            "--others",
+            "--exclude-standard",
+            "-z",
+            "--",
+            ".",
+            *(f":(exclude){path}" for path in exclude)
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    skip = {os.fsencode(rel) for rel in outputs}
+
+    names = sorted(set(filter(None, changed.split(b"\0") + untracked.split(b"\0"))) - skip)
+
+    digests = _DigestCache(digest_cache)
+
+    for name in names:
+        rel = os.fsdecode(name)
+        path = source_dir / rel
+
+        h.update(name)
+        h.update(b"\0")
+
+        # arquivos removidos entram só pelo nome; submódulos, pelo
+        # `submodule status` acima
+        if path.is_file():
+            h.update(digests.digest(rel, path).encode())
+
+    digests.save(os.fsdecode(name) for name in names)
+
+    return h.hexdigest()
+
+
+def compiler_identity(cmake_cache: CMakeCache) -> list[str]:
+    identity = []
+
+    for var in _COMPILER_VARS:
+        compiler = cmake_cache.get_str(var)
+
+        if not compiler:
+            continue
+
+        try:
+            version = subprocess.run(
+                [compiler, "--version"],
+
+                capture_output=True,
+                text=True
+            ).stdout
+        except OSError:
+            version = ""
+
+        identity.append(f"{var}={compiler}\n{version}")
+
+    return identity
+
+
+def normalized_cmake_vars(
+    cmake_cache: CMakeCache,
+    source_dir: Path,
+    build_dir: Path
+) -> list[str]:
+    """
+    variáveis que definem a configuração, sem as internas e com
+    os paths do checkout trocados por marcadores, para que outro
+    checkout com as mesmas opções gere a mesma chave
+    """
+
+    replacements = [
+        (str(build_dir.absolute()), "<build>"),
+        (str(source_dir.absolute()), "<source>")
+    ]
+
+    result = []
+
+    for name in sorted(cmake_cache):
+        if cmake_cache.type_of(name) in ("INTERNAL", "STATIC"):
+            continue
+
+        value = str(cmake_cache[name])
+
+        for old, new in replacements:
+            value = value.replace(old, new)
+
+        result.append(f"{name}={value}")
+
+    return result
+
+
+class ArtifactCache:
+    def __init__(
+        self,
+        cache_dir: Path,
+        source_dir: Path,
+        build_dir: Path,
+        report: Callable[..., None] = print
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.report = report
+
+    def key(self) -> str | None:
+        cmake_cache = read_cmake_cache(self.build_dir / "CMakeCache.txt")
+
+        if not cmake_cache:
+            return None
+
+        source_dir = self.source_dir.absolute()
+        build_dir = self.build_dir.absolute()
+
+        # saídas do build não fazem parte das fontes
+        exclude = list(ARTIFACT_DIRS)
+
+        if build_dir.is_relative_to(source_dir):
+            exclude.append(build_dir.relative_to(source_dir).as_posix())
+
+        tree = source_tree_hash(
+            self.source_dir,
+            exclude,
+            self.build_dir / ".artifact_cache_digests.json",
+            self.installed_files()
+        )
+
+        if tree is None:
+            return None
+
+        h = hashlib.sha256(_KEY_VERSION.encode())
+
+        for part in [
+            *normalized_cmake_vars(cmake_cache, self.source_dir, self.build_dir),
+            *compiler_identity(cmake_cache),
+            tree
+        ]:
+            h.update(part.encode())
+            h.update(b"\0")
+
+        return h.hexdigest()
+
+    @property
+    def _marker(self) -> Path:
+        # chave e arquivos dos artefatos presentes no checkout
+        return self.build_dir / ".artifact_cache.json"
+
+    def _read_marker(self) -> dict[str, Any]:
+        try:
+            return json.loads(self._marker.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _write_marker(self, key: str | None, files: Iterable[str]) -> None:
+        self._marker.write_text(json.dumps({"key": key, "files": sorted(files)}), encoding="utf-8")
+
+    def installed_files(self) -> list[str]:
+        """
+        arquivos da instalação atual, relativos ao checkout: os do
+        install_manifest.txt do cmake (ou, sem ele, os não
+        rastreados de ARTIFACT_DIRS) mais os `.pyi` gerados
+        """
+
+        rels: set[str] = set()
+
+        source_dir = self.source_dir.absolute()
+
+        try:
+            lines = (self.build_dir / "install_manifest.txt").read_text(encoding="utf-8").splitlines()
+        except OSError:
+            lines = None
+
+        if lines is not None:
+            for line in lines:
+                path = Path(line.strip())
+
+                # instalações fora do checkout (outro prefixo) não
+                # fazem parte do que o pacote usa
+                if line.strip() and path.is_relative_to(source_dir):
+                    rels.add(path.relative_to(source_dir).as_posix())
+        else:
+            rels.update(self._untracked(ARTIFACT_DIRS, ignored=False))
+
+        rels.update(
+            rel
+
+            for rel in self._untracked(GENERATED_DIRS, ignored=True)
+
+            if rel.endswith(GENERATED_SUFFIXES)
+        )
+
+        return sorted(rels)
+
+    def _untracked(self, dirs: Iterable[str], ignored: bool) -> list[str]:
+        args = ["ls-files", "--others", "-z"]
+
+        if ignored:
+            args += ["--ignored", "--exclude-standard"]
+
+        names = _git(self.source_dir, *args, "--", *dirs)
+
+        return [os.fsdecode(name) for name in names.split(b"\0") if name]
+
+    def _tracked(self, rels: Iterable[str]) -> set[str]:
+        # lista pelos diretórios de primeiro nível, e não arquivo
+        # por arquivo, para não estourar o limite da linha de comando
+        tops = sorted({rel.split("/", 1)[0] for rel in rels})
+
+        if not tops:
+            return set()
+
+        return set(
+            os.fsdecode(name)
+
+            for name in _git(self.source_dir, "ls-files", "-z", "--", *tops).split(b"\0")
+
+            if name
+        )
+
+    def clean(self, files: Iterable[str]) -> None:
+        """remove os arquivos (não rastreados) de uma instalação anterior"""
+
+        files = set(files)
+
+        for rel in files - self._tracked(files):
+            path = self.source_dir / rel
+
+            if path.is_symlink() or path.is_file():
+                path.unlink()
+
+    def _entry(self, key: str) -> Path:
+        return self.cache_dir / "entries" / f"{key}.json"
+
+    def _object(self, digest: str) -> Path:
+        return self.cache_dir / "objects" / digest[:2] / digest
+
+    def restore(self, key: str) -> bool:
+        """restaura os artefatos da chave. retorna se houve acerto"""
+
+        try:
+            manifest: dict[str, Any] = json.loads(self._entry(key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+
+        files: dict[str, list[Any]] = manifest["files"]
+
+        if not all(self._object(digest).exists() for digest, _ in files.values()):
+            return False
+
+        # só os arquivos instalados são apagados, e não os
+        # diretórios inteiros: torch/lib também contém fontes
+        # rastreadas (libshm)
+        self.clean(set(self._read_marker().get("files", [])) | set(self.installed_files()))
+
+        for rel, (digest, mode) in files.items():
+            dst = self.source_dir / rel
+
+            dst.parent.mkdir(parents=True, exist_ok=True)
+
+            # cópia em vez de hardlink: o próximo build incremental
+            # sobrescreve esses arquivos no lugar
+            shutil.copyfile(self._object(digest), dst)
+
+            os.chmod(dst, mode)
+
+        for rel, target in manifest.get("symlinks", {}).items():
+            dst = self.source_dir / rel
+
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.unlink(missing_ok=True)
+            dst.symlink_to(target)
+
+        self._write_marker(key, [*files, *manifest.get("symlinks", {})])
+
+        return True
+
+    def publish(self, key: str) -> None:
+        """guarda os artefatos do build atual sob a chave"""
+
+        files: dict[str, list[Any]] = {}
+        symlinks: dict[str, str] = {}
+
+        installed = self.installed_files()
+
+        # arquivos rastreados pelo git já vêm com o checkout
+        tracked = self._tracked(installed)
+
+        for rel in installed:
+            path = self.source_dir / rel
+
+            if rel in tracked:
+                continue
+
+            # bibliotecas versionadas costumam ser links
+            # simbólicos (libfoo.so -> libfoo.so.1)
+            if path.is_symlink():
+                symlinks[rel] = os.readlink(path)
+
+                continue
+
+            if not path.is_file():
+                continue
+
+            digest = _file_sha256(path)
+            obj = self._object(digest)
+
+            if not obj.exists():
+                obj.parent.mkdir(parents=True, exist_ok=True)
+
+                # outro checkout pode publicar o mesmo objeto
+                # ao mesmo tempo
+                tmp = obj.with_name(f"{digest}.{os.getpid()}.tmp")
+
+                shutil.copyfile(path, tmp)
+
+                os.replace(tmp, obj)
+
+            files[rel] = [digest, path.stat().st_mode & 0o777]
+
+        entry = self._entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_entry = entry.with_suffix(f".{os.getpid()}.tmp")
+        tmp_entry.write_text(json.dumps({"files": files, "symlinks": symlinks}), encoding="utf-8")
+
+        os.replace(tmp_entry, entry)
+
+        self._write_marker(key, [*files, *symlinks])
+
+    def wrap_build(self, build: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        envolve `CMake.build`: roda depois da configuração, quando o
+        CMakeCache.txt já existe, e pula a compilação em um acerto
+        """
+
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = self.key()
+
+            if key is None:
+                self.report("-- cache de artefatos: chave indisponível (sem CMakeCache.txt ou fora do git)")
+
+                return build(*args, **kwargs)
+
+            marker = self._read_marker()
+
+            if marker.get("key") == key and all(
+                (self.source_dir / rel).is_symlink() or (self.source_dir / rel).exists()
+
+                for rel in marker.get("files", [])
+            ):
+                self.report(f"-- cache de artefatos: artefatos de {key[:12]} já presentes, compilação pulada")
+
+                return None
+
+            if self.restore(key):
+                self.report(f"-- cache de artefatos: acerto {key[:12]}, compilação pulada")
+
+                return None
+
+            self.report(f"-- cache de artefatos: falta {key[:12]}")
+
+            # a chave anterior não vale mais, mas os arquivos dela
+            # continuam listados para a próxima limpeza
+            self._write_marker(None, marker.get("files", []))
+
+            result = build(*args, **kwargs)
+
+            self.publish(key)
+
+            self.report(f"-- cache de artefatos: artefatos publicados em {key[:12]}")
+
+            return result
+
+        return wrapper
+
+
+def install_artifact_cache(
+    cmake: Any,
+    source_dir: Path,
+    build_dir: Path,
+    report: Callable[..., None] = print
+) -> None:
+    """habilita o cache em `cmake` se `PYTORCH_ARTIFACT_CACHE` estiver definida"""
+
+    cache_dir = os.getenv("PYTORCH_ARTIFACT_CACHE")
+
+    if not cache_dir:
+        return
+
+    cache = ArtifactCache(Path(cache_dir).expanduser(), source_dir, build_dir, report)
+
+    cmake.build = cache.wrap_build(cmake.build)
@@ -0,0 +1,289 @@
+"""
+linha do tempo das fases do build.
+
+registra spans aninhados com tempo de parede, tempo de cpu (do
+processo e dos subprocessos, onde roda o compilador) e o pico de
+rss durante o span, e escreve um trace json no formato do chrome
+(chrome://tracing ou https://ui.perfetto.dev) além de uma tabela
+de resumo.
+
+o pico de cada span vem de amostras periódicas do rss somado do
+processo e de todos os descendentes vivos (o compilador roda
+em subprocessos do ninja), lidas do /proc. picos mais curtos que
+o intervalo de amostragem podem escapar; fora do linux o pico
+não é medido.
+
+uso::
+
+    from tools.setup_helpers.build_timeline import timeline
+
+    with timeline.phase("build_deps"):
+        ...
+
+    @timeline.phase("mirror_files_into_torchgen")
+    def mirror_files_into_torchgen() -> None: ...
+
+    timeline.finish(BUILD_DIR)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, TypeVar
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# intervalo entre amostras de rss, em segundos
+_SAMPLE_INTERVAL = 0.2
+
+
+def _cpu_seconds() -> float:
+    t = os.times()
+
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _tree_rss_bytes() -> int | None:
+    """rss somado deste processo e de todos os descendentes vivos"""
+
+    # o getrusage só dá o máximo desde o início do processo, não
+    # o pico dentro de um intervalo, então o rss é lido do /proc
+    if not sys.platform.startswith("linux"):
+        return None
+
+    page = os.sysconf("SC_PAGE_SIZE")
+
+    children: dict[int, list[int]] = {}
+    rss: dict[int, int] = {}
+
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+
+        try:
+            with open(f"/proc/{entry.name}/stat", "rb") as f:
+                stat = f.read()
+        except OSError: # o processo já terminou
+            continue
+
+        # o nome do comando, entre parênteses, pode ter espaços;
+        # depois dele vêm o estado, o ppid (campo 4) e o rss em
+        # páginas (campo 24)
+        fields = stat[stat.rfind(b")") + 2:].split()
+
+        pid = int(entry.name)
+
+        children.setdefault(int(fields[1]), []).append(pid)
+        rss[pid] = int(fields[21]) * page
+
+    total = 0
+    stack = [os.getpid()]
+
+    while stack:
+        pid = stack.pop()
+
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, ()))
+
+    return total
+
+
+@dataclass
+class Span:
+    name: str
+    depth: int
+    start: float
+    wall: float = 0.0
+    cpu: float = 0.0
+    peak_rss: int | None = None
+    args: dict[str, Any] = field(default_factory=dict)
+
+
+class _RssSampler:
+    """
+    amostra o rss enquanto houver spans abertos e guarda em cada
+    um o maior valor visto entre a abertura e o fechamento
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._open: list[Span] = []
+        self._thread: threading.Thread | None = None
+
+    def _record(self, sample: int | None, spans: list[Span]) -> None:
+        if sample is None:
+            return
+
+        for span in spans:
+            if span.peak_rss is None or sample > span.peak_rss:
+                span.peak_rss = sample
+
+    def open(self, span: Span) -> None:
+        sample = _tree_rss_bytes()
+
+        with self._lock:
+            self._record(sample, [span])
+            self._open.append(span)
+
+            if sample is not None and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="build-timeline-rss", daemon=True)
+                self._thread.start()
+
+    def close(self, span: Span) -> None:
+        sample = _tree_rss_bytes()
+
+        with self._lock:
+            self._record(sample, [span])
+            self._open.remove(span)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(_SAMPLE_INTERVAL)
+
+            sample = _tree_rss_bytes()
+
+            with self._lock:
+                if not self._open:
+                    self._thread = None
+
+                    return
+
+                self._record(sample, self._open)
+
+
+class BuildTimeline:
+    def __init__(self) -> None:
+        self.origin = time.perf_counter()
+        self.spans: list[Span] = []
+
+        self._local = threading.local()
+        self._sampler = _RssSampler()
+
+    def _stack(self) -> list[Span]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+
+        return self._local.stack
+
+    @contextmanager
+    def phase(self, name: str, **args: Any) -> Iterator[Span]:
+        """registra um span; também pode ser usado como decorator"""
+
+        stack = self._stack()
+
+        span = Span(name, len(stack), time.perf_counter() - self.origin, args=args)
+
+        self.spans.append(span)
+        stack.append(span)
+
+        cpu_start = _cpu_seconds()
+
+        self._sampler.open(span)
+
+        try:
+            yield span
+        finally:
+            span.wall = time.perf_counter() - self.origin - span.start
+            span.cpu = _cpu_seconds() - cpu_start
+
+            self._sampler.close(span)
+
+            stack.pop()
+
+    def wrap(self, fn: F, name: str) -> F:
+        """retorna `fn` envolvida em um span (útil para métodos de objetos de terceiros)"""
+
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with self.phase(name):
+                return fn(*args, **kwargs)
+
+        return wrapper # type: ignore[return-value]
+
+    def chrome_trace(self) -> dict[str, Any]:
+        pid = os.getpid()
+
+        events = [
+            {
+                "name": span.name,
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": span.wall * 1e6,
+                "pid": pid,
+                "tid": 0,
+
+                "args": {
+                    "cpu_s": round(span.cpu, 3),
+                    "peak_rss_mb": None if span.peak_rss is None else round(span.peak_rss / 2**20, 1),
+                    **span.args
+                }
+            }
+
+            for span in self.spans
+        ]
+
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms"
+        }
+
+    def summary(self) -> str:
+        if not self.spans:
+            return ""
+
+        width = max(2 * span.depth + len(span.name) for span in self.spans)
+
+        lines = [
+            f"{'fase':<{width}s} {'parede (s)':>11s} {'cpu (s)':>10s} {'pico rss (mb)':>14s}"
+        ]
+
+        for span in self.spans:
+            rss = "-" if span.peak_rss is None else f"{span.peak_rss / 2**20:.1f}"
+
+            lines.append(
+                f"{'  ' * span.depth + span.name:<{width}s} {span.wall:11.2f} {span.cpu:10.2f} {rss:>14s}"
+            )
+
+        return "\n".join(lines)
+
+    def finish(
+        self,
+        build_dir: str | os.PathLike[str],
+        report: Callable[..., None] = print
+    ) -> Path | None:
+        """
+        escreve o trace em `<build_dir>/build_timeline.json` (ou no
+        path de `PYTORCH_BUILD_TIMELINE`) e reporta o resumo
+        """
+
+        if not self.spans:
+            return None
+
+        path = Path(os.getenv("PYTORCH_BUILD_TIMELINE") or Path(build_dir) / "build_timeline.json")
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(self.chrome_trace()), encoding="utf-8")
+        except OSError as e:
+            report(f"-- não foi possível escrever a linha do tempo do build: {e}")
+
+            return None
+
+        report("-- linha do tempo do build:")
+        report(self.summary())
+        report(f"-- trace escrito em {path} (abra em https://ui.perfetto.dev)")
+
+        return path
+
+
+# linha do tempo compartilhada pelo processo de build
+timeline = BuildTimeline()
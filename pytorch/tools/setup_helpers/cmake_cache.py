@@ -0,0 +1,217 @@
+"""
+leitura memoizada do CMakeCache.txt.
+
+setup.py, tools/build_libtorch.py e os setup helpers consultam
+o cache do cmake várias vezes por processo. o arquivo é lido e
+analisado uma única vez e reaproveitado enquanto seu mtime e
+tamanho não mudarem.
+
+este módulo é a única implementação do parser: tools/setup_helpers/
+cmake.py importa daqui `CMakeValue`, `convert_cmake_value_to_python_value`
+e `get_cmake_cache_variables_from_file`, e `install_cmake_cache` faz
+o `CMake.get_cmake_cache_variables` de um objeto usar a leitura
+memoizada.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import Any, IO, Union
+
+
+CMakeValue = Union[bool, str, None]
+
+_CACHE_LINE = re.compile(
+    r'^("?)(.+?)\1(?::\s*([a-zA-Z_-][a-zA-Z0-9_-]*)?)?\s*=\s*(.*)$'
+)
+
+_FALSE_BOOLS = ("FALSE", "OFF", "N", "NO", "0", "", "NOTFOUND", "IGNORE")
+
+
+def convert_cmake_value_to_python_value(
+    cmake_value: str,
+    cmake_type: str
+) -> CMakeValue:
+    """converte um valor do cache do cmake para o valor python correspondente"""
+
+    cmake_type = cmake_type.upper()
+    up_val = cmake_value.upper()
+
+    if cmake_type == "BOOL":
+        return not (up_val in _FALSE_BOOLS or up_val.endswith("-NOTFOUND"))
+
+    if cmake_type == "FILEPATH":
+        return None if up_val.endswith("-NOTFOUND") else cmake_value
+
+    return cmake_value
+
+
+def parse_cmake_cache(
+    text: str,
+    types: dict[str, str] | None = None
+) -> dict[str, CMakeValue]:
+    """
+    analisa o conteúdo de um CMakeCache.txt. se `types` for
+    passado, também é preenchido com o tipo de cada variável
+    """
+
+    results: dict[str, CMakeValue] = {}
+
+    for line in text.splitlines():
+        line = line.strip()
+
+        if not line or line.startswith(("#", "//")):
+            continue
+
+        matched = _CACHE_LINE.match(line)
+
+        if not matched:
+            continue
+
+        _, variable, type_, value = matched.groups()
+
+        if types is not None:
+            types[variable] = (type_ or "UNINITIALIZED").upper()
+
+        results[variable] = convert_cmake_value_to_python_value(value, type_ or "UNINITIALIZED")
+
+    return results
+
+
+def get_cmake_cache_variables_from_file(cmake_cache_file: IO[str]) -> dict[str, CMakeValue]:
+    """analisa um CMakeCache.txt já aberto (a interface usada por cmake.py)"""
+
+    return parse_cmake_cache(cmake_cache_file.read())
+
+
+class CMakeCache(Mapping[str, CMakeValue]):
+    """
+    view imutável de um CMakeCache.txt com acessores tipados.
+
+    variáveis ausentes valem `False` via `[]`, como no
+    `defaultdict` usado historicamente pelo setup.py.
+    """
+
+    def __init__(
+        self,
+        values: dict[str, CMakeValue],
+        path: Path | None = None,
+        types: dict[str, str] | None = None
+    ) -> None:
+        self._values = values
+        self._types = types or {}
+        self.path = path
+
+    def __getitem__(self, name: str) -> CMakeValue:
+        return self._values.get(name, False)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._values
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def type_of(self, name: str) -> str | None:
+        """tipo declarado da variável (BOOL, STRING, FILEPATH, INTERNAL, ...)"""
+
+        return self._types.get(name)
+
+    def get_bool(self, name: str, default: bool = False) -> bool:
+        value = self._values.get(name)
+
+        if value is None:
+            return default
+
+        if isinstance(value, bool):
+            return value
+
+        return convert_cmake_value_to_python_value(value, "BOOL") # type: ignore[return-value]
+
+    def get_str(self, name: str, default: str | None = None) -> str | None:
+        value = self._values.get(name)
+
+        if value is None or isinstance(value, bool):
+            return default
+
+        return value
+
+    def get_int(self, name: str, default: int | None = None) -> int | None:
+        value = self.get_str(name)
+
+        try:
+            return int(value) if value is not None else default
+        except ValueError:
+            return default
+
+    def get_path(self, name: str) -> Path | None:
+        value = self.get_str(name)
+
+        return Path(value) if value else None
+
+    def get_list(self, name: str) -> list[str]:
+        value = self.get_str(name)
+
+        return [item for item in value.split(";") if item] if value else []
+
+
+_memo: dict[str, tuple[int, int, CMakeCache]] = {}
+_memo_lock = threading.Lock()
+
+
+def read_cmake_cache(path: str | os.PathLike[str]) -> CMakeCache:
+    """
+    retorna o conteúdo de `path`, analisando o arquivo apenas se
+    ele mudou desde a última leitura neste processo.
+
+    se o arquivo não existir (por exemplo, `setup.py clean` em um
+    diretório limpo), retorna um cache vazio.
+    """
+
+    path = Path(path).absolute()
+    key = str(path)
+
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        with _memo_lock:
+            _memo.pop(key, None)
+
+        return CMakeCache({}, path)
+
+    with _memo_lock:
+        entry = _memo.get(key)
+
+        if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            return entry[2]
+
+    types: dict[str, str] = {}
+
+    values = parse_cmake_cache(path.read_text(encoding="utf-8", errors="replace"), types)
+
+    cache = CMakeCache(values, path, types)
+
+    with _memo_lock:
+        _memo[key] = (stat.st_mtime_ns, stat.st_size, cache)
+
+    return cache
+
+
+def install_cmake_cache(cmake: Any) -> None:
+    """
+    faz `cmake.get_cmake_cache_variables()` ler o cache pela
+    leitura memoizada, em vez de reabrir e reanalisar o arquivo a
+    cada chamada
+    """
+
+    def get_cmake_cache_variables() -> dict[str, CMakeValue]:
+        return dict(read_cmake_cache(cmake._cmake_cache_file))
+
+    cmake.get_cmake_cache_variables = get_cmake_cache_variables
@@ -0,0 +1,355 @@
+"""
+impressão digital das entradas do configure do cmake.
+
+registra, depois de cada configure bem-sucedido, tudo o que
+influencia a configuração: variáveis de ambiente repassadas ao
+cmake (USE_*, BUILD_*, CMAKE_*, compiladores e flags), os
+argumentos do configure (biblioteca python, build_python,
+build_test) e o hash de cada CMakeLists.txt e *.cmake das fontes
+(os rastreados pelo git, inclusive nos submódulos, e os novos não
+ignorados; os instalados pelo build, como torch/share/cmake,
+ficam de fora).
+
+na execução seguinte, se nada mudou, o configure é pulado e o
+build vai direto para o ninja. se mudaram variáveis de ambiente
+ou argumentos, as entradas alteradas são reportadas e o configure
+roda do zero. se mudaram apenas arquivos do cmake, o cache é
+mantido e o cmake roda de novo de forma incremental (pela regra
+de regeneração do próprio ninja), como antes da impressão
+digital.
+
+os hashes dos arquivos do cmake são reaproveitados enquanto o
+mtime e o tamanho não mudarem, então verificar a impressão
+digital custa apenas os `stat` da árvore.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import subprocess
+
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from .env_flags import str2bool
+
+
+_VERSION = 2
+
+FINGERPRINT_FILE = "configure_fingerprint.json"
+
+# prefixos das variáveis de ambiente que o setup repassa ao cmake.
+# prefixos amplos como `CUDA`, `MKL` ou `TORCH_` também pegariam
+# variáveis de execução (CUDA_VISIBLE_DEVICES, MKL_NUM_THREADS,
+# TORCH_LOGS), então essas famílias entram nome a nome em ENV_NAMES
+ENV_PREFIXES = (
+    "USE_",
+    "BUILD_",
+    "CMAKE_",
+    "CAFFE2_",
+    "ATEN_",
+    "ONNX_",
+    "SELECTED_OP_",
+    "INTERN_",
+    "STATIC_DISPATCH_"
+)
+
+ENV_NAMES = (
+    "CC",
+    "CXX",
+    "BLAS",
+    "MKL_THREADING",
+    "MKLDNN_CPU_RUNTIME",
+    "INTEL_MKL_DIR",
+    "INTEL_OMP_DIR",
+    "CUDA_HOME",
+    "CUDA_PATH",
+    "CUDA_BIN_PATH",
+    "CUDA_NVCC_EXECUTABLE",
+    "CUDAHOSTCXX",
+    "CUDNN_ROOT",
+    "CUDNN_LIBRARY",
+    "CUDNN_LIB_DIR",
+    "CUDNN_INCLUDE_DIR",
+    "ROCM_PATH",
+    "ROCM_HOME",
+    "HIP_PATH",
+    "TORCH_CUDA_ARCH_LIST",
+    "TORCH_NVCC_FLAGS",
+    "TORCH_XPU_ARCH_LIST",
+    "CFLAGS",
+    "CXXFLAGS",
+    "CPPFLAGS",
+    "LDFLAGS",
+    "NVCC_FLAGS",
+    "DEBUG",
+    "REL_WITH_DEB_INFO",
+    "USE_CUSTOM_DEBINFO",
+    "PYTORCH_ROCM_ARCH"
+)
+
+# diretórios que nunca contêm entradas do configure. os de
+# instalação recebem *.cmake gerados pelo próprio build
+_SKIP_DIRS = frozenset((".git", "__pycache__", "node_modules"))
+_INSTALL_DIRS = ("torch/share", "torch/include", "torch/lib")
+
+_CMAKE_PATHSPECS = ("*CMakeLists.txt", "*.cmake")
+
+
+def relevant_env(env: dict[str, str]) -> dict[str, str]:
+    return {
+        f"env:{name}": value
+
+        for name, value in env.items()
+
+        if name.startswith(ENV_PREFIXES) or name in ENV_NAMES
+    }
+
+
+def _file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _git_cmake_files(source_dir: Path) -> list[Path] | None:
+    # rastreados (com os submódulos) mais os novos não ignorados;
+    # saídas do build e da instalação são ignoradas pelo .gitignore
+    try:
+        tracked = subprocess.check_output(
+            ["git", "ls-files", "-z", "--recurse-submodules", "--", *_CMAKE_PATHSPECS],
+
+            cwd=source_dir,
+            stderr=subprocess.DEVNULL
+        )
+
+        untracked = subprocess.check_output(
+            ["git", "ls-files", "-z", "--others", "--exclude-standard", "--", *_CMAKE_PATHSPECS],
+
+            cwd=source_dir,
+            stderr=subprocess.DEVNULL
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    names = set(filter(None, tracked.split(b"\0") + untracked.split(b"\0")))
+
+    return [
+        source_dir / os.fsdecode(name)
+
+        for name in sorted(names)
+
+        if os.path.basename(name) == b"CMakeLists.txt" or name.endswith(b".cmake")
+    ]
+
+
+def _cmake_files(source_dir: Path, build_dir: Path) -> list[Path]:
+    files = _git_cmake_files(source_dir)
+
+    if files is not None:
+        return files
+
+    # fora de um checkout git, percorre a árvore sem os diretórios
+    # de build e de instalação
+    skip = {build_dir.absolute(), *((source_dir / rel).absolute() for rel in _INSTALL_DIRS)}
+
+    files = []
+
+    for root, dirs, names in os.walk(source_dir):
+        root_path = Path(root)
+
+        dirs[:] = [
+            name
+
+            for name in dirs
+
+            if name not in _SKIP_DIRS and (root_path / name).absolute() not in skip
+        ]
+
+        for name in names:
+            if name == "CMakeLists.txt" or name.endswith(".cmake"):
+                files.append(root_path / name)
+
+    return files
+
+
+class ConfigureFingerprint:
+    def __init__(self, source_dir: Path, build_dir: Path) -> None:
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.path = build_dir / FINGERPRINT_FILE
+
+    def load(self) -> dict[str, Any]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+        return data if data.get("version") == _VERSION else {}
+
+    def compute(
+        self,
+        args: dict[str, str],
+        env: dict[str, str],
+        previous: dict[str, Any]
+    ) -> dict[str, Any]:
+        """entradas atuais; `previous` fornece os hashes já calculados"""
+
+        stats: dict[str, list[Any]] = previous.get("stats", {})
+        new_stats: dict[str, list[Any]] = {}
+
+        inputs: dict[str, str] = {}
+
+        for path in _cmake_files(self.source_dir, self.build_dir):
+            rel = path.relative_to(self.source_dir).as_posix()
+
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+
+            cached = stats.get(rel)
+
+            if cached is not None and cached[:2] == [st.st_mtime_ns, st.st_size]:
+                digest = cached[2]
+            else:
+                digest = _file_sha256(path)
+
+            new_stats[rel] = [st.st_mtime_ns, st.st_size, digest]
+            inputs[f"file:{rel}"] = digest
+
+        inputs.update(relevant_env(env))
+        inputs.update({f"arg:{name}": value for name, value in args.items()})
+
+        return {"version": _VERSION, "inputs": inputs, "stats": new_stats}
+
+    def store(self, fingerprint: dict[str, Any]) -> None:
+        self.build_dir.mkdir(parents=True, exist_ok=True)
+
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(fingerprint, sort_keys=True), encoding="utf-8")
+
+        os.replace(tmp, self.path)
+
+    def invalidate(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def diff_inputs(old: dict[str, str], new: dict[str, str]) -> list[str]:
+    """descrição legível de cada entrada que mudou"""
+
+    changes = []
+
+    for key in sorted(old.keys() | new.keys()):
+        before = old.get(key)
+        after = new.get(key)
+
+        if before == after:
+            continue
+
+        kind, _, name = key.partition(":")
+
+        if kind == "file":
+            state = "adicionado" if before is None else "removido" if after is None else "modificado"
+
+            changes.append(f"{name} {state}")
+        elif before is None:
+            changes.append(f"{name}={after!r} (antes indefinido)")
+        elif after is None:
+            changes.append(f"{name} indefinido (antes {before!r})")
+        else:
+            changes.append(f"{name}: {before!r} -> {after!r}")
+
+    return changes
+
+
+def install_configure_fingerprint(
+    cmake: Any,
+    source_dir: Path,
+    build_dir: Path,
+    report: Callable[..., None] = print,
+    max_reported: int = 20
+) -> None:
+    """
+    envolve `cmake.generate` para pular o configure quando a
+    impressão digital não mudou e forçá-lo do zero quando o
+    ambiente ou os argumentos mudaram. mudanças só nos arquivos do
+    cmake mantêm o cache. `PYTORCH_CONFIGURE_FINGERPRINT=0` desativa
+    """
+
+    if not str2bool(os.getenv("PYTORCH_CONFIGURE_FINGERPRINT", "1")):
+        return
+
+    generate = cmake.generate
+    fingerprint = ConfigureFingerprint(source_dir, build_dir)
+
+    def wrapper(
+        version: str | None,
+        cmake_python_library: str | None,
+        build_python: bool,
+        build_test: bool,
+        my_env: dict[str, str],
+        rerun: bool
+    ) -> None:
+        previous = fingerprint.load()
+
+        # a versão inclui o commit e muda a cada commit sem afetar
+        # a configuração, então fica de fora
+        current = fingerprint.compute(
+            {
+                "cmake_python_library": str(cmake_python_library),
+                "build_python": str(build_python),
+                "build_test": str(build_test)
+            },
+
+            my_env,
+            previous
+        )
+
+        configured = (build_dir / "CMakeCache.txt").exists() and (
+            (build_dir / "build.ninja").exists() or (build_dir / "Makefile").exists()
+        )
+
+        if not rerun and configured and previous.get("inputs") == current["inputs"]:
+            report("-- entradas do configure inalteradas, configure do cmake pulado")
+
+            # atualiza os stats (mtime tocado sem mudança de conteúdo)
+            if previous.get("stats") != current["stats"]:
+                fingerprint.store(current)
+
+            return
+
+        if not rerun and configured and previous:
+            changes = diff_inputs(previous["inputs"], current["inputs"])
+
+            changed = previous["inputs"].keys() | current["inputs"].keys()
+
+            # um CMakeLists editado não exige jogar o cache fora: o
+            # ninja reroda o cmake sozinho, de forma incremental
+            settings_changed = any(
+                not key.startswith("file:") and previous["inputs"].get(key) != current["inputs"].get(key)
+
+                for key in changed
+            )
+
+            if settings_changed:
+                report(f"-- {len(changes)} entradas do configure mudaram, reconfigurando do zero:")
+            else:
+                report(f"-- {len(changes)} arquivos do cmake mudaram, reconfigurando com o cache mantido:")
+
+            for change in changes[:max_reported]:
+                report(f"--   {change}")
+
+            if len(changes) > max_reported:
+                report(f"--   ... e mais {len(changes) - max_reported}")
+
+            rerun = settings_changed
+
+        fingerprint.invalidate()
+
+        generate(version, cmake_python_library, build_python, build_test, my_env, rerun)
+
+        fingerprint.store(current)
+
+    cmake.generate = wrapper
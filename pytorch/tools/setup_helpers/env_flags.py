@@ -0,0 +1,56 @@
+"""
+leitura de variáveis de ambiente booleanas.
+
+compartilhado entre setup.py, tools/build_libtorch.py e os setup
+helpers, para que todos aceitem os mesmos valores (`1`, `ON`,
+`true`, `0`, `OFF`, ...).
+"""
+
+from __future__ import annotations
+
+
+def str2bool(value: str | None) -> bool:
+    """converte as variáveis de ambiente em valores booleanos."""
+
+    if not value:
+        return False
+    
+    if not isinstance(value, str):
+        raise ValueError(
+            f"esperava-se um valor de string para a conversão booleana, mas obteu-se {type(value)}"
+        )
+    
+    value = value.strip().lower()
+
+    if value in (
+        "1",
+        "true",
+        "t",
+        "yes",
+        "y",
+        "on",
+        "enable",
+        "enabled",
+        "found"
+    ):
+        return True
+    
+    if value in (
+        "0",
+        "false",
+        "f",
+        "no",
+        "n",
+        "off",
+        "disable",
+        "disabled",
+        "notfound",
+        "none",
+        "null",
+        "nil",
+        "undefined",
+        "n/a"
+    ):
+        return False
+    
+    raise ValueError(f"valor de string inválido para conversão booleana: {value}")
@@ -0,0 +1,489 @@
+"""
+controle de paralelismo do build nativo guiado por memória.
+
+com `MAX_JOBS` indefinido, o ninja roda um job por núcleo e as
+unidades de tradução pesadas (cuda e templates do aten) estouram
+a memória quando caem juntas. com `MAX_JOBS` baixo, sobram
+núcleos ociosos no resto do build.
+
+aqui o ninja recebe um job por núcleo e cada compilação passa
+por um lançador (`CMAKE_<LANG>_COMPILER_LAUNCHER`) que só deixa
+o compilador começar quando há memória para ele:
+
+- a estimativa de cada unidade de tradução vem do pico de rss
+  medido em builds anteriores (`<build>/tu_memory.jsonl`), com
+  valores padrão por extensão para arquivos nunca vistos
+- as reservas dos jobs em andamento ficam em um registro
+  compartilhado (`<build>/job_governor/ledger.json`, protegido
+  por `flock`) e a soma não passa do orçamento
+- unidades pesadas têm um limite próprio de jobs simultâneos
+- antes de começar, a memória disponível medida no sistema
+  também precisa comportar a estimativa
+
+sempre que nenhum job está rodando, o próximo é admitido, mesmo
+acima do orçamento, para que o build nunca trave.
+
+o lançador é executado como script (`python job_governor.py
+launch ...`) e por isso este módulo só importa do pacote dentro
+de `configure_build_jobs`, que roda a partir do setup.py.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable
+
+
+try:
+    import fcntl
+except ImportError: # windows
+    fcntl = None # type: ignore[assignment]
+
+
+_MIB = 1 << 20
+_GIB = 1 << 30
+
+# estimativas para unidades de tradução sem histórico
+DEFAULT_ESTIMATES = {
+    ".cu": 4 * _GIB,
+    ".hip": 4 * _GIB,
+    ".cpp": 1536 * _MIB,
+    ".cc": 1536 * _MIB,
+    ".cxx": 1536 * _MIB,
+    ".mm": 1536 * _MIB,
+    ".c": 256 * _MIB
+}
+
+_FALLBACK_ESTIMATE = 1 * _GIB
+
+# fração da memória disponível usada como orçamento padrão
+_DEFAULT_BUDGET_FRACTION = 0.9
+
+_DEFAULT_HEAVY_BYTES = 4 * _GIB
+_DEFAULT_HEAVY_JOBS = 2
+
+_LANGUAGES = ("C", "CXX", "CUDA", "HIP")
+
+STATS_FILE = "tu_memory.jsonl"
+STATE_DIR = "job_governor"
+
+
+def parse_size(text: str) -> int:
+    """converte `48G`, `512M`, `1.5g` ou um número de bytes para bytes"""
+
+    text = text.strip().upper().removesuffix("B")
+
+    units = {"K": 1 << 10, "M": _MIB, "G": _GIB, "T": 1 << 40}
+
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+
+    return int(text)
+
+
+def memory_info() -> tuple[int, int]:
+    """retorna (memória total, memória disponível) em bytes"""
+
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            info = {
+                name: int(value.split()[0]) * 1024
+
+                for name, value in (line.split(":", 1) for line in f)
+            }
+
+        return info["MemTotal"], info.get("MemAvailable", info["MemFree"])
+    except (OSError, KeyError, ValueError):
+        pass
+
+    try:
+        total = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, OSError, ValueError):
+        total = 16 * _GIB
+
+    # sem uma medida confiável, assume tudo disponível
+    return total, total
+
+
+def _source_ext(command: list[str]) -> str:
+    for arg in reversed(command):
+        ext = os.path.splitext(arg)[1].lower()
+
+        if ext in DEFAULT_ESTIMATES:
+            return ext
+
+    return ""
+
+
+def _output_of(command: list[str]) -> str | None:
+    """arquivo objeto gerado pelo comando do compilador"""
+
+    for i, arg in enumerate(command):
+        if arg == "-o" and i + 1 < len(command):
+            return command[i + 1]
+
+        if arg.startswith(("/Fo", "-Fo")):
+            return arg[3:]
+
+    return None
+
+
+class TUMemoryStats:
+    """
+    pico de rss por unidade de tradução, aprendido dos builds
+    anteriores. cada compilação acrescenta uma linha ao arquivo,
+    e a última medida de cada saída prevalece
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.peaks: dict[str, int] = {}
+
+        try:
+            with path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # linha truncada por um job interrompido
+                        continue
+
+                    self.peaks[entry["output"]] = entry["peak_rss"]
+        except OSError:
+            pass
+
+    def estimate(self, output: str | None, ext: str) -> int:
+        if output is not None and output in self.peaks:
+            return self.peaks[output]
+
+        # sem histórico do arquivo, a mediana dos arquivos da
+        # mesma extensão costuma ser melhor que o padrão fixo
+        same_ext = sorted(
+            peak
+
+            for name, peak in self.peaks.items()
+
+            if ext and name.removesuffix(".o").removesuffix(".obj").lower().endswith(ext)
+        )
+
+        if same_ext:
+            return same_ext[len(same_ext) // 2]
+
+        return DEFAULT_ESTIMATES.get(ext, _FALLBACK_ESTIMATE)
+
+    def record(self, output: str, peak_rss: int, seconds: float) -> None:
+        line = json.dumps({"output": output, "peak_rss": peak_rss, "seconds": round(seconds, 3)}) + "\n"
+
+        # escritas pequenas com O_APPEND não se intercalam entre
+        # os jobs concorrentes
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+    def compact(self) -> None:
+        """reescreve o arquivo com uma linha por saída"""
+
+        if not self.peaks:
+            return
+
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            "".join(
+                json.dumps({"output": name, "peak_rss": peak}) + "\n"
+
+                for name, peak in sorted(self.peaks.items())
+            ),
+
+            encoding="utf-8"
+        )
+
+        os.replace(tmp, self.path)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+class MemoryLedger:
+    """reservas de memória dos jobs em andamento, compartilhadas entre processos"""
+
+    def __init__(
+        self,
+        state_dir: Path,
+        budget: int,
+        heavy_bytes: int = _DEFAULT_HEAVY_BYTES,
+        heavy_jobs: int = _DEFAULT_HEAVY_JOBS,
+        memory: Callable[[], tuple[int, int]] = memory_info
+    ) -> None:
+        self.path = state_dir / "ledger.json"
+        self.budget = budget
+        self.heavy_bytes = heavy_bytes
+        self.heavy_jobs = heavy_jobs
+        self.memory = memory
+
+    @contextmanager
+    def _locked(self) -> Iterator[dict[str, list[Any]]]:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+
+            with os.fdopen(os.dup(fd), "r+", encoding="utf-8") as f:
+                try:
+                    jobs = json.loads(f.read() or "{}")
+                except ValueError:
+                    jobs = {}
+
+                # reservas de jobs mortos (ctrl-c, oom) são descartadas
+                jobs = {pid: job for pid, job in jobs.items() if _pid_alive(int(pid))}
+
+                yield jobs
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(jobs))
+        finally:
+            os.close(fd)
+
+    def try_acquire(self, estimate: int) -> bool:
+        heavy = estimate >= self.heavy_bytes
+
+        with self._locked() as jobs:
+            if jobs:
+                reserved = sum(job[0] for job in jobs.values())
+                running_heavy = sum(1 for job in jobs.values() if job[1])
+
+                if reserved + estimate > self.budget:
+                    return False
+
+                if heavy and running_heavy >= self.heavy_jobs:
+                    return False
+
+                # os jobs recém iniciados ainda não chegaram ao pico,
+                # então a medida só entra como limite adicional
+                _, available = self.memory()
+
+                if available < estimate:
+                    return False
+
+            jobs[str(os.getpid())] = [estimate, heavy]
+
+        return True
+
+    def release(self) -> None:
+        with self._locked() as jobs:
+            jobs.pop(str(os.getpid()), None)
+
+    @contextmanager
+    def reserve(self, estimate: int) -> Iterator[None]:
+        delay = 0.05
+
+        while not self.try_acquire(estimate):
+            time.sleep(delay)
+
+            delay = min(delay * 1.5, 1.0)
+
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def _config_path(build_dir: Path) -> Path:
+    return build_dir / STATE_DIR / "config.json"
+
+
+def _run(command: list[str]) -> tuple[int, int]:
+    """executa `command` e retorna (código de saída, pico de rss em bytes)"""
+
+    pid = os.posix_spawnp(command[0], command, os.environ)
+
+    _, status, usage = os.wait4(pid, 0)
+
+    # ru_maxrss do filho inclui os processos que ele esperou
+    # (cc1plus, cicc, ptxas), em kib no linux e bytes no macos
+    peak = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+    return os.waitstatus_to_exitcode(status), peak
+
+
+def launch(build_dir: Path, command: list[str]) -> int:
+    """
+    roda um comando de compilação sob o controle de memória. sem
+    configuração ativa no diretório de build (governador
+    desabilitado depois do configure), apenas executa o comando
+    """
+
+    try:
+        config = json.loads(_config_path(build_dir).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        config = {}
+
+    if not config.get("enabled") or fcntl is None:
+        os.execvp(command[0], command)
+
+    stats = TUMemoryStats(build_dir / STATS_FILE)
+
+    output = _output_of(command)
+    estimate = stats.estimate(output, _source_ext(command))
+
+    ledger = MemoryLedger(
+        build_dir / STATE_DIR,
+        config["budget"],
+        config.get("heavy_bytes", _DEFAULT_HEAVY_BYTES),
+        config.get("heavy_jobs", _DEFAULT_HEAVY_JOBS)
+    )
+
+    with ledger.reserve(estimate):
+        start = time.perf_counter()
+
+        code, peak = _run(command)
+
+    if code == 0 and output is not None:
+        stats.record(output, peak, time.perf_counter() - start)
+
+    return code
+
+
+def suggest_max_jobs(budget: int, stats: TUMemoryStats, cpus: int) -> int:
+    """
+    número de jobs para quando não há lançador (windows): quantos
+    jobs do percentil 75 de memória cabem no orçamento
+    """
+
+    peaks = sorted(stats.peaks.values())
+
+    typical = peaks[len(peaks) * 3 // 4] if peaks else DEFAULT_ESTIMATES[".cpp"]
+
+    return max(1, min(cpus, budget // max(typical, 1)))
+
+
+def configure_build_jobs(build_dir: Path, report: Callable[..., None] = print) -> None:
+    """
+    prepara o ambiente do build nativo. com `MAX_JOBS` definido
+    ou `PYTORCH_JOB_GOVERNOR=0`, a configuração do diretório de
+    build é gravada como desabilitada, e um lançador que tenha
+    ficado no cache do cmake apenas executa o compilador.
+
+    o cmake só lê `CMAKE_<LANG>_COMPILER_LAUNCHER` do ambiente no
+    primeiro configure; em um diretório de build existente, o
+    lançador passa a valer depois de `CMAKE_FRESH=1`
+    """
+
+    from tools.setup_helpers.env_flags import str2bool
+
+    build_dir = build_dir.absolute()
+
+    if os.getenv("MAX_JOBS") or not str2bool(os.getenv("PYTORCH_JOB_GOVERNOR", "1")):
+        # o cmake guarda o lançador no cache; sem esta escrita, a
+        # configuração de um build anterior continuaria valendo
+        if _config_path(build_dir).exists():
+            _config_path(build_dir).write_text(json.dumps({"enabled": False}), encoding="utf-8")
+
+        return
+
+    (build_dir / STATE_DIR).mkdir(parents=True, exist_ok=True)
+
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+    total, available = memory_info()
+
+    budget_env = os.getenv("PYTORCH_BUILD_MEMORY_BUDGET")
+    budget = parse_size(budget_env) if budget_env else int(available * _DEFAULT_BUDGET_FRACTION)
+
+    stats = TUMemoryStats(build_dir / STATS_FILE)
+    stats.compact()
+
+    if fcntl is None:
+        jobs = suggest_max_jobs(budget, stats, cpus)
+
+        os.environ["MAX_JOBS"] = str(jobs)
+
+        report(f"-- MAX_JOBS={jobs} estimado para {budget / _GIB:.1f} gib de orçamento de memória")
+
+        return
+
+    _config_path(build_dir).write_text(
+        json.dumps(
+            {
+                "enabled": True,
+                "budget": budget,
+                "heavy_bytes": parse_size(os.getenv("PYTORCH_HEAVY_TU_BYTES", str(_DEFAULT_HEAVY_BYTES))),
+                "heavy_jobs": int(os.getenv("PYTORCH_HEAVY_TU_JOBS", str(_DEFAULT_HEAVY_JOBS)))
+            }
+        ),
+
+        encoding="utf-8"
+    )
+
+    launcher = [sys.executable, str(Path(__file__).absolute()), "launch", "--build-dir", str(build_dir), "--"]
+
+    for lang in _LANGUAGES:
+        var = f"CMAKE_{lang}_COMPILER_LAUNCHER"
+
+        # um lançador existente (sccache, ccache) roda dentro do nosso
+        existing = [item for item in os.getenv(var, "").split(";") if item]
+
+        if existing[:2] == launcher[:2]:
+            continue
+
+        os.environ[var] = ";".join(launcher + existing)
+
+    os.environ["MAX_JOBS"] = str(cpus)
+
+    report(
+        f"-- MAX_JOBS={cpus} com controle de memória: orçamento de {budget / _GIB:.1f} gib "
+        f"de {total / _GIB:.1f} gib, {len(stats.peaks)} unidades de tradução com histórico"
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="controle de jobs do build nativo guiado por memória")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    launch_parser = subparsers.add_parser("launch", help="executa um comando de compilação sob o controle de memória")
+    launch_parser.add_argument("--build-dir", type=Path, required=True)
+    launch_parser.add_argument("compiler", nargs=argparse.REMAINDER)
+
+    stats_parser = subparsers.add_parser("stats", help="lista as unidades de tradução que mais consomem memória")
+    stats_parser.add_argument("--build-dir", type=Path, default=Path("build"))
+    stats_parser.add_argument("--top", type=int, default=20)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "launch":
+        command = args.compiler[1:] if args.compiler[:1] == ["--"] else args.compiler
+
+        if not command:
+            parser.error("nenhum comando de compilação")
+
+        return launch(args.build_dir, command)
+
+    stats = TUMemoryStats(args.build_dir / STATS_FILE)
+
+    for output, peak in sorted(stats.peaks.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{peak / _MIB:10.0f} mib  {output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
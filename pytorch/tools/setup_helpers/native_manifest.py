@@ -0,0 +1,246 @@
+"""
+detecção de mudanças apenas em python desde o último build nativo.
+
+depois de cada build nativo bem-sucedido, um resumo das entradas
+relevantes para o build nativo é gravado em
+`<build>/native_manifest.json`:
+
+- as entradas do índice do git (modo e blob) dos arquivos nativos:
+  fontes c/c++/cuda, headers, arquivos do cmake, yamls e templates
+  do codegen, `tools/`, `torchgen/`, `third_party/` (commits dos
+  submódulos incluídos)
+- o conteúdo dos arquivos nativos modificados ou não rastreados
+- as variáveis de ambiente que configuram o build (as mesmas do
+  configure_fingerprint)
+
+se o resumo atual for igual ao gravado e os artefatos em
+`torch/lib` ainda existirem, só arquivos python ou de
+empacotamento mudaram, e o `build_deps()` pode ser pulado.
+
+fora de um checkout git, ou com um submódulo modificado, o resumo
+não é calculado e o build nativo sempre roda.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import subprocess
+
+from pathlib import Path
+from typing import Any
+
+from .configure_fingerprint import relevant_env
+
+
+_VERSION = 1
+
+MANIFEST_FILE = "native_manifest.json"
+
+NATIVE_SUFFIXES = (
+    ".c",
+    ".cc",
+    ".cpp",
+    ".cxx",
+    ".cu",
+    ".cuh",
+    ".h",
+    ".hh",
+    ".hpp",
+    ".hxx",
+    ".hip",
+    ".m",
+    ".mm",
+    ".metal",
+    ".s",
+    ".asm",
+    ".inc",
+    ".def",
+    ".in",
+    ".cmake",
+    ".yaml",
+    ".yml"
+)
+
+# diretórios cujo conteúdo inteiro (inclusive .py: scripts de
+# codegen e do próprio build) afeta o build nativo
+NATIVE_DIRS = (
+    "aten/",
+    "c10/",
+    "caffe2/",
+    "cmake/",
+    "third_party/",
+    "tools/",
+    "torchgen/",
+    "torch/csrc/",
+    "torch/cmake/",
+    "torch/_C/"
+)
+
+
+def is_native_input(path: str) -> bool:
+    """se uma mudança em `path` (relativo ao checkout, com `/`) exige o build nativo"""
+
+    return (
+        path.startswith(NATIVE_DIRS)
+        or path.rsplit("/", 1)[-1] == "CMakeLists.txt"
+        or path.lower().endswith(NATIVE_SUFFIXES)
+    )
+
+
+def _git(source_dir: Path, *args: str) -> bytes:
+    return subprocess.check_output(["git", *args], cwd=source_dir, stderr=subprocess.DEVNULL)
+
+
+def _changed_paths(status: bytes) -> list[str]:
+    """paths da saída de `git status --porcelain=v1 -z`"""
+
+    paths = []
+
+    entries = status.split(b"\0")
+
+    i = 0
+
+    while i < len(entries):
+        entry = entries[i]
+
+        i += 1
+
+        if len(entry) < 4:
+            continue
+
+        paths.append(os.fsdecode(entry[3:]))
+
+        # renomeações e cópias trazem o path de origem em seguida
+        if entry[:1] in (b"R", b"C") or entry[1:2] in (b"R", b"C"):
+            if i < len(entries):
+                paths.append(os.fsdecode(entries[i]))
+
+            i += 1
+
+    return paths
+
+
+def native_digest(source_dir: Path, env: dict[str, str] | None = None) -> str | None:
+    """resumo das entradas do build nativo, ou `None` se não puder ser calculado"""
+
+    try:
+        index = _git(source_dir, "ls-files", "-s", "-z")
+        status = _git(
+            source_dir,
+            "status",
+            "--porcelain=v1",
+            "-z",
+            "--untracked-files=all",
+            "--ignore-submodules=untracked"
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    h = hashlib.sha256(f"{_VERSION}\0".encode())
+
+    submodules: set[str] = set()
+
+    for entry in index.split(b"\0"):
+        if not entry:
+            continue
+
+        meta, _, name = entry.partition(b"\t")
+        path = os.fsdecode(name)
+
+        if meta.startswith(b"160000"):
+            submodules.add(path)
+
+        if is_native_input(path):
+            h.update(entry)
+            h.update(b"\0")
+
+    for path in sorted(set(_changed_paths(status))):
+        if not is_native_input(path):
+            continue
+
+        # o conteúdo de um submódulo modificado não é resumido aqui
+        if path in submodules:
+            return None
+
+        h.update(path.encode())
+        h.update(b"\0")
+
+        file = source_dir / path
+
+        if file.is_file():
+            h.update(hashlib.sha256(file.read_bytes()).digest())
+        else:
+            h.update(b"<removido>")
+
+    h.update(json.dumps(relevant_env(dict(os.environ) if env is None else env), sort_keys=True).encode())
+
+    return h.hexdigest()
+
+
+class NativeManifest:
+    def __init__(self, source_dir: Path, build_dir: Path, lib_dir: Path) -> None:
+        self.source_dir = source_dir
+        self.lib_dir = lib_dir
+        self.path = build_dir / MANIFEST_FILE
+
+        # o ambiente é capturado antes do build, que acrescenta
+        # variáveis próprias (lançadores do compilador, MAX_JOBS)
+        self.env = dict(os.environ)
+
+    def _load(self) -> dict[str, Any]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+        return data if data.get("version") == _VERSION else {}
+
+    def is_current(self) -> bool:
+        """se o último build nativo ainda vale para a árvore atual"""
+
+        manifest = self._load()
+
+        if not manifest:
+            return False
+
+        # artefatos apagados (clean, troca de branch com git clean)
+        if not all((self.lib_dir / name).exists() for name in manifest["libs"]):
+            return False
+
+        return native_digest(self.source_dir, self.env) == manifest["digest"]
+
+    def invalidate(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+    def record(self) -> None:
+        """grava o manifesto depois de um build nativo bem-sucedido"""
+
+        digest = native_digest(self.source_dir, self.env)
+
+        if digest is None:
+            self.invalidate()
+
+            return
+
+        libs = sorted(
+            entry.name
+
+            for entry in os.scandir(self.lib_dir)
+
+            if entry.name.endswith((".so", ".dylib", ".dll", ".lib", ".a")) or ".so." in entry.name
+        ) if self.lib_dir.is_dir() else []
+
+        # sem nenhuma biblioteca instalada não há o que reaproveitar
+        if not libs:
+            self.invalidate()
+
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": _VERSION, "digest": digest, "libs": libs}), encoding="utf-8")
+
+        os.replace(tmp, self.path)
@@ -0,0 +1,233 @@
+"""
+geração do manifesto de package_data em uma única passada.
+
+o setuptools expande cada padrão de `package_data` com um glob
+próprio, então padrões recursivos como `include/**/*.h` fazem a
+árvore de `torch/include` ser percorrida várias vezes por build
+de wheel. aqui a árvore do pacote é percorrida uma única vez,
+cada arquivo é classificado contra todos os padrões de uma vez,
+e o resultado é uma lista explícita de arquivos.
+
+como no glob, curingas não casam com arquivos e diretórios
+ocultos (começados com `.`), exceto nos padrões passados em
+`hidden_patterns`, que optam por incluí-los.
+
+a listagem de cada diretório fica em cache, indexada pelo mtime
+do diretório, então execuções seguintes só relistam diretórios
+em que arquivos foram criados ou removidos.
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import os
+import re
+
+from collections.abc import Collection
+from pathlib import Path
+
+
+_CACHE_VERSION = 3
+
+
+def _translate_segment(segment: str, hidden: bool) -> str:
+    # como no glob, um segmento que não começa com `.` não casa
+    # com nomes ocultos, a não ser que o padrão opte por eles
+    regex = "" if hidden or segment.startswith(".") else r"(?!\.)"
+
+    i = 0
+
+    while i < len(segment):
+        c = segment[i]
+
+        if c == "*":
+            regex += "[^/]*"
+        elif c == "?":
+            regex += "[^/]"
+        elif c == "[":
+            end = segment.find("]", i + 1)
+
+            if end == -1:
+                regex += re.escape(c)
+            else:
+                body = segment[i + 1:end]
+
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+
+                regex += f"[{body}]"
+
+                i = end
+        else:
+            regex += re.escape(c)
+
+        i += 1
+
+    return regex
+
+
+def translate_pattern(pattern: str, hidden: bool = False) -> str:
+    """
+    traduz um padrão de `package_data` para uma regex equivalente
+    ao glob recursivo. com `hidden`, os curingas também casam com
+    arquivos e diretórios ocultos
+    """
+
+    visible = "" if hidden else r"(?!\.)"
+
+    segments = pattern.replace(os.sep, "/").split("/")
+
+    regex = ""
+
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
+
+        if segment == "**":
+            # zero ou mais diretórios
+            regex += rf"(?:{visible}[^/]+/)*"
+
+            if last:
+                regex += rf"{visible}[^/]+"
+        else:
+            regex += _translate_segment(segment, hidden) + ("" if last else "/")
+
+    return regex
+
+
+def compile_patterns(patterns: list[str], hidden_patterns: Collection[str] = ()) -> re.Pattern[str]:
+    """combina todos os padrões em uma única regex"""
+
+    return re.compile("|".join(f"(?:{translate_pattern(p, p in hidden_patterns)})" for p in patterns))
+
+
+class _DirCache:
+    def __init__(self, path: Path | None) -> None:
+        self.path = path
+        self.dirs: dict[str, list] = {}
+        self.manifest: dict[str, list[str]] = {}
+        self.dirty = False
+
+        if path is None or not path.exists():
+            return
+
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") == _CACHE_VERSION:
+            self.dirs = data["dirs"]
+            self.manifest = data["manifest"]
+
+    def save(self) -> None:
+        if self.path is None or not self.dirty:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps(
+                {
+                    "version": _CACHE_VERSION,
+                    "dirs": self.dirs,
+                    "manifest": self.manifest
+                }
+            ),
+
+            encoding="utf-8"
+        )
+
+        os.replace(tmp, self.path)
+
+
+def _walk(root: Path, cache: _DirCache) -> list[str]:
+    """lista todos os arquivos sob `root` (relativos e com `/`)"""
+
+    files: list[str] = []
+    seen: set[str] = set()
+    stack = [""]
+
+    while stack:
+        rel = stack.pop()
+        path = root / rel if rel else root
+
+        seen.add(rel)
+
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            continue
+
+        entry = cache.dirs.get(rel)
+
+        if entry is None or entry[0] != mtime:
+            names: list[str] = []
+            subdirs: list[str] = []
+
+            with os.scandir(path) as it:
+                for item in it:
+                    if item.is_dir():
+                        subdirs.append(item.name)
+                    elif item.is_file():
+                        names.append(item.name)
+
+            entry = [mtime, sorted(names), sorted(subdirs)]
+
+            cache.dirs[rel] = entry
+            cache.dirty = True
+
+        prefix = f"{rel}/" if rel else ""
+
+        files.extend(prefix + name for name in entry[1])
+        stack.extend(prefix + name for name in entry[2])
+
+    # descarta diretórios que deixaram de existir
+    for rel in set(cache.dirs) - seen:
+        del cache.dirs[rel]
+
+        cache.dirty = True
+
+    return files
+
+
+def build_package_manifest(
+    package_dir: Path,
+    patterns: list[str],
+    cache_file: Path | None = None,
+    hidden_patterns: Collection[str] = ()
+) -> list[str]:
+    """
+    retorna os arquivos de `package_dir` que casam com algum dos
+    `patterns`, como paths relativos prontos para `package_data`.
+    os padrões que também estão em `hidden_patterns` incluem
+    arquivos e diretórios ocultos.
+
+    os paths são escapados com `glob.escape`, já que o setuptools
+    ainda os passa para o glob, mas sem curingas isso é apenas
+    uma verificação de existência.
+    """
+
+    cache = _DirCache(cache_file)
+
+    files = _walk(package_dir, cache)
+
+    key = hashlib.sha256(
+        "\n".join(f"{p in hidden_patterns:d} {p}" for p in patterns).encode()
+    ).hexdigest()
+
+    if not cache.dirty and key in cache.manifest:
+        return cache.manifest[key]
+
+    matcher = compile_patterns(patterns, hidden_patterns)
+
+    manifest = sorted(glob.escape(f) for f in files if matcher.fullmatch(f))
+
+    # apenas o manifesto dos padrões atuais é mantido
+    cache.manifest = {key: manifest}
+    cache.dirty = True
+    cache.save()
+
+    return manifest
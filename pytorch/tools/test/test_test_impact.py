@@ -0,0 +1,65 @@
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from tools.testing.test_impact import ImportGraph, select_tests
+
+
+# pacote mínimo: torch/__init__.py importa torch._core; torch.func
+# não é importado pela raiz
+FIXTURE = {
+    "torch/__init__.py": "from torch import _core\n",
+    "torch/_core.py": "",
+    "torch/_helper.py": "from torch import _core\n",
+    "torch/func/__init__.py": "",
+    "test/test_core.py": "import torch\nfrom torch import _helper\n",
+    "test/test_func.py": "import torch\nimport torch.func\n",
+    "test/test_other.py": "import torch\n"
+}
+
+ALL_TESTS = {"test/test_core.py", "test/test_func.py", "test/test_other.py"}
+
+
+class TestSelectTests(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+
+        self.addCleanup(tmp.cleanup)
+
+        root = Path(tmp.name)
+
+        for rel, source in FIXTURE.items():
+            path = root / rel
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(source, encoding="utf-8")
+
+        self.graph = ImportGraph(root)
+        self.graph.update()
+
+    def test_module_reached_by_root_selects_all_tests(self) -> None:
+        # test_core chega a torch._core pelo helper, mas todos os
+        # testes o carregam pelo `import torch`
+        selected, _ = select_tests(["torch/_core.py"], self.graph)
+
+        self.assertEqual(selected, ALL_TESTS)
+
+    def test_module_outside_root_selects_importers(self) -> None:
+        selected, _ = select_tests(["torch/func/__init__.py"], self.graph)
+
+        self.assertEqual(selected, {"test/test_func.py"})
+
+    def test_root_selects_all_tests(self) -> None:
+        selected, _ = select_tests(["torch/__init__.py"], self.graph)
+
+        self.assertEqual(selected, ALL_TESTS)
+
+    def test_unclassified_file_selects_all_tests(self) -> None:
+        selected, _ = select_tests(["test/data/input.json"], self.graph)
+
+        self.assertEqual(selected, ALL_TESTS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,564 @@
+"""
+execução paralela dos testes em um pool de processos.
+
+1. coleta os testes uma vez e separa os marcados com `serial`
+   (ver pytest.ini)
+2. agrupa os demais em unidades de trabalho (testes de um mesmo
+   arquivo, divididos quando o arquivo é longo) e as ordena pela
+   duração histórica (tools/testing/timing_store.py), das mais
+   longas para as mais curtas
+3. sobe N sessões do pytest; cada uma pede a próxima unidade ao
+   coordenador quando termina a anterior (roubo de trabalho), com
+   diretórios temporários próprios (`--basetemp` e `TMPDIR`)
+4. roda os testes `serial` sozinhos, em uma única sessão
+5. junta os relatórios junit de todas as sessões em um só e
+   imprime o sumário curto pedido em `-r` no pytest.ini (por
+   padrão `-rEfX`)
+
+uso::
+
+    python tools/testing/parallel_runner.py -n 64 --junit-xml test-reports/junit.xml -- test/test_foo.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import configparser
+import json
+import os
+import queue
+import secrets
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from multiprocessing.connection import Listener
+from pathlib import Path
+from typing import Any
+
+
+REPO_ROOT = Path(__file__).absolute().parent.parent.parent
+
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from tools.testing.timing_store import Estimator, TimingStore, key_from_nodeid
+
+
+_PLUGIN = "tools.testing.parallel_worker"
+
+# o cache do pytest (lastfailed) seria escrito por todas as sessões ao mesmo tempo
+_WORKER_ARGS = ["-p", _PLUGIN, "-p", "no:cacheprovider", "-q"]
+
+
+@dataclass
+class Unit:
+    id: int
+    nodeids: list[str]
+    seconds: float
+
+
+@dataclass
+class RunState:
+    done: set[int] = field(default_factory=set)
+    lost: list[str] = field(default_factory=list)
+    missing: list[str] = field(default_factory=list)
+
+    # resultados enviados por cada worker: nodeid -> (fase, resultado, duração, mensagem)
+    results: dict[int, dict[str, tuple[str, str, float, str]]] = field(default_factory=lambda: defaultdict(dict))
+
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def collect(pytest_args: list[str], workdir: Path) -> list[dict[str, Any]]:
+    output = workdir / "collected.json"
+
+    result = subprocess.run(
+        [sys.executable, "-m", "pytest", "--collect-only", *_WORKER_ARGS, *pytest_args],
+
+        cwd=REPO_ROOT,
+        env={**os.environ, "PYTORCH_PARALLEL_COLLECT": str(output)},
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True
+    )
+
+    if not output.exists():
+        sys.stdout.write(result.stdout)
+
+        raise SystemExit(f"a coleta falhou (código {result.returncode})")
+
+    return json.loads(output.read_text(encoding="utf-8"))
+
+
+def _file_of(nodeid: str) -> str:
+    return nodeid.split("::", 1)[0]
+
+
+def make_units(nodeids: list[str], estimate: Estimator, workers: int) -> list[Unit]:
+    """
+    agrupa por arquivo e divide arquivos longos, para que nenhuma
+    unidade passe de uma fração do tempo total por worker
+    """
+
+    by_file: dict[str, list[str]] = defaultdict(list)
+
+    for nodeid in nodeids:
+        by_file[_file_of(nodeid)].append(nodeid)
+
+    total = sum(estimate(key_from_nodeid(nodeid)) for nodeid in nodeids)
+
+    # unidades pequenas o bastante para o roubo de trabalho
+    # equilibrar o fim da execução
+    target = max(total / (workers * 4), 1.0)
+
+    units: list[Unit] = []
+
+    for group in by_file.values():
+        chunk: list[str] = []
+        seconds = 0.0
+
+        for nodeid in group:
+            chunk.append(nodeid)
+            seconds += estimate(key_from_nodeid(nodeid))
+
+            if seconds >= target:
+                units.append(Unit(len(units), chunk, seconds))
+
+                chunk, seconds = [], 0.0
+
+        if chunk:
+            units.append(Unit(len(units), chunk, seconds))
+
+    # as mais longas primeiro (lpt dinâmico)
+    units.sort(key=lambda unit: (-unit.seconds, unit.id))
+
+    return units
+
+
+def _serve(
+    listener: Listener,
+    units: queue.Queue[Unit],
+    state: RunState,
+    workers: int
+) -> None:
+    def handle(conn: Any) -> None:
+        in_flight: Unit | None = None
+
+        try:
+            while True:
+                kind, worker_id, payload = conn.recv()
+
+                if kind == "report":
+                    nodeid, when, outcome, duration, message = payload
+
+                    previous = state.results[worker_id].get(nodeid)
+
+                    # um erro de teardown não apaga a falha da fase call
+                    if previous is None or previous[1] in ("passed", "skipped", "xfail"):
+                        state.results[worker_id][nodeid] = (when, outcome, duration, message)
+
+                    continue
+
+                if kind == "done" and in_flight is not None:
+                    unit_id, missing = payload
+
+                    with state.lock:
+                        state.done.add(unit_id)
+                        state.missing.extend(missing)
+
+                    in_flight = None
+
+                try:
+                    in_flight = units.get_nowait()
+                except queue.Empty:
+                    conn.send(None)
+
+                    return
+
+                conn.send((in_flight.id, in_flight.nodeids))
+        except (EOFError, OSError):
+            # o worker morreu (segfault, oom, timeout) no meio da unidade
+            if in_flight is not None:
+                with state.lock:
+                    state.lost.extend(in_flight.nodeids)
+        finally:
+            conn.close()
+
+    threads = []
+
+    for _ in range(workers):
+        try:
+            conn = listener.accept()
+        except OSError:
+            break
+
+        thread = threading.Thread(target=handle, args=(conn,), daemon=True)
+        thread.start()
+
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+
+
+def run_parallel(
+    units: list[Unit],
+    workers: int,
+    pytest_args: list[str],
+    workdir: Path
+) -> tuple[list[Path], RunState, list[Path]]:
+    """retorna (relatórios junit, estado, logs dos workers)"""
+
+    authkey = secrets.token_bytes(16)
+
+    listener = Listener(("127.0.0.1", 0), authkey=authkey)
+    host, port = listener.address
+
+    work: queue.Queue[Unit] = queue.Queue()
+
+    for unit in units:
+        work.put(unit)
+
+    state = RunState()
+
+    workers = max(1, min(workers, len(units)))
+
+    server = threading.Thread(target=_serve, args=(listener, work, state, workers), daemon=True)
+    server.start()
+
+    procs = []
+    reports = []
+    logs = []
+
+    for worker_id in range(workers):
+        worker_dir = workdir / f"worker-{worker_id}"
+        (worker_dir / "tmp").mkdir(parents=True, exist_ok=True)
+
+        report = worker_dir / "junit.xml"
+        log = worker_dir / "output.log"
+
+        reports.append(report)
+        logs.append(log)
+
+        env = {
+            **os.environ,
+            "PYTORCH_PARALLEL_RUNNER": f"{host}:{port}",
+            "PYTORCH_PARALLEL_AUTHKEY": authkey.hex(),
+            "PYTORCH_PARALLEL_WORKER_ID": str(worker_id),
+            "TMPDIR": str(worker_dir / "tmp"),
+            "TEMP": str(worker_dir / "tmp"),
+            "TMP": str(worker_dir / "tmp")
+        }
+
+        with log.open("w", encoding="utf-8") as out:
+            procs.append(
+                subprocess.Popen(
+                    [
+                        sys.executable,
+                        "-m",
+                        "pytest",
+                        *_WORKER_ARGS,
+                        f"--junit-xml={report}",
+                        f"--basetemp={worker_dir / 'basetemp'}",
+                        *pytest_args
+                    ],
+
+                    cwd=REPO_ROOT,
+                    env=env,
+                    stdout=out,
+                    stderr=subprocess.STDOUT
+                )
+            )
+
+    for proc in procs:
+        proc.wait()
+
+    # workers que morreram antes de conectar não serão aceitos
+    listener.close()
+    server.join(timeout=5)
+
+    # unidades nunca entregues (todos os workers morreram)
+    while not work.empty():
+        state.lost.extend(work.get_nowait().nodeids)
+
+    return reports, state, logs
+
+
+def run_serial(pytest_args: list[str], workdir: Path) -> Path:
+    serial_dir = workdir / "serial"
+    serial_dir.mkdir(parents=True, exist_ok=True)
+
+    report = serial_dir / "junit.xml"
+
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "pytest",
+            "-p",
+            "no:cacheprovider",
+            f"--junit-xml={report}",
+            f"--basetemp={serial_dir / 'basetemp'}",
+            *pytest_args
+        ],
+
+        cwd=REPO_ROOT
+    )
+
+    return report
+
+
+def _cases_from_results(results: dict[str, tuple[str, str, float, str]]) -> list[ET.Element]:
+    """casos junit a partir dos resultados enviados por um worker que morreu"""
+
+    cases = []
+
+    for nodeid, (when, outcome, duration, message) in results.items():
+        classname, _, name = key_from_nodeid(nodeid).partition("::")
+
+        case = ET.Element("testcase", classname=classname, name=name, time=f"{duration:.3f}")
+
+        if outcome == "failed":
+            ET.SubElement(case, "failure" if when == "call" else "error", message=message)
+        elif outcome == "skipped":
+            ET.SubElement(case, "skipped", message=message)
+        elif outcome == "xfail":
+            ET.SubElement(case, "skipped", type="pytest.xfail", message=message)
+
+        cases.append(case)
+
+    return cases
+
+
+def merge_junit(
+    reports: list[Path],
+    state: RunState,
+    seconds: float
+) -> ET.Element:
+    """
+    junta os relatórios em um único `<testsuites>` com um
+    `<testsuite>`. o relatório de um worker que morreu é
+    reconstruído dos resultados que ele enviou
+    """
+
+    suite = ET.Element("testsuite", name="pytest")
+
+    for path in reports:
+        try:
+            root = ET.parse(path).getroot()
+        except (OSError, ET.ParseError):
+            worker = path.parent.name.removeprefix("worker-")
+
+            if worker.isdigit():
+                suite.extend(_cases_from_results(state.results.get(int(worker), {})))
+
+            continue
+
+        for case in root.iter("testcase"):
+            suite.append(case)
+
+    reported = {nodeid for results in state.results.values() for nodeid in results}
+
+    # testes da unidade interrompida que não chegaram a terminar
+    for nodeid in state.lost:
+        if nodeid in reported:
+            continue
+
+        key = key_from_nodeid(nodeid)
+        classname, _, name = key.partition("::")
+
+        case = ET.SubElement(suite, "testcase", classname=classname, name=name, time="0")
+
+        ET.SubElement(case, "error", message="o processo worker morreu durante a execução deste teste")
+
+    cases = suite.findall("testcase")
+
+    suite.set("tests", str(len(cases)))
+    suite.set("failures", str(sum(1 for case in cases if case.find("failure") is not None)))
+    suite.set("errors", str(sum(1 for case in cases if case.find("error") is not None)))
+    suite.set("skipped", str(sum(1 for case in cases if case.find("skipped") is not None)))
+    suite.set("time", f"{seconds:.3f}")
+
+    root = ET.Element("testsuites")
+    root.append(suite)
+
+    return root
+
+
+def report_chars() -> str:
+    """caracteres de `-r` configurados no pytest.ini"""
+
+    config = configparser.ConfigParser()
+    config.read(REPO_ROOT / "pytest.ini", encoding="utf-8")
+
+    addopts = config.get("pytest", "addopts", fallback="")
+
+    lines = [line.split("#", 1)[0] for line in addopts.splitlines()]
+
+    for opt in shlex.split(" ".join(lines)):
+        if opt.startswith("-r") and len(opt) > 2:
+            return opt[2:]
+
+    return "fE"
+
+
+def short_summary(root: ET.Element, chars: str, nodeids: dict[str, str] | None = None) -> list[str]:
+    """
+    linhas do sumário curto no formato do pytest para as
+    categorias de `chars`. `nodeids` (chave junit -> nodeid) traz
+    de volta os nodeids `path::nome` dos testes coletados
+    """
+
+    nodeids = nodeids or {}
+
+    lines = []
+
+    for case in root.iter("testcase"):
+        key = f"{case.get('classname')}::{case.get('name')}"
+        nodeid = nodeids.get(key, key)
+
+        for child in case:
+            message = (child.get("message") or "").splitlines()[0:1]
+            suffix = f" - {message[0]}" if message else ""
+
+            if child.tag == "failure":
+                # com xfail_strict, um xpass vira falha "[XPASS(strict)]"
+                if "XPASS" in (child.get("message") or ""):
+                    if "X" in chars:
+                        lines.append(f"XPASS {nodeid}{suffix}")
+                elif "f" in chars:
+                    lines.append(f"FAILED {nodeid}{suffix}")
+            elif child.tag == "error" and "E" in chars:
+                lines.append(f"ERROR {nodeid}{suffix}")
+            elif child.tag == "skipped":
+                if child.get("type") == "pytest.xfail":
+                    if "x" in chars:
+                        lines.append(f"XFAIL {nodeid}{suffix}")
+                elif "s" in chars:
+                    lines.append(f"SKIPPED {nodeid}{suffix}")
+
+    return lines
+
+
+def with_marker(pytest_args: list[str], expr: str) -> list[str]:
+    """
+    `pytest_args` com `-m` restrito também a `expr`: uma
+    expressão `-m` do usuário é combinada com `and`, já que o
+    pytest só considera o último `-m`
+    """
+
+    args: list[str] = []
+    user: list[str] = []
+
+    i = 0
+
+    while i < len(pytest_args):
+        arg = pytest_args[i]
+
+        if arg == "--":
+            args += pytest_args[i:]
+
+            break
+
+        if arg == "-m" and i + 1 < len(pytest_args):
+            user.append(pytest_args[i + 1])
+
+            i += 2
+
+            continue
+
+        if arg.startswith("-m") and len(arg) > 2:
+            user.append(arg[2:])
+        else:
+            args.append(arg)
+
+        i += 1
+
+    if user:
+        # o último -m é o que valia
+        expr = f"({user[-1]}) and ({expr})"
+
+    # a expressão vai antes de um eventual `--`
+    position = args.index("--") if "--" in args else len(args)
+
+    return args[:position] + ["-m", expr] + args[position:]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="executa os testes em paralelo respeitando o marcador serial")
+    parser.add_argument("-n", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--junit-xml", type=Path, help="relatório junit combinado")
+    parser.add_argument("--workdir", type=Path, help="diretório dos relatórios e logs de cada worker (padrão: temporário)")
+    parser.add_argument("--store", type=Path, default=None, help="arquivo json das durações históricas")
+    parser.add_argument("--no-serial", action="store_true", help="não executa os testes marcados com serial")
+    parser.add_argument("pytest_args", nargs=argparse.REMAINDER, help="argumentos repassados ao pytest (após --)")
+
+    args = parser.parse_args()
+
+    pytest_args = args.pytest_args[1:] if args.pytest_args[:1] == ["--"] else args.pytest_args
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="pytorch-parallel-tests-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+
+    collected = collect(pytest_args, workdir)
+
+    serial = [entry["nodeid"] for entry in collected if entry["serial"]]
+    parallel = [entry["nodeid"] for entry in collected if not entry["serial"]]
+
+    units = make_units(parallel, TimingStore(args.store).estimator(), args.workers)
+
+    print(f"{len(parallel)} testes em {len(units)} unidades para {min(args.workers, len(units))} workers, {len(serial)} testes serial", flush=True)
+
+    reports: list[Path] = []
+    state = RunState()
+
+    if units:
+        reports, state, logs = run_parallel(units, args.workers, with_marker(pytest_args, "not serial"), workdir)
+
+        print(f"fase paralela: {time.perf_counter() - start:.1f}s, logs em {workdir}", flush=True)
+
+        if state.lost:
+            print(f"{len(state.lost)} testes perdidos por workers que morreram; ver {', '.join(map(str, logs))}")
+
+    if serial and not args.no_serial:
+        reports.append(run_serial(with_marker(pytest_args, "serial"), workdir))
+
+    root = merge_junit(reports, state, time.perf_counter() - start)
+
+    if args.junit_xml:
+        args.junit_xml.parent.mkdir(parents=True, exist_ok=True)
+
+        ET.ElementTree(root).write(args.junit_xml, encoding="utf-8", xml_declaration=True)
+
+    suite = root[0]
+
+    summary = short_summary(root, report_chars(), {key_from_nodeid(entry["nodeid"]): entry["nodeid"] for entry in collected})
+
+    if summary:
+        print("=" * 30 + " short test summary info " + "=" * 30)
+        print("\n".join(summary))
+
+    if state.missing:
+        print(f"{len(state.missing)} testes não foram encontrados pelos workers (coleta diferente?)")
+
+    failed = int(suite.get("failures", 0)) + int(suite.get("errors", 0))
+
+    print(
+        f"{suite.get('tests')} testes, {suite.get('failures')} falhas, {suite.get('errors')} erros, "
+        f"{suite.get('skipped')} pulados em {float(suite.get('time', 0)):.1f}s"
+    )
+
+    return 1 if failed or state.missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
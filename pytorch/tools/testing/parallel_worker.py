@@ -0,0 +1,116 @@
+"""
+plugin do pytest usado pelos processos de tools/testing/parallel_runner.py.
+
+no modo de coleta (`PYTORCH_PARALLEL_COLLECT`), grava os nodeids
+coletados e se cada um tem o marcador `serial`.
+
+no modo worker (`PYTORCH_PARALLEL_RUNNER`), substitui o laço de
+execução do pytest: em vez de rodar todos os itens coletados, pede
+ao coordenador a próxima unidade de trabalho (um grupo de testes
+de um mesmo arquivo) até que não haja mais nenhuma.
+
+cada resultado também é enviado ao coordenador, que o usa se o
+worker morrer antes de escrever o seu relatório junit.
+
+sem essas variáveis de ambiente, o plugin não faz nada.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+
+from multiprocessing.connection import Client
+from typing import Any
+
+
+# conexão com o coordenador, durante o laço de execução
+_conn: Any = None
+_worker_id = -1
+
+
+def pytest_collection_finish(session: Any) -> None:
+    path = os.getenv("PYTORCH_PARALLEL_COLLECT")
+
+    if not path:
+        return
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            [
+                {"nodeid": item.nodeid, "serial": item.get_closest_marker("serial") is not None}
+
+                for item in session.items
+            ],
+
+            f
+        )
+
+
+def pytest_runtest_logreport(report: Any) -> None:
+    if _conn is None:
+        return
+
+    # a fase call de cada teste e qualquer setup/teardown que não passou
+    if report.when != "call" and report.outcome == "passed":
+        return
+
+    outcome = "xfail" if report.outcome == "skipped" and hasattr(report, "wasxfail") else report.outcome
+
+    message = "" if report.outcome == "passed" else str(report.longrepr).strip().splitlines()[-1:]
+
+    _conn.send(("report", _worker_id, (report.nodeid, report.when, outcome, report.duration, "".join(message))))
+
+
+def pytest_runtestloop(session: Any) -> bool | None:
+    global _conn, _worker_id
+
+    address = os.getenv("PYTORCH_PARALLEL_RUNNER")
+
+    if not address or session.config.option.collectonly:
+        return None
+
+    if session.testsfailed and not session.config.option.continue_on_collection_errors:
+        raise session.Interrupted(f"{session.testsfailed} erros durante a coleta")
+
+    host, port = address.rsplit(":", 1)
+
+    items = {item.nodeid: item for item in session.items}
+
+    worker_id = _worker_id = int(os.environ["PYTORCH_PARALLEL_WORKER_ID"])
+
+    with Client((host, int(port)), authkey=bytes.fromhex(os.environ["PYTORCH_PARALLEL_AUTHKEY"])) as conn:
+        _conn = conn
+
+        conn.send(("ready", worker_id, None))
+
+        while True:
+            unit = conn.recv()
+
+            if unit is None:
+                break
+
+            unit_id, nodeids = unit
+
+            selected = [items[nodeid] for nodeid in nodeids if nodeid in items]
+
+            for i, item in enumerate(selected):
+                # o próximo item decide quais fixtures são
+                # finalizadas; no fim da unidade, todas são
+                nextitem = selected[i + 1] if i + 1 < len(selected) else None
+
+                item.config.hook.pytest_runtest_protocol(item=item, nextitem=nextitem)
+
+                if session.shouldfail:
+                    raise session.Failed(session.shouldfail)
+
+                if session.shouldstop:
+                    raise session.Interrupted(session.shouldstop)
+
+            missing = [nodeid for nodeid in nodeids if nodeid not in items]
+
+            conn.send(("done", worker_id, (unit_id, missing)))
+
+    _conn = None
+
+    return True
@@ -0,0 +1,160 @@
+"""
+distribuição dos testes em shards pela duração histórica.
+
+o plugin de shard customizado (test/pytest_shard_custom.py, ver
+pytest.ini) distribui os testes por hash do nodeid, o que deixa
+shards com poucos testes lentos muito mais demorados que os
+outros. aqui os testes são distribuídos pelo algoritmo lpt
+(longest processing time first): em ordem decrescente de duração
+esperada, cada teste vai para a shard com menor carga acumulada,
+o que limita a shard mais lenta a 4/3 do ótimo.
+
+as durações vêm de tools/testing/timing_store.py; testes novos
+recebem a mediana do seu módulo ou a mediana global.
+
+o plano é determinístico: todas as shards, cada uma em seu
+processo, calculam o mesmo plano a partir da mesma coleta e do
+mesmo histórico. `filter_items_by_shard` tem a mesma assinatura
+do método do plugin e pode substituí-lo::
+
+    from tools.testing.shard_planner import filter_items_by_shard
+
+    items[:] = filter_items_by_shard(items, shard_id, num_shards)
+
+uso direto, para inspecionar o balanceamento::
+
+    python tools/testing/shard_planner.py --num-shards 8 < nodeids.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import sys
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, TypeVar
+
+
+REPO_ROOT = Path(__file__).absolute().parent.parent.parent
+
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from tools.testing.timing_store import Estimator, TimingStore, key_from_nodeid
+
+
+T = TypeVar("T")
+
+
+@dataclass
+class Shard:
+    index: int
+    seconds: float = 0.0
+    items: list[Any] = field(default_factory=list)
+
+
+def plan_shards(
+    items: Sequence[T],
+    num_shards: int,
+    duration: Callable[[T], float]
+) -> list[Shard]:
+    """distribui `items` em `num_shards` shards minimizando a mais lenta (lpt)"""
+
+    if num_shards < 1:
+        raise ValueError(f"num_shards deve ser positivo, recebido {num_shards}")
+
+    shards = [Shard(i) for i in range(num_shards)]
+
+    # ordem estável entre processos: duração e depois posição
+    # original na coleta
+    order = sorted(range(len(items)), key=lambda i: (-duration(items[i]), i))
+
+    heap = [(0.0, shard.index) for shard in shards]
+
+    assigned: list[list[int]] = [[] for _ in shards]
+
+    for i in order:
+        load, index = heapq.heappop(heap)
+
+        load += duration(items[i])
+
+        assigned[index].append(i)
+        shards[index].seconds = load
+
+        heapq.heappush(heap, (load, index))
+
+    # cada shard roda os seus testes na ordem da coleta, que
+    # mantém juntos os testes de um mesmo arquivo e fixture
+    for shard, indices in zip(shards, assigned):
+        shard.items = [items[i] for i in sorted(indices)]
+
+    return shards
+
+
+def imbalance(shards: Sequence[Shard]) -> float:
+    """quanto a shard mais lenta passa da média, em fração"""
+
+    total = sum(shard.seconds for shard in shards)
+
+    if not total:
+        return 0.0
+
+    return max(shard.seconds for shard in shards) / (total / len(shards)) - 1
+
+
+def filter_items_by_shard(
+    items: list[Any],
+    shard_id: int,
+    num_shards: int,
+    estimator: Estimator | None = None
+) -> list[Any]:
+    """
+    itens de pytest (com `.nodeid`) da shard `shard_id`, indexada
+    a partir de 1 como no plugin de shard customizado
+    """
+
+    if shard_id < 1 or shard_id > num_shards:
+        raise ValueError(f"{shard_id} não é um id de shard válido de um total de {num_shards} shards")
+
+    estimate = estimator or TimingStore().estimator()
+
+    shards = plan_shards(items, num_shards, lambda item: estimate(key_from_nodeid(item.nodeid)))
+
+    return shards[shard_id - 1].items
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="distribui nodeids de teste em shards pela duração histórica")
+    parser.add_argument("--num-shards", type=int, required=True)
+    parser.add_argument("--shard-id", type=int, help="imprime apenas os nodeids desta shard (a partir de 1)")
+    parser.add_argument("--store", type=Path, default=None, help="arquivo json das durações")
+    parser.add_argument("nodeids", nargs="?", type=argparse.FileType("r"), default=sys.stdin, help="um nodeid por linha (padrão: stdin)")
+
+    args = parser.parse_args()
+
+    nodeids = [line.strip() for line in args.nodeids if line.strip()]
+
+    estimate = TimingStore(args.store).estimator()
+
+    shards = plan_shards(nodeids, args.num_shards, lambda nodeid: estimate(key_from_nodeid(nodeid)))
+
+    if args.shard_id is not None:
+        print("\n".join(shards[args.shard_id - 1].items))
+
+        return
+
+    unknown = sum(1 for nodeid in nodeids if not estimate.is_known(key_from_nodeid(nodeid)))
+
+    print(f"{len(nodeids)} testes, {unknown} sem histórico")
+
+    for shard in shards:
+        print(f"shard {shard.index + 1}: {len(shard.items):6d} testes, {shard.seconds:10.1f}s estimados")
+
+    print(f"desequilíbrio: {imbalance(shards):.1%} acima da média")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+"""
+seleção de testes pelo impacto de uma mudança.
+
+monta um grafo de imports dos módulos python de `torch/` e
+`test/` (imports em qualquer ponto do arquivo, relativos
+inclusive, e referências `torch.func.x` a submódulos) e, dado um
+conjunto de arquivos alterados, seleciona os arquivos de teste que
+dependem deles, direta ou transitivamente.
+
+o `torch/__init__.py` importa quase todo o pacote, então um
+`import torch` não é tratado como dependência de todos os
+submódulos: a propagação reversa para no módulo raiz. um teste
+depende de `torch.func` se importa ou referencia `torch.func`, ou
+algo que dependa dele. uma mudança no próprio `torch/__init__.py`
+seleciona todos os testes, assim como a de qualquer módulo que
+chegue a ele: esse módulo é carregado pelo `import torch` de
+todos os testes, mesmo que alguns também o importem por outro
+caminho.
+
+o grafo fica em cache (`.test_timings/import_graph.json`) e só os
+arquivos com mtime ou tamanho diferentes são analisados de novo.
+
+opcionalmente, um mapa de cobertura por teste (gerado com
+`coverage run --context=test` e `coverage json --show-contexts`)
+acrescenta os testes que executaram linhas dos arquivos alterados.
+
+mudanças em fontes nativos, no codegen ou na configuração dos
+testes (pytest.ini, conftest.py) selecionam todos os testes, e
+também qualquer arquivo que não se saiba classificar (dados de
+teste, templates, python fora de `torch/` e `test/`): na dúvida,
+a seleção nunca fica vazia. só documentação e imagens são
+ignoradas.
+
+uso::
+
+    python tools/testing/test_impact.py --base origin/main
+    python -m pytest $(python tools/testing/test_impact.py --base origin/main)
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+from collections import defaultdict
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+
+REPO_ROOT = Path(__file__).absolute().parent.parent.parent
+
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from tools.setup_helpers.native_manifest import is_native_input
+
+
+_VERSION = 1
+
+SOURCE_DIRS = ("torch", "test")
+
+# módulos cujos importadores não herdam as dependências
+ROOT_BARRIERS = frozenset(("torch",))
+
+# arquivos que mudam a execução de todos os testes
+GLOBAL_INPUTS = ("pytest.ini", "setup.py", "test/conftest.py")
+
+# mudanças nesses arquivos não afetam testes. `.txt` fica de fora:
+# CMakeLists.txt, version.txt e requirements*.txt afetam o build
+_IGNORED_SUFFIXES = (".md", ".rst", ".png", ".svg", ".jpg")
+
+
+def module_name(rel: str) -> str:
+    """`torch/func/__init__.py` -> `torch.func`"""
+
+    parts = rel.removesuffix(".py").split("/")
+
+    if parts[-1] == "__init__":
+        parts.pop()
+
+    return ".".join(parts)
+
+
+def is_test_file(rel: str) -> bool:
+    name = rel.rsplit("/", 1)[-1]
+
+    return rel.startswith("test/") and name.startswith("test_") and name.endswith(".py")
+
+
+def _attribute_chain(node: ast.Attribute) -> list[str] | None:
+    parts = []
+
+    current: ast.expr = node
+
+    while isinstance(current, ast.Attribute):
+        parts.append(current.attr)
+
+        current = current.value
+
+    if not isinstance(current, ast.Name):
+        return None
+
+    parts.append(current.id)
+
+    return parts[::-1]
+
+
+def parse_imports(source: str, module: str, is_package: bool) -> list[str]:
+    """nomes importados (ou referenciados como `pacote.submódulo`) por um módulo"""
+
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return []
+
+    package = module if is_package else module.rpartition(".")[0]
+
+    names: set[str] = set()
+
+    # apelido local -> módulo (`import torch.nn as nn`)
+    aliases: dict[str, str] = {}
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                names.add(alias.name)
+
+                # `import torch.nn` liga só o nome `torch`
+                if alias.asname:
+                    aliases[alias.asname] = alias.name
+                else:
+                    top = alias.name.split(".")[0]
+
+                    aliases[top] = top
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base_parts = package.split(".")
+
+                if node.level > 1:
+                    base_parts = base_parts[:-(node.level - 1)]
+
+                base = ".".join(base_parts + ([node.module] if node.module else []))
+            else:
+                base = node.module or ""
+
+            names.add(base)
+
+            # `from torch import func` importa um submódulo
+            for alias in node.names:
+                if alias.name != "*":
+                    names.add(f"{base}.{alias.name}")
+
+                    aliases[alias.asname or alias.name] = f"{base}.{alias.name}"
+
+    # `torch.func.grad(...)` depende de torch.func mesmo sem import explícito
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute):
+            chain = _attribute_chain(node)
+
+            if chain and chain[0] in aliases:
+                names.add(".".join([aliases[chain[0]], *chain[1:]]))
+
+    return sorted(names)
+
+
+class ImportGraph:
+    def __init__(self, root: Path, cache_file: Path | None = None) -> None:
+        self.root = root
+        self.cache_file = cache_file
+
+        # rel -> [mtime_ns, tamanho, imports]
+        self.files: dict[str, list[Any]] = {}
+
+        if cache_file is not None:
+            try:
+                data = json.loads(cache_file.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+
+            if data.get("version") == _VERSION:
+                self.files = data["files"]
+
+    def update(self) -> int:
+        """reanalisa os arquivos alterados desde o cache. retorna quantos"""
+
+        seen: dict[str, list[Any]] = {}
+        parsed = 0
+
+        for source_dir in SOURCE_DIRS:
+            for dirpath, dirs, names in os.walk(self.root / source_dir):
+                dirs[:] = [name for name in dirs if name != "__pycache__" and not name.startswith(".")]
+
+                for name in names:
+                    if not name.endswith(".py"):
+                        continue
+
+                    path = Path(dirpath) / name
+                    rel = path.relative_to(self.root).as_posix()
+
+                    try:
+                        st = path.stat()
+                    except OSError:
+                        continue
+
+                    cached = self.files.get(rel)
+
+                    if cached is not None and cached[:2] == [st.st_mtime_ns, st.st_size]:
+                        seen[rel] = cached
+
+                        continue
+
+                    imports = parse_imports(
+                        path.read_text(encoding="utf-8", errors="replace"),
+                        module_name(rel),
+                        name == "__init__.py"
+                    )
+
+                    seen[rel] = [st.st_mtime_ns, st.st_size, imports]
+                    parsed += 1
+
+        changed = parsed or len(seen) != len(self.files)
+
+        self.files = seen
+
+        if changed and self.cache_file is not None:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+
+            tmp = self.cache_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"version": _VERSION, "files": self.files}), encoding="utf-8")
+
+            os.replace(tmp, self.cache_file)
+
+        return parsed
+
+    def reverse_edges(self) -> dict[str, set[str]]:
+        """arquivo -> arquivos que o importam"""
+
+        by_module = {module_name(rel): rel for rel in self.files}
+
+        # os testes rodam com test/ no sys.path: `import common_utils`
+        for rel in self.files:
+            if rel.startswith("test/"):
+                by_module.setdefault(module_name(rel.removeprefix("test/")), rel)
+
+        reverse: dict[str, set[str]] = defaultdict(set)
+
+        for rel, (_, _, imports) in self.files.items():
+            for name in imports:
+                # `torch.func.grad` -> torch.func (o maior prefixo que é um módulo)
+                parts = name.split(".")
+
+                while parts and ".".join(parts) not in by_module:
+                    parts.pop()
+
+                if parts:
+                    target = by_module[".".join(parts)]
+
+                    if target != rel:
+                        reverse[target].add(rel)
+
+        return reverse
+
+    def affected_tests(self, changed: Iterable[str]) -> set[str]:
+        return self.trace(changed)[0]
+
+    def trace(self, changed: Iterable[str], reverse: dict[str, set[str]] | None = None) -> tuple[set[str], bool]:
+        """
+        (testes afetados, se a propagação chegou a um módulo raiz
+        de ROOT_BARRIERS)
+        """
+
+        if reverse is None:
+            reverse = self.reverse_edges()
+
+        barriers = {rel for rel in self.files if module_name(rel) in ROOT_BARRIERS}
+
+        result: set[str] = set()
+        visited: set[str] = set()
+        stack = [rel for rel in changed if rel in self.files]
+
+        reached_barrier = False
+
+        while stack:
+            rel = stack.pop()
+
+            if rel in visited:
+                continue
+
+            visited.add(rel)
+
+            if is_test_file(rel):
+                result.add(rel)
+
+            # não propaga pelos importadores do módulo raiz; uma
+            # mudança nele próprio é tratada em `select_tests`
+            if rel in barriers:
+                reached_barrier = True
+
+                continue
+
+            stack.extend(reverse.get(rel, ()))
+
+        return result, reached_barrier
+
+    def all_tests(self) -> set[str]:
+        return {rel for rel in self.files if is_test_file(rel)}
+
+
+def coverage_map_from_json(path: Path) -> dict[str, set[str]]:
+    """
+    arquivo fonte -> arquivos de teste que o executaram, a partir
+    de `coverage json --show-contexts` com contextos por teste
+    (`test/test_foo.py::TestBar::test_x|run`)
+    """
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+
+    result: dict[str, set[str]] = defaultdict(set)
+
+    for filename, info in data.get("files", {}).items():
+        try:
+            rel = Path(filename).absolute().relative_to(REPO_ROOT).as_posix()
+        except ValueError:
+            rel = filename
+
+        for contexts in info.get("contexts", {}).values():
+            for context in contexts:
+                test = context.split("::", 1)[0].split("|", 1)[0]
+
+                if is_test_file(test):
+                    result[rel].add(test)
+
+    return result
+
+
+def changed_files(base: str) -> list[str]:
+    """
+    arquivos alterados desde `base`, inclusive mudanças locais e
+    arquivos novos, relativos a REPO_ROOT mesmo se o checkout
+    estiver acima dele
+    """
+
+    def git(*args: str) -> list[str]:
+        output = subprocess.check_output(["git", *args], cwd=REPO_ROOT, text=True)
+
+        return [line for line in output.splitlines() if line]
+
+    files = set(git("diff", "--name-only", "--relative", f"{base}...HEAD"))
+    files |= set(git("diff", "--name-only", "--relative", "HEAD"))
+    files |= set(git("ls-files", "--others", "--exclude-standard"))
+
+    return sorted(files)
+
+
+def select_tests(
+    changed: list[str],
+    graph: ImportGraph,
+    coverage: dict[str, set[str]] | None = None
+) -> tuple[set[str], str]:
+    """retorna (testes selecionados, motivo)"""
+
+    relevant = [path for path in changed if not path.lower().endswith(_IGNORED_SUFFIXES)]
+
+    reverse = graph.reverse_edges()
+
+    selected: set[str] = set()
+
+    for path in relevant:
+        if path in GLOBAL_INPUTS or path.endswith("/conftest.py"):
+            return graph.all_tests(), f"{path} afeta todos os testes"
+
+        if path.endswith(".py") and module_name(path) in ROOT_BARRIERS:
+            return graph.all_tests(), f"{path} é importado por todos os testes"
+
+        if is_native_input(path):
+            return graph.all_tests(), f"{path} exige o build nativo"
+
+        # removido, ou fora dos diretórios do grafo
+        if not path.endswith(".py") or path not in graph.files:
+            return graph.all_tests(), f"{path} não pôde ser classificado"
+
+        tests, reached_barrier = graph.trace([path], reverse)
+
+        # o módulo é carregado pelo `import torch` de todos os
+        # testes, mesmo que alguns também o importem diretamente
+        if reached_barrier:
+            return graph.all_tests(), f"{path} é carregado pelo torch/__init__.py"
+
+        selected |= tests
+
+    if coverage:
+        for path in relevant:
+            selected |= coverage.get(path, set())
+
+    return selected, f"{len(relevant)} arquivos alterados"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="seleciona os testes afetados por uma mudança")
+    parser.add_argument("--base", default="origin/main", help="ref de base para o diff")
+    parser.add_argument("--files", nargs="*", help="arquivos alterados (em vez do diff do git)")
+    parser.add_argument("--coverage-json", type=Path, help="saída de `coverage json --show-contexts` com contextos por teste")
+    parser.add_argument("--cache", type=Path, default=REPO_ROOT / ".test_timings" / "import_graph.json")
+    parser.add_argument("--explain", action="store_true", help="reporta o motivo e o tamanho da seleção no stderr")
+
+    args = parser.parse_args()
+
+    changed = args.files if args.files is not None else changed_files(args.base)
+
+    graph = ImportGraph(REPO_ROOT, args.cache)
+    parsed = graph.update()
+
+    coverage = coverage_map_from_json(args.coverage_json) if args.coverage_json else None
+
+    selected, reason = select_tests(changed, graph, coverage)
+
+    if args.explain:
+        print(
+            f"{reason}; {len(selected)} de {len(graph.all_tests())} arquivos de teste selecionados "
+            f"({parsed} arquivos reanalisados)",
+
+            file=sys.stderr
+        )
+
+    print("\n".join(sorted(selected)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+armazenamento local das durações históricas dos testes.
+
+as durações vêm dos relatórios junit que o pytest já escreve
+(`--junit-xml`, com `junit_logging_reruns` no pytest.ini) e são
+acumuladas em um arquivo json como média móvel por teste. o
+planejador de shards (tools/testing/shard_planner.py) consulta
+este arquivo.
+
+os testes são identificados pela chave `<classname>::<name>` do
+junit; `key_from_nodeid` deriva a mesma chave de um nodeid do
+pytest (`test/test_foo.py::TestBar::test_x` ->
+`test.test_foo.TestBar::test_x`).
+
+uso::
+
+    python tools/testing/timing_store.py ingest test-reports/**/*.xml
+    python tools/testing/timing_store.py show --top 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import xml.etree.ElementTree as ET
+
+from pathlib import Path
+
+
+_VERSION = 1
+
+REPO_ROOT = Path(__file__).absolute().parent.parent.parent
+
+# peso de uma nova medida na média móvel
+_ALPHA = 0.5
+
+# duração assumida sem nenhum histórico
+DEFAULT_DURATION = 1.0
+
+
+def default_store_path() -> Path:
+    return Path(os.getenv("PYTORCH_TEST_TIMINGS") or REPO_ROOT / ".test_timings" / "timings.json")
+
+
+def key_from_nodeid(nodeid: str) -> str:
+    """chave junit de um nodeid do pytest"""
+
+    path, _, rest = nodeid.partition("::")
+
+    module = path.removesuffix(".py").replace("/", ".").replace("\\", ".")
+
+    *classes, name = rest.split("::") if rest else [""]
+
+    return ".".join([module, *classes]) + "::" + name
+
+
+def module_of(key: str) -> str:
+    """prefixo da chave até o módulo de teste (para estimativas por arquivo)"""
+
+    classname = key.split("::", 1)[0]
+
+    parts = classname.split(".")
+
+    # classes de teste começam com maiúscula
+    while len(parts) > 1 and parts[-1][:1].isupper():
+        parts.pop()
+
+    return ".".join(parts)
+
+
+class TimingStore:
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = path or default_store_path()
+
+        # chave -> [média em segundos, número de medidas]
+        self.tests: dict[str, list[float]] = {}
+
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") == _VERSION:
+            self.tests = data["tests"]
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": _VERSION, "tests": self.tests}, sort_keys=True), encoding="utf-8")
+
+        os.replace(tmp, self.path)
+
+    def add(self, key: str, seconds: float) -> None:
+        entry = self.tests.get(key)
+
+        if entry is None:
+            self.tests[key] = [seconds, 1]
+        else:
+            entry[0] = (1 - _ALPHA) * entry[0] + _ALPHA * seconds
+            entry[1] += 1
+
+    def ingest_junit(self, path: Path) -> int:
+        """acumula as durações de um relatório junit. retorna o número de testes lidos"""
+
+        count = 0
+
+        for case in ET.parse(path).iter("testcase"):
+            # testes pulados não dizem nada sobre a duração real
+            if case.find("skipped") is not None:
+                continue
+
+            try:
+                seconds = float(case.get("time", ""))
+            except ValueError:
+                continue
+
+            self.add(f"{case.get('classname', '')}::{case.get('name', '')}", seconds)
+
+            count += 1
+
+        return count
+
+    def estimator(self) -> Estimator:
+        return Estimator({key: entry[0] for key, entry in self.tests.items()})
+
+
+class Estimator:
+    """
+    duração esperada de cada teste: a média histórica quando
+    existe, senão a mediana dos testes do mesmo módulo, senão a
+    mediana global
+    """
+
+    def __init__(self, durations: dict[str, float]) -> None:
+        self.durations = durations
+
+        by_module: dict[str, list[float]] = {}
+
+        for key, seconds in durations.items():
+            by_module.setdefault(module_of(key), []).append(seconds)
+
+        self.module_medians = {module: statistics.median(values) for module, values in by_module.items()}
+        self.global_median = statistics.median(durations.values()) if durations else DEFAULT_DURATION
+
+    def __call__(self, key: str) -> float:
+        seconds = self.durations.get(key)
+
+        if seconds is not None:
+            return seconds
+
+        return self.module_medians.get(module_of(key), self.global_median)
+
+    def is_known(self, key: str) -> bool:
+        return key in self.durations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="durações históricas dos testes")
+    parser.add_argument("--store", type=Path, default=None, help="arquivo json das durações")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="acumula relatórios junit")
+    ingest.add_argument("reports", nargs="+", help="arquivos ou globs de relatórios junit")
+
+    show = subparsers.add_parser("show", help="lista os testes mais lentos")
+    show.add_argument("--top", type=int, default=20)
+
+    args = parser.parse_args()
+
+    timings = TimingStore(args.store)
+
+    if args.command == "ingest":
+        total = 0
+
+        for pattern in args.reports:
+            for path in sorted(glob.glob(pattern, recursive=True)) or [pattern]:
+                total += timings.ingest_junit(Path(path))
+
+        timings.save()
+
+        print(f"{total} durações acumuladas em {timings.path} ({len(timings.tests)} testes)")
+
+        return
+
+    for key, (seconds, count) in sorted(timings.tests.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"{seconds:10.3f}s  ({int(count)}x)  {key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+jvp e vjp com muitas direções e uma única avaliação do primal.
+
+com K tangentes, K chamadas a `jvp` avaliam a função K vezes.
+`multi_jvp` recebe as K tangentes empilhadas numa dimensão inicial
+e empurra todas juntas: sem `chunk_size`, um único `vmap` sobre as
+tangentes calcula o primal uma vez (os primais não são
+vetorizados) e as tangentes em lote; com `chunk_size`, a função é
+rastreada uma vez com tangentes simbólicas, como no `linearize`, e
+o grafo linear resultante é aplicado a cada pedaço de tangentes,
+sem recalcular o primal. a saída e o aux vêm desse mesmo
+rastreamento (o `linearize` avalia a função duas vezes).
+
+`multi_vjp` faz o mesmo para cotangentes: o forward roda uma vez e
+a função vjp devolvida aceita um lote de cotangentes, opcionalmente
+em pedaços::
+
+    from torch.func import multi_jvp, multi_vjp
+
+    out, jvps = multi_jvp(f, (x,), (directions,))  # directions: [K, *x.shape]
+
+    out, vjp_fn = multi_vjp(f, x)
+    vjps = vjp_fn(cotangents, chunk_size=32)     # cotangents: [K, *out.shape]
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from typing import Any
+
+import torch
+import torch.autograd.forward_ad as fwAD
+
+from torch._functorch.apis import vmap
+from torch._functorch.eager_transforms import jvp, vjp
+from torch.fx.experimental import const_fold
+from torch.fx.experimental.proxy_tensor import make_fx
+from torch.utils._pytree import tree_flatten, tree_map_only, tree_unflatten
+
+
+__all__ = ["multi_jvp", "multi_vjp"]
+
+
+def _linearize(func: Callable[..., Any], primals: tuple[Any, ...], has_aux: bool) -> tuple[Any, Callable[..., Any], Any]:
+    """
+    como `linearize`, mas avalia `func` uma única vez: a saída e o
+    aux são capturados durante o rastreamento do grafo linear. só a
+    saída passa pelo forward-ad; o aux não precisa ser tensor
+    """
+
+    flat_primals, primals_spec = tree_flatten(primals)
+
+    # tangentes só para o rastreamento
+    flat_tangents = tuple(p.new_empty(()).expand_as(p) for p in flat_primals)
+
+    captured: list[tuple[Any, Any]] = []
+
+    def primal(dual: torch.Tensor) -> torch.Tensor:
+        return fwAD.unpack_dual(dual).primal
+
+    def tangent(dual: torch.Tensor) -> torch.Tensor:
+        t = fwAD.unpack_dual(dual).tangent
+
+        # saídas que não dependem dos primais têm tangente nula
+        return torch.zeros_like(dual) if t is None else t
+
+    def trace_fn(flat_tangents: tuple[torch.Tensor, ...]) -> Any:
+        with fwAD.dual_level():
+            duals = tree_unflatten(
+                [fwAD.make_dual(p, t) for p, t in zip(flat_primals, flat_tangents)],
+                primals_spec
+            )
+
+            output = func(*duals)
+            aux = None
+
+            if has_aux:
+                output, aux = output
+                aux = tree_map_only(torch.Tensor, primal, aux)
+
+            captured.append((tree_map_only(torch.Tensor, primal, output), aux))
+
+            return tree_map_only(torch.Tensor, tangent, output)
+
+    # as partes que só dependem dos primais viram constantes do
+    # grafo e não são recalculadas a cada pedaço
+    jvp_graph = const_fold.split_const_subgraphs(make_fx(trace_fn)(flat_tangents))
+
+    output, aux = captured[0]
+
+    _, output_spec = tree_flatten(output)
+
+    def jvp_fn(*tangents: Any) -> Any:
+        return tree_unflatten(jvp_graph(*tree_flatten(tangents)[0]), output_spec)
+
+    return output, jvp_fn, aux
+
+
+def multi_jvp(
+    func: Callable[..., Any],
+    primals: tuple[Any, ...],
+    tangents: tuple[Any, ...],
+    *,
+    chunk_size: int | None = None,
+    has_aux: bool = False
+) -> tuple[Any, ...]:
+    """
+    como `jvp(func, primals, tangents)`, mas cada tangente tem uma
+    dimensão inicial de tamanho K com as direções. retorna
+    `(saída, tangentes da saída)` (mais `aux` com `has_aux`), com as
+    tangentes da saída empilhadas na dimensão 0
+    """
+
+    if not isinstance(primals, tuple) or not isinstance(tangents, tuple) or len(primals) != len(tangents):
+        raise RuntimeError(
+            f"multi_jvp: esperava-se primals e tangents como tuples do mesmo tamanho, foram obtidos {type(primals)} e {type(tangents)}"
+        )
+
+    if chunk_size is None:
+        def push(*batch: Any) -> tuple[Any, ...]:
+            return jvp(func, primals, batch, has_aux=has_aux)
+
+        # a saída e o aux não dependem das tangentes
+        out_dims = (None, 0, None) if has_aux else (None, 0)
+
+        return vmap(push, out_dims=out_dims)(*tangents)
+
+    output, jvp_fn, aux = _linearize(func, primals, has_aux)
+
+    tangents_out = vmap(jvp_fn, chunk_size=chunk_size)(*tangents)
+
+    return (output, tangents_out, aux) if has_aux else (output, tangents_out)
+
+
+def multi_vjp(func: Callable[..., Any], *primals: Any, has_aux: bool = False) -> tuple[Any, ...]:
+    """
+    como `vjp(func, *primals)`, mas a função devolvida recebe um
+    lote de cotangentes (dimensão inicial de tamanho K) e aceita
+    `chunk_size` para limitar quantas são processadas de cada vez
+    """
+
+    result = vjp(func, *primals, has_aux=has_aux)
+
+    vjp_fn = result[1]
+
+    def multi_vjp_fn(cotangents: Any, *, chunk_size: int | None = None) -> tuple[Any, ...]:
+        return vmap(vjp_fn, chunk_size=chunk_size)(cotangents)
+
+    return (result[0], multi_vjp_fn, *result[2:])
@@ -0,0 +1,477 @@
+"""
+rematerialização de ativações para as transformações do torch.func.
+
+`grad`, `grad_and_value` e `vjp` mantêm todos os intermediários
+do forward vivos até o backward. `remat(fn)` troca essa memória
+por computação: o forward de `fn` roda sem guardar intermediários
+(só as entradas são salvas) e, no backward, `fn` é executada de
+novo para calcular o vjp. o resultado é uma função comum, que
+compõe com qualquer transformação::
+
+    from torch.func import grad, remat, vmap
+
+    def loss(params, x, y):
+        h = remat(block)(params, x)
+
+        return ((head(params, h) - y) ** 2).mean()
+
+    per_sample_grads = vmap(grad(loss), in_dims=(None, 0, 0))(params, xs, ys)
+
+só os tensores passados como argumentos recebem gradiente. se
+`fn` é um `nn.Module`, os parâmetros dele são elevados a entradas
+explícitas (via `functional_call`), o que funciona no autograd
+comum e sob `grad(functional_call(...))`. um tensor que exige
+gradiente capturado de outra forma (closure, atributo de um
+objeto que não é o módulo passado) perderia o gradiente em
+silêncio, então o forward o detecta e levanta um erro.
+
+para uma sequência de estágios, `remat_sequential` escolhe os
+segmentos: por contagem (`segments`), por um orçamento de memória
+(`memory_budget`, em bytes) ou, sem nenhum dos dois, √n segmentos.
+os estágios que são `nn.Module` têm os parâmetros elevados da
+mesma forma. com orçamento, a primeira chamada para cada formato
+de entrada roda os estágios uma vez sem gradiente para medir o
+tamanho de cada saída; sob vmap as medidas são por amostra. essa
+sondagem roda com o gerador aleatório isolado (`fork_rng`) e os
+buffers dos módulos (estatísticas do BatchNorm) restaurados
+depois, mas efeitos colaterais de estágios que não são módulos
+(mutação de estado capturado, contadores) acontecem uma vez a
+mais.
+
+o estado do gerador aleatório é salvo no forward e restaurado na
+recomputação, de modo que dropout e afins produzem os mesmos
+valores nas duas execuções. na recomputação, os buffers dos
+módulos passados (a `remat` ou como estágios) são trocados por
+cópias, então as estatísticas do BatchNorm só são atualizadas
+pelo forward; módulos capturados por uma função comum não têm
+essa proteção.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import math
+
+from collections.abc import Callable, Iterator, Sequence
+from typing import Any
+
+import torch
+
+from torch.nn.utils.stateless import _reparametrize_module
+from torch.overrides import TorchFunctionMode
+from torch.utils._pytree import tree_flatten, tree_unflatten
+from torch.utils.checkpoint import get_device_states, set_device_states
+
+
+__all__ = ["remat", "remat_sequential"]
+
+# limites de segmento avaliados ao planejar com orçamento de memória
+_MAX_CANDIDATES = 256
+
+
+def _is_differentiable(t: torch.Tensor) -> bool:
+    return t.is_floating_point() or t.is_complex()
+
+
+class _Recompute:
+    """
+    função sobre os tensores de entrada achatados, mais o estado do
+    gerador e os módulos cujos buffers a recomputação não pode
+    alterar
+    """
+
+    def __init__(
+        self,
+        fn: Callable[..., Any],
+        run: Callable[..., tuple[torch.Tensor, ...]],
+        tensors: Sequence[torch.Tensor],
+        preserve_rng_state: bool,
+        modules: Sequence[torch.nn.Module] = ()
+    ) -> None:
+        self.fn = fn
+        self.run = run
+        self.modules = modules
+
+        # sem gradiente na chamada, um tensor capturado não perde nada
+        self.check_captured = torch.is_grad_enabled()
+
+        self.cpu_state = None
+        self.devices: list[int] = []
+        self.device_states: list[torch.Tensor] = []
+
+        if preserve_rng_state:
+            self.cpu_state = torch.get_rng_state()
+            self.devices, self.device_states = get_device_states(*tensors)
+
+    @contextlib.contextmanager
+    def _scratch_buffers(self) -> Iterator[None]:
+        # o forward já atualizou os buffers dos módulos (estatísticas
+        # do BatchNorm), e a recomputação roda em modo de treino de
+        # novo: ela atualiza cópias criadas aqui, dentro da
+        # transformação do backward, que também não permite mutar os
+        # buffers originais, capturados
+        with contextlib.ExitStack() as stack:
+            for module in self.modules:
+                buffers = {name: b.clone() for name, b in module.named_buffers()}
+
+                stack.enter_context(_reparametrize_module(module, buffers))
+
+            yield
+
+    def __call__(self, *tensors: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        with self._scratch_buffers():
+            return self._run(*tensors)
+
+    def _run(self, *tensors: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        if self.cpu_state is None:
+            return self.run(*tensors)
+
+        with torch.random.fork_rng(devices=self.devices):
+            torch.set_rng_state(self.cpu_state)
+
+            set_device_states(self.devices, self.device_states)
+
+            return self.run(*tensors)
+
+
+class _CapturedGradCheck(TorchFunctionMode):
+    """
+    levanta um erro se uma operação usa um tensor que exige
+    gradiente e não é uma das entradas: no forward sem grafo, ele
+    ficaria sem gradiente
+    """
+
+    def __init__(self, fn: Callable[..., Any], inputs: Sequence[torch.Tensor]) -> None:
+        super().__init__()
+
+        self.fn = fn
+        self.inputs = {id(t) for t in inputs}
+
+    def __torch_function__(self, func: Any, types: Any, args: tuple[Any, ...] = (), kwargs: dict[str, Any] | None = None) -> Any:
+        kwargs = kwargs or {}
+
+        flat, _ = tree_flatten((args, kwargs))
+
+        for t in flat:
+            if isinstance(t, torch.Tensor) and t.requires_grad and id(t) not in self.inputs:
+                raise RuntimeError(
+                    f"remat: {self.fn} usa um tensor que exige gradiente sem recebê-lo como argumento "
+                    f"(capturado por closure ou atributo), e o gradiente dele seria perdido. passe o tensor "
+                    f"como argumento, ou passe o próprio nn.Module para remat, que eleva os parâmetros a entradas"
+                )
+
+        return func(*args, **kwargs)
+
+
+class _RematFunction(torch.autograd.Function):
+    generate_vmap_rule = True
+
+    @staticmethod
+    def forward(recompute: _Recompute, *tensors: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        # o forward de uma autograd.Function não grava o grafo: os
+        # intermediários de `fn` são liberados assim que saem de uso
+        if not recompute.check_captured:
+            return recompute.run(*tensors)
+
+        with _CapturedGradCheck(recompute.fn, tensors):
+            return recompute.run(*tensors)
+
+    @staticmethod
+    def setup_context(ctx: Any, inputs: tuple[Any, ...], output: tuple[torch.Tensor, ...]) -> None:
+        recompute, *tensors = inputs
+
+        ctx.recompute = recompute
+        ctx.diff_outputs = [i for i, t in enumerate(output) if _is_differentiable(t)]
+
+        ctx.mark_non_differentiable(*(t for t in output if not _is_differentiable(t)))
+        ctx.save_for_backward(*tensors)
+
+    @staticmethod
+    def backward(ctx: Any, *grad_outputs: torch.Tensor) -> tuple[torch.Tensor | None, ...]:
+        tensors = ctx.saved_tensors
+
+        diff_inputs = [i for i, t in enumerate(tensors) if _is_differentiable(t) and ctx.needs_input_grad[i + 1]]
+
+        grads: list[torch.Tensor | None] = [None] * len(tensors)
+
+        if not diff_inputs or not ctx.diff_outputs:
+            return (None, *grads)
+
+        def run_differentiable(*diff_tensors: torch.Tensor) -> tuple[torch.Tensor, ...]:
+            full = list(tensors)
+
+            for i, t in zip(diff_inputs, diff_tensors):
+                full[i] = t
+
+            outputs = ctx.recompute(*full)
+
+            return tuple(outputs[i] for i in ctx.diff_outputs)
+
+        # a recomputação usa as próprias transformações, o que mantém
+        # o backward diferenciável e compatível com vmap
+        _, vjp_fn = torch.func.vjp(run_differentiable, *(tensors[i] for i in diff_inputs))
+
+        for i, grad in zip(diff_inputs, vjp_fn(tuple(grad_outputs[i] for i in ctx.diff_outputs))):
+            grads[i] = grad
+
+        return (None, *grads)
+
+
+def remat(fn: Callable[..., Any], *, preserve_rng_state: bool = True) -> Callable[..., Any]:
+    """
+    `fn` sem intermediários guardados para o backward: eles são
+    recomputados quando o gradiente é pedido. os argumentos podem
+    ser pytrees com valores que não são tensores; as saídas devem
+    ser tensores (ou pytrees de tensores). um `nn.Module` tem os
+    parâmetros passados como entradas explícitas, e os buffers dele
+    não são alterados de novo pela recomputação
+    """
+
+    return _remat(fn, preserve_rng_state, ())
+
+
+def _remat(fn: Callable[..., Any], preserve_rng_state: bool, modules: Sequence[torch.nn.Module]) -> Callable[..., Any]:
+    if isinstance(fn, torch.nn.Module):
+        module = fn
+
+        def call_module(params: dict[str, torch.Tensor], *args: Any, **kwargs: Any) -> Any:
+            return torch.func.functional_call(module, params, args, kwargs)
+
+        inner = _remat(call_module, preserve_rng_state, (module,))
+
+        @functools.wraps(module.forward)
+        def module_wrapper(*args: Any, **kwargs: Any) -> Any:
+            # lidos a cada chamada: sob functional_call, são os
+            # tensores trocados por ele
+            return inner(dict(module.named_parameters()), *args, **kwargs)
+
+        return module_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        flat_args, args_spec = tree_flatten((args, kwargs))
+
+        tensor_positions = [i for i, arg in enumerate(flat_args) if isinstance(arg, torch.Tensor)]
+
+        out_spec = []
+
+        def run(*tensors: torch.Tensor) -> tuple[torch.Tensor, ...]:
+            full = list(flat_args)
+
+            for i, t in zip(tensor_positions, tensors):
+                full[i] = t
+
+            call_args, call_kwargs = tree_unflatten(full, args_spec)
+
+            flat_out, spec = tree_flatten(fn(*call_args, **call_kwargs))
+
+            if not all(isinstance(out, torch.Tensor) for out in flat_out):
+                raise TypeError(f"remat: {fn} deve retornar apenas tensores, retornou {spec}")
+
+            out_spec[:] = [spec]
+
+            return tuple(flat_out)
+
+        tensors = [flat_args[i] for i in tensor_positions]
+
+        outputs = _RematFunction.apply(_Recompute(fn, run, tensors, preserve_rng_state, modules), *tensors)
+
+        return tree_unflatten(list(outputs), out_spec[0])
+
+    return wrapper
+
+
+def _output_bytes(output: Any) -> int:
+    flat, _ = tree_flatten(output)
+
+    return sum(t.numel() * t.element_size() for t in flat if isinstance(t, torch.Tensor))
+
+
+def _as_args(output: Any) -> tuple[Any, ...]:
+    return output if isinstance(output, tuple) else (output,)
+
+
+def _pack(sizes: Sequence[int], limit: int) -> list[tuple[int, int]]:
+    """segmentos contíguos gulosos com soma de `sizes` até `limit`"""
+
+    segments = []
+
+    start = 0
+    total = 0
+
+    for i, size in enumerate(sizes):
+        if i > start and total + size > limit:
+            segments.append((start, i))
+
+            start = i
+            total = 0
+
+        total += size
+
+    segments.append((start, len(sizes)))
+
+    return segments
+
+
+def _peak(sizes: Sequence[int], segments: Sequence[tuple[int, int]]) -> int:
+    # as entradas de cada segmento (as saídas do anterior) ficam
+    # guardadas até o backward; cada segmento, recomputado, tem os
+    # seus intermediários vivos um de cada vez
+    boundaries = sum(sizes[start - 1] for start, _ in segments[1:])
+
+    return boundaries + max(sum(sizes[start:stop]) for start, stop in segments)
+
+
+def _plan_segments(sizes: Sequence[int], memory_budget: int) -> list[tuple[int, int]]:
+    """
+    segmentos de estágios com saídas de `sizes` bytes que cabem em
+    `memory_budget`, com o menor número de segmentos; se nenhum
+    plano cabe, o de menor pico
+    """
+
+    if sum(sizes) <= memory_budget:
+        return [(0, len(sizes))]
+
+    prefix = [0]
+
+    for size in sizes:
+        prefix.append(prefix[-1] + size)
+
+    # os limites candidatos são as somas de janelas contíguas; com
+    # muitos estágios, uma amostra uniforme delas
+    limits = sorted({prefix[j] - prefix[i] for i in range(len(sizes)) for j in range(i + 1, len(sizes) + 1)})
+
+    if len(limits) > _MAX_CANDIDATES:
+        limits = [limits[k * (len(limits) - 1) // (_MAX_CANDIDATES - 1)] for k in range(_MAX_CANDIDATES)]
+
+    plans = [_pack(sizes, limit) for limit in limits]
+
+    fitting = [plan for plan in plans if _peak(sizes, plan) <= memory_budget]
+
+    if fitting:
+        return min(fitting, key=len)
+
+    return min(plans, key=lambda plan: _peak(sizes, plan))
+
+
+def _even_segments(num_stages: int, segments: int) -> list[tuple[int, int]]:
+    segments = max(1, min(segments, num_stages))
+
+    bounds = [round(i * num_stages / segments) for i in range(segments + 1)]
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def remat_sequential(
+    stages: Sequence[Callable[..., Any]],
+    *,
+    segments: int | None = None,
+    memory_budget: int | None = None,
+    preserve_rng_state: bool = True
+) -> Callable[..., Any]:
+    """
+    encadeia `stages` (a saída de cada um, se for tuple, é passada
+    como argumentos do próximo) rematerializando segmentos. o último
+    segmento não é rematerializado, já que o backward começa por ele
+    """
+
+    stages = list(stages)
+
+    if segments is not None and memory_budget is not None:
+        raise ValueError("remat_sequential: passe segments ou memory_budget, não os dois")
+
+    if not stages:
+        raise ValueError("remat_sequential: esperava-se pelo menos um estágio")
+
+    # formato das entradas -> segmentos
+    plans: dict[Any, list[tuple[int, int]]] = {}
+
+    def plan_for(args: tuple[Any, ...]) -> list[tuple[int, int]]:
+        if memory_budget is None:
+            return _even_segments(len(stages), segments or math.ceil(math.sqrt(len(stages))))
+
+        flat, _ = tree_flatten(args)
+
+        tensors = [t for t in flat if isinstance(t, torch.Tensor)]
+
+        key = tuple((tuple(t.shape), t.dtype) for t in tensors)
+
+        if key not in plans:
+            sizes = []
+
+            # a sondagem não pode avançar o gerador aleatório (as
+            # máscaras de dropout do forward real mudariam) nem
+            # atualizar duas vezes os buffers dos módulos
+            buffers = [
+                (buffer, buffer.clone())
+
+                for stage in stages
+
+                if isinstance(stage, torch.nn.Module)
+
+                for buffer in stage.buffers()
+            ]
+
+            devices, _ = get_device_states(*tensors)
+
+            with torch.no_grad(), torch.random.fork_rng(devices=devices):
+                probe = args
+
+                for stage in stages:
+                    output = stage(*probe)
+
+                    sizes.append(_output_bytes(output))
+
+                    probe = _as_args(output)
+
+                for buffer, saved in buffers:
+                    buffer.copy_(saved)
+
+            plans[key] = _plan_segments(sizes, memory_budget)
+
+        return plans[key]
+
+    def run_segment(start: int, stop: int, params: dict[int, dict[str, torch.Tensor]], *args: Any) -> Any:
+        output = None
+
+        for i in range(start, stop):
+            if i in params:
+                output = torch.func.functional_call(stages[i], params[i], args)
+            else:
+                output = stages[i](*args)
+
+            args = _as_args(output)
+
+        return output
+
+    def wrapper(*args: Any) -> Any:
+        plan = plan_for(args)
+
+        output = None
+
+        for n, (start, stop) in enumerate(plan):
+            segment = functools.partial(run_segment, start, stop)
+
+            # os parâmetros dos módulos do segmento entram como
+            # argumentos, para que recebam gradiente
+            params = {
+                i: dict(stages[i].named_parameters())
+
+                for i in range(start, stop)
+
+                if isinstance(stages[i], torch.nn.Module)
+            }
+
+            if n + 1 < len(plan):
+                modules = [stage for stage in stages[start:stop] if isinstance(stage, torch.nn.Module)]
+
+                output = _remat(segment, preserve_rng_state, modules)(params, *args)
+            else:
+                output = segment(params, *args)
+
+            args = _as_args(output)
+
+        return output
+
+    return wrapper
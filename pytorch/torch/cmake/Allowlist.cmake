@@ -16,17 +16,67 @@ file(READ "${CAFFE2_ALLOWLIST}" allowlist_content)
 # converte o conteúdo do arquivo em uma lista cmake
 string(REGEX REPLACE "\n" ";" allowlist_content ${allowlist_content})
 
+# cada linha é um arquivo ou um glob (por exemplo, a saída de
+# tools/gen_model_allowlist.py)
 foreach(item ${allowlist_content})
+    file(GLOB_RECURSE tmp ${item})
+
+    list(APPEND CAFFE2_ALLOWLISTED_FILES ${tmp})
 endforeach()
 
+# indexa a lista `allowlist` em variáveis, uma por item, para
+# que cada consulta seja constante em vez de um `list(FIND)`
+# linear. o índice é refeito se o conteúdo da lista mudar, e as
+# entradas do índice anterior são descartadas
+macro(caffe2_index_allowlist allowlist)
+    string(MD5 _digest "${${allowlist}}")
+
+    if(NOT "${__caffe2_allowlist_digest_${allowlist}}" STREQUAL "${_digest}")
+        foreach(_key ${__caffe2_allowlist_keys_${allowlist}})
+            unset(__caffe2_allowlisted_${allowlist}_${_key})
+        endforeach()
+
+        set(__caffe2_allowlist_keys_${allowlist})
+
+        foreach(item ${${allowlist}})
+            string(MD5 _key "${item}")
+
+            set(__caffe2_allowlisted_${allowlist}_${_key} TRUE)
+
+            list(APPEND __caffe2_allowlist_keys_${allowlist} ${_key})
+        endforeach()
+
+        set(__caffe2_allowlist_digest_${allowlist} ${_digest})
+    endif()
+endmacro()
+
+# com CAFFE2_ALLOWLIST_GENERATED_SOURCES ligado, fontes geradas no
+# diretório de build sempre passam pela allowlist: elas ainda não
+# existem quando a allowlist é expandida, e o codegen pode ser
+# restringido à parte (SELECTED_OP_LIST). ligado por padrão: sem
+# o registro e o glue do dispatcher gerados, o build filtrado não
+# linka
+option(CAFFE2_ALLOWLIST_GENERATED_SOURCES "mantém as fontes geradas em CMAKE_BINARY_DIR ao aplicar a allowlist" ON)
+
+# mantém em `output` apenas os itens presentes em `allowlist`
 macro(caffe2_do_allowlist output allowlist)
+    caffe2_index_allowlist(${allowlist})
+
     set(_tmp)
+
     foreach(item ${${output}})
-        list(FIND ${allowlist} ${item} _index)
+        string(MD5 _key "${item}")
+
+        set(_generated -1)
 
-        if(${_index} GREATER -1)
-            set(_tmp ${_tmp} ${item})
+        if(CAFFE2_ALLOWLIST_GENERATED_SOURCES)
+            string(FIND "${item}" "${CMAKE_BINARY_DIR}/" _generated)
+        endif()
+
+        if(__caffe2_allowlisted_${allowlist}_${_key} OR _generated EQUAL 0)
+            list(APPEND _tmp ${item})
         endif()
     endforeach()
+
     set(${output} ${_tmp})
-endmacro()
\ No newline at end of file
+endmacro()
@@ -24,6 +24,64 @@ if(CMAKE_CROSSCOMPILING)
         SET(BLAS_USE_CBLAS_DOT FALSE)
     endif()
 else()
+    # os resultados das sondagens ficam em um cache fora do
+    # diretório de build, indexado pelas bibliotecas blas (e suas
+    # datas de modificação), pelo compilador e pelo alvo, para que
+    # configures do zero (CMAKE_FRESH=1, ci) não rodem de novo os
+    # try-runs. PYTORCH_CMAKE_PROBE_CACHE muda o diretório; um
+    # valor vazio ou OFF desativa o cache
+    if(DEFINED ENV{PYTORCH_CMAKE_PROBE_CACHE})
+        SET(_blas_abi_cache_dir "$ENV{PYTORCH_CMAKE_PROBE_CACHE}")
+    elseif(DEFINED ENV{XDG_CACHE_HOME})
+        SET(_blas_abi_cache_dir "$ENV{XDG_CACHE_HOME}/torch/cmake_probes")
+    elseif(DEFINED ENV{HOME})
+        SET(_blas_abi_cache_dir "$ENV{HOME}/.cache/torch/cmake_probes")
+    else()
+        SET(_blas_abi_cache_dir "")
+    endif()
+
+    SET(_blas_abi_probes BLAS_F2C_DOUBLE_WORKS BLAS_F2C_FLOAT_WORKS BLAS_USE_CBLAS_DOT)
+    SET(_blas_abi_cache_file "")
+
+    if(_blas_abi_cache_dir AND NOT _blas_abi_cache_dir STREQUAL "OFF")
+        SET(_blas_abi_key_parts
+            "${BLAS_LIBRARIES}"
+            "${CMAKE_C_COMPILER}"
+            "${CMAKE_C_COMPILER_ID}"
+            "${CMAKE_C_COMPILER_VERSION}"
+            "${CMAKE_C_COMPILER_TARGET}"
+            "${CMAKE_LIBRARY_ARCHITECTURE}"
+            "${CMAKE_SYSTEM_NAME}-${CMAKE_SYSTEM_PROCESSOR}"
+            "${CMAKE_REQUIRED_FLAGS}")
+
+        # uma biblioteca reinstalada no mesmo path muda a chave
+        foreach(_lib ${BLAS_LIBRARIES})
+            if(EXISTS "${_lib}")
+                file(TIMESTAMP "${_lib}" _lib_mtime "%s" UTC)
+
+                list(APPEND _blas_abi_key_parts "${_lib_mtime}")
+            endif()
+        endforeach()
+
+        string(MD5 _blas_abi_key "${_blas_abi_key_parts}")
+
+        SET(_blas_abi_cache_file "${_blas_abi_cache_dir}/blas_abi-${_blas_abi_key}.cmake")
+
+        # definir as variáveis no cache faz CHECK_C_SOURCE_RUNS
+        # pular a sondagem
+        if(EXISTS "${_blas_abi_cache_file}")
+            include("${_blas_abi_cache_file}")
+
+            foreach(_probe ${_blas_abi_probes})
+                if(DEFINED _cached_${_probe} AND NOT DEFINED CACHE{${_probe}})
+                    SET(${_probe} "${_cached_${_probe}}" CACHE INTERNAL "resultado de sondagem do blas (cache em ${_blas_abi_cache_dir})")
+                endif()
+            endforeach()
+
+            MESSAGE(STATUS "sondagens de abi do blas reaproveitadas de ${_blas_abi_cache_file}")
+        endif()
+    endif()
+
     SET(CMAKE_REQUIRED_LIBRARIES ${BLAS_LIBRARIES})
 
     CHECK_C_SOURCE_RUNS("
@@ -98,6 +156,22 @@ int main() {
     endif(BLAS_USE_CBLAS_DOT)
 
     SET(CMAKE_REQUIRED_LIBRARIES)
+
+    if(_blas_abi_cache_file AND NOT EXISTS "${_blas_abi_cache_file}")
+        SET(_blas_abi_cache_content "")
+
+        foreach(_probe ${_blas_abi_probes})
+            string(APPEND _blas_abi_cache_content "set(_cached_${_probe} \"${${_probe}}\")\n")
+        endforeach()
+
+        # escrita atômica: jobs de ci concorrentes podem gravar a
+        # mesma chave
+        string(RANDOM LENGTH 8 _blas_abi_tmp_suffix)
+
+        file(MAKE_DIRECTORY "${_blas_abi_cache_dir}")
+        file(WRITE "${_blas_abi_cache_file}.${_blas_abi_tmp_suffix}" "${_blas_abi_cache_content}")
+        file(RENAME "${_blas_abi_cache_file}.${_blas_abi_tmp_suffix}" "${_blas_abi_cache_file}")
+    endif()
 endif(CMAKE_CROSSCOMPILING)
 
 MESSAGE(STATUS "BLAS_USE_CBLAS_DOT: ${BLAS_USE_CBLAS_DOT}")
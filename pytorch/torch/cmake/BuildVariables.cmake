@@ -11,7 +11,7 @@
 # caffe2_{cpu,gpu}_srcs é a lista que conterá todos os
 # arquivos de origem relacionados à cpu e à gpu,
 # respectivamente. eles serão preenchidos com os arquivos
-cmakelists.txt em cada pasta correspondente
+# cmakelists.txt em cada pasta correspondente
 set(Caffe2_CPU_SRCS)
 set(Caffe2_GPU_SRCS)
 
@@ -55,4 +55,24 @@ set(Caffe2_PUBLIC_CUDA_DEPENDENCY_LIBS "")
 # principal do caffe2. todos os alvos binários, como binários
 # python e nativos, serão vinculados automaticamente a esses
 # módulos
-set(Caffe2_MODULES "")
\ No newline at end of file
+set(Caffe2_MODULES "")
+
+# padrões (regex sobre o path do arquivo) de fontes que não
+# compilam em modo unity (ver Unity.cmake): arquivos que
+# definem símbolos com o mesmo nome em namespaces anônimos,
+# dependem de macros definidas antes dos includes ou são de
+# linguagens sem suporte a unity. padrões extras podem ser
+# passados com -DCAFFE2_UNITY_BUILD_EXCLUDE="regex1;regex2"
+set(Caffe2_UNITY_BUILD_EXCLUDE_PATTERNS
+    "\\.(cu|hip|mm|m|S|s|asm)$"
+    "/Register[A-Za-z0-9]*\\.cpp$"
+    "/RegisterCodegenUnboxedKernels[A-Za-z0-9_]*\\.cpp$"
+    "/native/cpu/.*\\.cpp$"
+    "/jit/runtime/register_.*\\.cpp$"
+    "/aoti_torch/generated/.*\\.cpp$"
+    ${CAFFE2_UNITY_BUILD_EXCLUDE})
+
+# o modo unity é aplicado aos alvos que recebem as listas de
+# fontes acima; com USE_UNITY_BUILD desligado, a inclusão não
+# muda nada
+include(${CMAKE_CURRENT_LIST_DIR}/Unity.cmake)
@@ -0,0 +1,100 @@
+if(__caffe2_unity_included)
+    return()
+endif()
+
+set(__caffe2_unity_included TRUE)
+
+# modo unity (jumbo): as fontes de um alvo são concatenadas em
+# lotes e cada lote compila como uma única unidade de tradução,
+# então os headers pesados do aten e do c10 são analisados uma
+# vez por lote em vez de uma vez por arquivo.
+#
+# habilitado com USE_UNITY_BUILD=1 (setup.py repassa as
+# variáveis USE_* para o cmake); o tamanho dos lotes vem de
+# CMAKE_UNITY_BUILD_BATCH_SIZE. precisa do cmake 3.20 ou mais
+# novo. incluído por BuildVariables.cmake: ao fim do configure,
+# os alvos que recebem Caffe2_CPU_SRCS e Caffe2_GPU_SRCS
+# (Caffe2_UNITY_BUILD_TARGETS) passam para o modo unity
+
+option(USE_UNITY_BUILD "compila as fontes do caffe2 em lotes unity" OFF)
+
+if(NOT CMAKE_UNITY_BUILD_BATCH_SIZE)
+    set(CMAKE_UNITY_BUILD_BATCH_SIZE 16)
+endif()
+
+# alvos que compilam as listas de fontes do caffe2
+set(Caffe2_UNITY_BUILD_TARGETS torch_cpu torch_cuda torch_hip)
+
+# marca as fontes de `target` que casam com algum padrão de
+# Caffe2_UNITY_BUILD_EXCLUDE_PATTERNS (ver BuildVariables.cmake)
+# para que compilem sozinhas
+function(caffe2_unity_exclude target)
+    get_target_property(_srcs ${target} SOURCES)
+
+    set(_excluded)
+
+    foreach(_src ${_srcs})
+        foreach(_pattern ${Caffe2_UNITY_BUILD_EXCLUDE_PATTERNS})
+            if(_src MATCHES "${_pattern}")
+                list(APPEND _excluded ${_src})
+
+                break()
+            endif()
+        endforeach()
+    endforeach()
+
+    if(_excluded)
+        set_source_files_properties(${_excluded} TARGET_DIRECTORY ${target} PROPERTIES SKIP_UNITY_BUILD_INCLUSION ON)
+    endif()
+
+    list(LENGTH _srcs _total)
+    list(LENGTH _excluded _skipped)
+
+    message(STATUS "unity build de ${target}: ${_total} fontes, ${_skipped} fora dos lotes, lotes de ${CMAKE_UNITY_BUILD_BATCH_SIZE}")
+endfunction()
+
+# habilita o modo unity em `target` (por exemplo, o alvo que
+# recebe Caffe2_CPU_SRCS ou Caffe2_GPU_SRCS). não faz nada se
+# USE_UNITY_BUILD estiver desligado
+function(caffe2_enable_unity_build target)
+    if(NOT USE_UNITY_BUILD)
+        return()
+    endif()
+
+    if(CMAKE_VERSION VERSION_LESS 3.20)
+        message(WARNING "USE_UNITY_BUILD precisa do cmake 3.20 ou mais novo; ignorado")
+
+        return()
+    endif()
+
+    set_target_properties(${target} PROPERTIES
+        UNITY_BUILD ON
+        UNITY_BUILD_MODE BATCH
+        UNITY_BUILD_BATCH_SIZE ${CMAKE_UNITY_BUILD_BATCH_SIZE}
+        # namespaces anônimos de arquivos diferentes no mesmo lote
+        # recebem nomes distintos via esta macro
+        UNITY_BUILD_UNIQUE_ID CAFFE2_UNITY_ID)
+
+    caffe2_unity_exclude(${target})
+endfunction()
+
+# aplica caffe2_enable_unity_build aos alvos de
+# Caffe2_UNITY_BUILD_TARGETS que existirem
+function(caffe2_enable_unity_build_for_source_lists)
+    foreach(_target ${Caffe2_UNITY_BUILD_TARGETS})
+        if(TARGET ${_target})
+            caffe2_enable_unity_build(${_target})
+        endif()
+    endforeach()
+endfunction()
+
+# os alvos são definidos em subdiretórios depois desta inclusão,
+# então a aplicação fica para o fim do diretório raiz, uma única
+# vez por configure
+get_property(_caffe2_unity_scheduled GLOBAL PROPERTY CAFFE2_UNITY_BUILD_SCHEDULED)
+
+if(USE_UNITY_BUILD AND NOT _caffe2_unity_scheduled)
+    set_property(GLOBAL PROPERTY CAFFE2_UNITY_BUILD_SCHEDULED TRUE)
+
+    cmake_language(DEFER DIRECTORY ${CMAKE_SOURCE_DIR} CALL caffe2_enable_unity_build_for_source_lists)
+endif()
@@ -11,6 +11,8 @@ from torch._functorch.eager_transforms import (
     vjp
 )
 from torch._functorch.functional_call import functional_call, stack_module_state
+from torch._functorch.multi_tangent import multi_jvp, multi_vjp
+from torch._functorch.remat import remat, remat_sequential
 
 
 __all__ = [
@@ -25,7 +27,11 @@ __all__ = [
     "jvp",
     "linearize",
     "vjp",
+    "multi_jvp",
+    "multi_vjp",
     "functional_call",
     "stack_module_state",
-    "debug_unwrap"
+    "debug_unwrap",
+    "remat",
+    "remat_sequential"
 ]
\ No newline at end of file
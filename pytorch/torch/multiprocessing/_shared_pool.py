@@ -0,0 +1,546 @@
+"""
+pool de storages em memória compartilhada.
+
+cada chamada a `_new_shared(size)` cria um novo segmento de
+memória compartilhada (shm_open, ftruncate e mmap), além de
+consumir um file descriptor. workers que alocam um storage
+compartilhado por batch pagam esse custo o tempo todo.
+
+este pool mantém segmentos agrupados em classes de tamanho e
+entrega a cada pedido um novo mapeamento, do tamanho exato, de um
+segmento livre. quando o storage entregue é coletado (ou devolvido
+com `release`), o segmento volta ao pool, limitado a um total de
+bytes ociosos.
+
+o mapeamento entregue é um storage compartilhado comum: enviá-lo
+a outro processo reaproveita o mesmo segmento, sem cópia. como o
+destino continua lendo o segmento depois que a cópia local é
+coletada, cada segmento guarda no seu fim uma tabela de envios:
+cada envio marca uma posição, que o processo de destino limpa
+quando a cópia dele é coletada. o segmento só volta ao pool quando
+a cópia local foi devolvida e a tabela está vazia. um storage
+repassado adiante pelo destino (ou enviado mais vezes do que a
+tabela comporta) fixa o segmento, que deixa de ser reutilizado.
+
+com `install()`, `UntypedStorage._new_shared` e
+`TypedStorage._new_shared` passam pelo pool de forma transparente.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import weakref
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import torch
+
+from torch.multiprocessing import reductions
+from torch.types import Storage
+
+
+__all__ = ["SharedStoragePool", "PoolStats", "get_default_pool", "install", "uninstall"]
+
+# menor classe de tamanho, em bytes (uma página)
+_MIN_SIZE_CLASS = 4096
+
+# limite padrão de bytes ociosos mantidos pelo pool
+_DEFAULT_MAX_POOLED_BYTES = 256 * 1024 * 1024
+
+# bytes no fim de cada segmento para a tabela de envios: o
+# primeiro fixa o segmento, os demais são uma posição por envio
+_HEADER_BYTES = 64
+
+
+def _size_class(nbytes: int) -> int:
+    """
+    arredonda `nbytes` para a próxima classe de tamanho.
+
+    as classes são múltiplos de um quarto da potência de dois
+    anterior, então o desperdício fica abaixo de 25%.
+    """
+
+    if nbytes <= _MIN_SIZE_CLASS:
+        return _MIN_SIZE_CLASS
+
+    step = 1 << ((nbytes - 1).bit_length() - 3)
+
+    return (nbytes + step - 1) // step * step
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    releases: int = 0
+    evictions: int = 0
+
+    # bytes ociosos atualmente mantidos pelo pool
+    bytes_held: int = 0
+
+    # bytes de segmentos entregues e ainda não devolvidos
+    bytes_in_use: int = 0
+
+
+def _sharing_strategy() -> str:
+    from torch.multiprocessing import get_sharing_strategy
+
+    return get_sharing_strategy()
+
+
+def _allocate_segment(nbytes: int, strategy: str) -> torch.UntypedStorage:
+    if strategy == "file_system":
+        return torch.UntypedStorage._new_using_filename_cpu(nbytes + _HEADER_BYTES)
+
+    return torch.UntypedStorage._new_using_fd_cpu(nbytes + _HEADER_BYTES)
+
+
+def _map_segment(segment: torch.UntypedStorage, nbytes: int, strategy: str) -> torch.UntypedStorage:
+    """um novo storage com os primeiros `nbytes` de `segment`, no mesmo segmento compartilhado"""
+
+    if strategy == "file_system":
+        manager, handle, _ = segment._share_filename_cpu_()
+
+        return torch.UntypedStorage._new_shared_filename_cpu(manager, handle, nbytes)
+
+    fd, _ = segment._share_fd_cpu_()
+
+    return torch.UntypedStorage._new_shared_fd_cpu(fd, nbytes)
+
+
+class _SegmentHeader:
+    """
+    a tabela de envios no fim de um segmento.
+
+    só o processo dono marca posições e só o destino de cada envio
+    limpa a sua, então escritas de um byte bastam, sem lock entre
+    processos.
+    """
+
+    def __init__(self, segment: torch.UntypedStorage, size_class: int) -> None:
+        # o tensor mantém o mapeamento do segmento vivo
+        self.counts = torch.empty(0, dtype=torch.uint8).set_(segment, size_class, (_HEADER_BYTES,))
+
+    def acquire(self) -> int | None:
+        """marca uma posição livre para um envio; sem posição livre, fixa o segmento"""
+
+        free = (self.counts[1:] == 0).nonzero()
+
+        if len(free) == 0:
+            self.pin()
+
+            return None
+
+        slot = int(free[0]) + 1
+
+        self.counts[slot] = 1
+
+        return slot
+
+    def release(self, slot: int) -> None:
+        self.counts[slot] = 0
+
+    def pin(self) -> None:
+        self.counts[0] = 1
+
+    def pinned(self) -> bool:
+        return bool(self.counts[0])
+
+    def busy(self) -> bool:
+        return bool(self.counts.any())
+
+
+@dataclass
+class _Lease:
+    finalizer: weakref.finalize
+    segment: torch.UntypedStorage
+    header: _SegmentHeader
+
+
+class SharedStoragePool:
+    r"""
+    alocador de storages compartilhados agrupado em classes de
+    tamanho.
+
+    `new_shared(template, size)` tem a mesma semântica de
+    `template._new_shared(size)`: o storage retornado tem exatamente
+    `size` elementos. por trás dele há um segmento da classe de
+    tamanho do pedido, que volta ao pool quando o storage (e todo
+    tensor que o usa) é coletado, ou quando é devolvido com
+    `release`, e todo processo que o recebeu coletou a sua cópia.
+    quando o total de bytes ociosos passaria de `max_pooled_bytes`,
+    os segmentos mais antigos são descartados.
+
+    exemplo::
+
+        >>> pool = SharedStoragePool(max_pooled_bytes=1 << 30)
+        >>> storage = pool.new_shared(elem._typed_storage(), numel)
+    """
+
+    def __init__(self, max_pooled_bytes: int = _DEFAULT_MAX_POOLED_BYTES) -> None:
+        if max_pooled_bytes < 0:
+            raise ValueError(f"max_pooled_bytes deve ser não negativo, porém foi obtido: {max_pooled_bytes}")
+
+        self.max_pooled_bytes = max_pooled_bytes
+
+        # reentrante: o finalizador que devolve um segmento pode rodar
+        # numa coleta disparada dentro de uma seção com o lock
+        self._lock = threading.RLock()
+
+        # (estratégia, classe em bytes) -> segmentos ociosos, em
+        # ordem de devolução
+        self._free: OrderedDict[tuple[str, int], list[tuple[torch.UntypedStorage, _SegmentHeader]]] = OrderedDict()
+
+        # id(storage entregue) -> finalizador que devolve o segmento.
+        # a entrada sai quando o storage é coletado, então um id
+        # reutilizado nunca encontra uma entrada antiga
+        self._in_use: dict[int, _Lease] = {}
+
+        # segmentos devolvidos localmente, mas ainda mapeados por
+        # algum processo que os recebeu
+        self._pending: list[tuple[tuple[str, int], torch.UntypedStorage, _SegmentHeader]] = []
+
+        self._stats = PoolStats()
+
+        _pools.add(self)
+
+    def new_untyped(self, nbytes: int) -> torch.UntypedStorage:
+        """um `UntypedStorage` compartilhado na cpu com exatamente `nbytes` bytes"""
+
+        strategy = _sharing_strategy()
+        key = (strategy, _size_class(nbytes))
+
+        with self._lock:
+            self._collect_pending()
+
+            free = self._free.get(key)
+
+            if free:
+                segment, header = free.pop()
+
+                if not free:
+                    del self._free[key]
+
+                self._stats.hits += 1
+                self._stats.bytes_held -= key[1]
+            else:
+                segment = None
+
+                self._stats.misses += 1
+
+        # as syscalls ficam fora do lock
+        if segment is None:
+            segment = _allocate_segment(key[1], strategy)
+            header = _SegmentHeader(segment, key[1])
+
+        storage = _map_segment(segment, nbytes, strategy)
+
+        storage_id = id(storage)
+
+        with self._lock:
+            finalizer = weakref.finalize(storage, self._recycle, storage_id, key, segment, header)
+
+            self._in_use[storage_id] = _Lease(finalizer, segment, header)
+            self._stats.bytes_in_use += key[1]
+
+        return storage
+
+    def new_shared(self, template: Storage, size: int) -> Storage:
+        """
+        retorna um storage compartilhado com `size` elementos, do
+        mesmo tipo e device de `template`. storages fora da cpu não
+        passam pelo pool.
+        """
+
+        if template.device.type != "cpu":
+            return template._new_shared(size, device=template.device)
+
+        untyped = self.new_untyped(size * template.element_size())
+
+        if isinstance(template, torch.TypedStorage):
+            return torch.TypedStorage(wrap_storage=untyped, dtype=template.dtype, _internal=True)
+
+        return untyped
+
+    def release(self, storage: Storage) -> None:
+        """
+        devolve ao pool, antes de ser coletado, um storage obtido
+        com `new_shared`.
+
+        o chamador não deve mais usar o storage (nem tensores que
+        o compartilham) depois de devolvê-lo. cópias enviadas a
+        outros processos continuam válidas: o segmento só é
+        reutilizado depois que cada uma delas é coletada.
+        """
+
+        if isinstance(storage, torch.TypedStorage):
+            storage = storage._untyped_storage
+
+        with self._lock:
+            lease = self._in_use.get(id(storage))
+
+        if lease is None or not lease.finalizer.alive:
+            raise ValueError("o storage não foi alocado por este pool ou já foi devolvido")
+
+        lease.finalizer()
+
+    def _header(self, storage: torch.UntypedStorage) -> _SegmentHeader | None:
+        with self._lock:
+            lease = self._in_use.get(id(storage))
+
+        if lease is None or not lease.finalizer.alive:
+            return None
+
+        return lease.header
+
+    def _recycle(self, storage_id: int, key: tuple[str, int], segment: torch.UntypedStorage, header: _SegmentHeader) -> None:
+        with self._lock:
+            self._in_use.pop(storage_id, None)
+
+            self._stats.releases += 1
+
+            if header.busy():
+                self._pending.append((key, segment, header))
+            else:
+                self._return_segment(key, segment, header)
+
+    def _collect_pending(self) -> None:
+        pending = []
+
+        for key, segment, header in self._pending:
+            if header.pinned():
+                self._stats.bytes_in_use -= key[1]
+                self._stats.evictions += 1
+            elif header.busy():
+                pending.append((key, segment, header))
+            else:
+                self._return_segment(key, segment, header)
+
+        self._pending = pending
+
+    def _return_segment(self, key: tuple[str, int], segment: torch.UntypedStorage, header: _SegmentHeader) -> None:
+        size_class = key[1]
+
+        self._stats.bytes_in_use -= size_class
+
+        if size_class > self.max_pooled_bytes:
+            self._stats.evictions += 1
+
+            return
+
+        # descarta os segmentos ociosos mais antigos até que o
+        # devolvido caiba no limite
+        while self._stats.bytes_held + size_class > self.max_pooled_bytes:
+            old_key, old_free = next(iter(self._free.items()))
+
+            old_free.pop(0)
+
+            if not old_free:
+                del self._free[old_key]
+
+            self._stats.bytes_held -= old_key[1]
+            self._stats.evictions += 1
+
+        self._free.setdefault(key, []).append((segment, header))
+        self._free.move_to_end(key)
+
+        self._stats.bytes_held += size_class
+
+    def clear(self) -> None:
+        """descarta todos os segmentos ociosos do pool"""
+
+        with self._lock:
+            self._stats.evictions += sum(len(free) for free in self._free.values())
+            self._stats.bytes_held = 0
+
+            self._free.clear()
+
+    def stats(self) -> PoolStats:
+        """retorna uma cópia dos contadores do pool"""
+
+        with self._lock:
+            self._collect_pending()
+
+            return PoolStats(**vars(self._stats))
+
+
+_pools: weakref.WeakSet[SharedStoragePool] = weakref.WeakSet()
+
+# id(storage recebido de outro processo) -> tabela do segmento
+_received: dict[int, _SegmentHeader] = {}
+
+
+def _share_segment(segment: torch.UntypedStorage) -> tuple[Any, ...]:
+    if _sharing_strategy() == "file_system":
+        manager, handle, size = segment._share_filename_cpu_()
+
+        # mantém o arquivo vivo até o destino mapeá-lo, como em
+        # `reduce_storage`
+        segment._shared_incref()
+
+        return ("file_system", manager, handle, size)
+
+    fd, size = segment._share_fd_cpu_()
+
+    return ("file_descriptor", multiprocessing.reduction.DupFd(fd), size)
+
+
+def _open_segment(shared: tuple[Any, ...]) -> torch.UntypedStorage:
+    # sem passar pelo cache de `reductions`: o segmento e o storage
+    # entregue são o mesmo arquivo, com tamanhos diferentes
+    if shared[0] == "file_system":
+        _, manager, handle, size = shared
+
+        return torch.UntypedStorage._new_shared_filename_cpu(manager, handle, size)._shared_decref()
+
+    _, df, size = shared
+
+    fd = df.detach()
+
+    try:
+        return torch.UntypedStorage._new_shared_fd_cpu(fd, size)
+    finally:
+        os.close(fd)
+
+
+def _release_received(storage_id: int, header: _SegmentHeader, slot: int) -> None:
+    _received.pop(storage_id, None)
+
+    header.release(slot)
+
+
+def _rebuild_pooled(rebuild: Any, args: tuple[Any, ...], shared: tuple[Any, ...], size_class: int, slot: int) -> Any:
+    storage = rebuild(*args)
+
+    header = _SegmentHeader(_open_segment(shared), size_class)
+
+    untyped = storage._untyped_storage if isinstance(storage, torch.TypedStorage) else storage
+
+    _received[id(untyped)] = header
+
+    weakref.finalize(untyped, _release_received, id(untyped), header, slot)
+
+    return storage
+
+
+def _reduce_storage(storage: torch.UntypedStorage) -> Any:
+    """
+    `reduce_storage` que, para storages do pool, marca o envio na
+    tabela do segmento
+    """
+
+    reduced = reductions.reduce_storage(storage)
+
+    for pool in list(_pools):
+        header = pool._header(storage)
+
+        if header is None:
+            continue
+
+        slot = header.acquire()
+
+        if slot is None:
+            return reduced
+
+        size_class = header.counts.storage_offset()
+
+        return (_rebuild_pooled, (*reduced, _share_segment(header.counts.untyped_storage()), size_class, slot))
+
+    received = _received.get(id(storage))
+
+    if received is not None:
+        # não há como saber quando o próximo destino solta a cópia
+        received.pin()
+
+    return reduced
+
+
+# depois de `init_reductions`, que roda no import de
+# torch.multiprocessing
+multiprocessing.reduction.ForkingPickler.register(torch.UntypedStorage, _reduce_storage)
+
+
+_default_pool: SharedStoragePool | None = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> SharedStoragePool:
+    """
+    retorna o pool do processo atual.
+
+    o limite de bytes ociosos pode ser definido pela variável de
+    ambiente `TORCH_SHARED_POOL_MAX_BYTES`.
+    """
+
+    global _default_pool
+
+    with _default_pool_lock:
+        if _default_pool is None:
+            max_bytes = os.getenv("TORCH_SHARED_POOL_MAX_BYTES")
+
+            _default_pool = SharedStoragePool(
+                int(max_bytes) if max_bytes else _DEFAULT_MAX_POOLED_BYTES
+            )
+
+        return _default_pool
+
+
+def _reset_after_fork() -> None:
+    # os storages ociosos herdados do pai continuam mapeados nele;
+    # reutilizá-los no filho faria os dois processos escreverem
+    # no mesmo segmento
+    global _default_pool, _default_pool_lock
+
+    _default_pool = None
+    _default_pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+_original_new_shared: Any = None
+
+
+def install() -> None:
+    """
+    faz `_new_shared` dos storages (o caminho usado para criar
+    storages compartilhados, por exemplo no collate do dataloader)
+    alocar pelo pool do processo
+    """
+
+    global _original_new_shared
+
+    from torch.storage import _StorageBase
+
+    if _original_new_shared is not None:
+        return
+
+    _original_new_shared = _StorageBase.__dict__["_new_shared"]
+
+    def _new_shared(cls: Any, size: int, *, device: Any = "cpu") -> Any:
+        if torch.device(device).type != "cpu":
+            return _original_new_shared.__func__(cls, size, device=device)
+
+        return get_default_pool().new_untyped(size)
+
+    _StorageBase._new_shared = classmethod(_new_shared)
+
+
+def uninstall() -> None:
+    global _original_new_shared
+
+    from torch.storage import _StorageBase
+
+    if _original_new_shared is not None:
+        _StorageBase._new_shared = _original_new_shared
+
+        _original_new_shared = None
+
+
+if os.getenv("TORCH_SHARED_POOL") == "1":
+    install()